@@ -0,0 +1,153 @@
+"""
+Semantic cache for /answer responses.
+
+A cached answer is reused when a new request has
+
+  * the same scope: the same filters, the same set of retrieved chunks and the
+    same earlier conversation turns, and
+  * a query embedding within ANSWER_CACHE_THRESHOLD cosine similarity of the
+    cached question.
+
+Entries remember the files their chunks came from, and ingesting into or
+deleting one of those files through the API drops them. The retrieved chunk
+set is part of the scope, so rows changed by other writers (bulk_ingest.py)
+change the scope instead of serving a stale answer.
+
+    ANSWER_CACHE_SIZE       max cached answers                       (default 1024, 0 disables)
+    ANSWER_CACHE_THRESHOLD  min cosine similarity for a hit          (default 0.95)
+    ANSWER_CACHE_TTL        seconds an answer stays valid            (default 3600)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import numpy as np
+
+from dedup import content_hash
+
+
+def scope_key(filter_signature: str, hits, history: list[dict]) -> str:
+    """Exact-match part of the key: filters, retrieved chunk set, earlier turns."""
+    chunks = sorted({(fn, content_hash(text)) for fn, text, *_ in hits})
+    payload = json.dumps([filter_signature, chunks, history], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _unit(embedding) -> np.ndarray:
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class _Entry:
+    __slots__ = ("scope", "vector", "files", "payload", "expires_at")
+
+    def __init__(self, scope, vector, files, payload, expires_at):
+        self.scope      = scope
+        self.vector     = vector
+        self.files      = files
+        self.payload    = payload
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 1024, threshold: float = 0.95, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.threshold   = threshold
+        self.ttl         = ttl
+        self._lock       = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()   # LRU order
+        self._by_scope: dict[str, set[int]] = {}
+        self._by_file:  dict[str, set[int]] = {}
+        self._next_id     = 0
+        self.hits         = 0
+        self.misses       = 0
+        self.invalidated  = 0
+
+    def lookup(self, embedding, scope: str) -> Optional[dict]:
+        query = _unit(embedding)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_sim = None, self.threshold
+            for entry_id in list(self._by_scope.get(scope, ())):
+                entry = self._entries[entry_id]
+                if entry.expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                sim = float(np.dot(query, entry.vector))
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return {**self._entries[best_id].payload, "cache_similarity": round(min(best_sim, 1.0), 4)}
+
+    def store(self, embedding, scope: str, files: Iterable[str], payload: dict):
+        entry = _Entry(scope, _unit(embedding), set(files), payload, time.monotonic() + self.ttl)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_scope.setdefault(scope, set()).add(entry_id)
+            for fn in entry.files:
+                self._by_file.setdefault(fn, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, filenames: Iterable[str]) -> int:
+        """Drop every answer built from any of `filenames`."""
+        with self._lock:
+            stale = set()
+            for fn in filenames:
+                stale |= self._by_file.get(fn, set())
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidated += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self._by_file.clear()
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for index, key in ((self._by_scope, entry.scope), *((self._by_file, fn) for fn in entry.files)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del index[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries":     len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold":   self.threshold,
+                "hits":        self.hits,
+                "misses":      self.misses,
+                "hit_rate":    round(self.hits / total, 4) if total else 0.0,
+                "invalidated": self.invalidated,
+            }
+
+
+def build_answer_cache() -> Optional[AnswerCache]:
+    size = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+    if size <= 0:
+        return None
+    return AnswerCache(
+        max_entries = size,
+        threshold   = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+        ttl         = float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    )
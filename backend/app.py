@@ -1,24 +1,28 @@
+import aiohttp
+import anyio
+import asyncio
+import json
+import logging
 import os
 import shutil
+import tempfile
+import threading
 import math
+import time
 from datetime import date
 from typing import Optional
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 import fitz  # PyMuPDF
-import psycopg2
 import openai
-import requests
-from bs4 import BeautifulSoup
 from fastapi import Query
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 import traceback
 from fastapi import HTTPException
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from typing import Any
 from urllib.parse import urlparse
 from fastapi import UploadFile, File
@@ -30,6 +34,34 @@ from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import List, Literal, Optional
 
+import crawler
+import db
+import pdf_extract
+from chunking import iter_chunks
+from embedding_cache import build_cache
+from answer_cache import build_answer_cache, scope_key
+from context_packing import PackedPrompt, pack_prompt
+from embeddings import get_embedder
+from bulk_insert import chunk_rows, write_rows
+from jobs import Job, get_job, job_queue, ensure_schema as ensure_jobs_schema, use_memory as use_memory_jobs
+from dedup import IncrementalIngest, content_hash, file_hash
+from filters import FILTER_FIELDS, FilterSet, FilterValue, avector_search, clean_value, vector_search
+import html_extract
+import http_client
+from lexical import candidate_count, hybrid_default, lexical_query, rrf_fuse
+from local_store import open_store
+from rerank import candidate_count as rerank_candidates, close_reranker, get_reranker, rerank_default
+from rerank import status as rerank_info
+import logs
+import metrics
+import schema
+import stages
+import transcription
+import vector_index
+from stages import stage, timed
+from transcription import BodySizeLimit
+from tts_cache import audio_key, build_tts_cache
+
 
 class Message(BaseModel):
     role: Literal["system", "user", "assistant"]
@@ -38,10 +70,21 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
     messages: List[Message]
     top_k: int
-    country: Optional[str]     = None
-    job_area: Optional[str]    = None
-    source_type: Optional[str] = None
+    # exact / "prefix*" / list of values, see filters.py
+    country: FilterValue       = None
+    job_area: FilterValue      = None
+    source_type: FilterValue   = None
     filenames: Optional[List[str]] = None
+    # ANN recall/speed knobs (see vector_index.py)
+    ef_search: Optional[int] = Field(None, ge=1, le=1000)
+    probes:    Optional[int] = Field(None, ge=1, le=10000)
+    exact:     bool          = False
+    # fuse full-text and vector search; defaults to RETRIEVAL_MODE (see lexical.py)
+    hybrid:    Optional[bool] = None
+    # cross-encoder rerank of over-fetched candidates; defaults to RERANK (see rerank.py)
+    rerank:    Optional[bool] = None
+    # prompt token budget, defaults to CONTEXT_TOKEN_BUDGET (see context_packing.py)
+    token_budget: Optional[int] = Field(None, ge=512, le=128000)
 
 # ── Setup upload directory ──
 BASE_DIR = os.path.dirname(__file__)
@@ -50,22 +93,38 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # ── Load env & initialize clients ──
 load_dotenv()
+logs.setup()
+log = logging.getLogger(__name__)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY missing in .env")
 openai.api_key = OPENAI_API_KEY
 
-# Text embedding model 
-def get_embedding(text: str) -> list[float]:
-    response = openai.Embedding.create(
-        input=text,
-        model="text-embedding-3-small" 
-    )
-    return response['data'][0]['embedding']
+# Text embedding model (EMBEDDING_PROVIDER / EMBEDDING_MODEL, see embeddings.py)
+embedder        = get_embedder()
+# in-process vector store instead of Postgres when VECTOR_BACKEND=local (see local_store.py)
+store           = open_store()
+embedding_cache = build_cache()
+answer_cache    = build_answer_cache()
+
+async def get_embedding(text: str) -> list[float]:
+    if embedding_cache is not None:
+        cached = await embedding_cache.aget(text, embedder.model)
+        metrics.CACHE_LOOKUPS.inc(cache="embedding", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+    with stage("embed"):
+        embedding = (await embedder.aembed([text]))[0]
+    if embedding_cache is not None:
+        await embedding_cache.aput(text, embedder.model, embedding)
+    return embedding
 
 # ── FastAPI setup ──
 app = FastAPI(title="SmartFusion RAG API")
 
+# ── Upload size limits, enforced before the body is read (inside CORS so a 413 still carries its headers) ──
+app.add_middleware(BodySizeLimit, limits={"/api/transcribe": transcription.max_upload_bytes()})
+
 # ── CORS (allow your React dev server) ──
 app.add_middleware(
     CORSMiddleware,
@@ -73,44 +132,204 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
 
-# ── Database connection helper ──
-def get_db_connection():
+# ── Request ids, metrics, and per-stage timings in a Server-Timing header (see stages.py) ──
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    started = time.perf_counter()
+    request_id = logs.new_request_id(request.headers.get("x-request-id"))
+    logs.request_id.set(request_id)
+    timings = stages.begin()
+    metrics.HTTP_IN_PROGRESS.inc()
+    status = 500
     try:
-        return psycopg2.connect(
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT"),
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"DB connection failed: {e}")
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.HTTP_IN_PROGRESS.dec()
+        # the route template, not the raw path, keeps the label set small
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+        metrics.HTTP_SECONDS.observe(elapsed, method=request.method, route=route)
+        log.debug("request", extra={"method": request.method, "route": route, "status": status,
+                                    "duration_ms": round(elapsed * 1000, 2)})
+    response.headers["Server-Timing"] = stages.server_timing(timings, elapsed)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+def json_response(content) -> JSONResponse:
+    with stage("serialize"):
+        return JSONResponse(content=jsonable_encoder(content))
+
+# ── Database access goes through the shared pool in db.py ──
+
+# ── Ingestion jobs (run on the background worker pool) ──
+def ingest_sections(job: Job, sections, doc: dict) -> dict:
+    """
+    Pipelined chunk → dedup → embed → insert: sections are chunked as they
+    arrive, chunks already stored for this document are skipped, known chunk
+    text reuses its stored embedding, and only the delta is embedded and
+    streamed into COPY. The writer holds the filename's advisory lock (see
+    dedup.py) from before the delta is taken until it commits. Returns the
+    dedup counters plus rows written.
+    """
+    if store is not None:
+        return ingest_into_store(job, sections, doc)
+    delta = IncrementalIngest(doc, embedder.model)
+    if delta.unchanged():
+        return {"rows_written": 0, "unchanged": True, **delta.counts}
+
+    processed = 0
+
+    def embedded_chunks():
+        nonlocal processed
+        new_chunks = timed("dedup", delta.new_chunks(timed("chunk", iter_chunks(sections))))
+        for chunk, emb in timed("embed_chunks", delta.embed(new_chunks, embedder)):
+            processed += 1
+            if processed % 256 == 0:
+                job.progress(chunks_embedded=processed)
+            yield chunk, emb
+
+    # the generators above time themselves, so db_write is the COPY and commit alone
+    with stage("db_write"), db.get_cursor(commit=True) as cur:
+        delta.lock(cur)   # chunks are only filtered once COPY pulls them, under the lock
+        if delta.unchanged():   # another job just ingested the same content
+            return {"rows_written": 0, "unchanged": True, **delta.counts}
+        written = write_rows(cur, chunk_rows(doc, embedded_chunks(), embedder.model))
+        delta.finalize(cur)
+    metrics.INGEST_ROWS.inc(written)
+    invalidate_answers(doc["filename"])
+    job.progress(chunks_embedded=processed, rows_written=written)
+    return {"rows_written": written, "unchanged": False, **delta.counts}
+
+
+def ingest_into_store(job: Job, sections, doc: dict) -> dict:
+    """`ingest_sections` for the local store: the file's earlier rows are replaced once the new ones are in."""
+    processed = 0
+
+    def embedded_chunks():
+        nonlocal processed
+        for chunk, emb in timed("embed_chunks", embedder.embed_stream(timed("chunk", iter_chunks(sections)),
+                                                                      key=lambda c: c.text)):
+            processed += 1
+            if processed % 256 == 0:
+                job.progress(chunks_embedded=processed)
+            yield chunk, emb
+
+    first_new = store.count
+    with stage("db_write"):
+        written = store.append(chunk_rows(doc, embedded_chunks(), embedder.model))
+        replaced = store.delete(doc["filename"], before=first_new)
+    metrics.INGEST_ROWS.inc(written)
+    invalidate_answers(doc["filename"])
+    job.progress(chunks_embedded=processed, rows_written=written)
+    return {"rows_written": written, "unchanged": False, "duplicates": 0, "kept": 0,
+            "reused": 0, "embedded": processed, "deleted": replaced}
+
+
+def invalidate_answers(filename: str):
+    if answer_cache is not None:
+        dropped = answer_cache.invalidate([filename])
+        if dropped:
+            log.info(f"🧹 Dropped {dropped} cached answers built from {filename}")
+
+
+def describe_ingest(stats: dict, source: str) -> str:
+    if stats["unchanged"]:
+        return f"{source} is unchanged, nothing to ingest"
+    return (f"Ingested {stats['rows_written']} new chunks from {source} "
+            f"({stats['kept']} unchanged, {stats['reused']} reused embeddings, {stats['deleted']} removed)")
+
+
+def run_pdf_ingest(job: Job, path: str, doc: dict) -> dict:
+    try:
+        return ingest_pdf_file(job, path, doc)
+    finally:
+        os.remove(path)   # the upload's private copy, see ingest_pdf
+
+
+def ingest_pdf_file(job: Job, path: str, doc: dict) -> dict:
+    def pages():
+        extracted = 0
+        for page_no, text in timed("extract", pdf_extract.iter_pages(path)):
+            extracted += 1
+            if extracted % 16 == 0:
+                job.progress(pages_extracted=extracted)
+            yield page_no, text
+        job.progress(pages_extracted=extracted)
 
-# ── PDF/Text extraction & chunking ──
-def extract_pdf_text(path: str) -> str:
+    doc = {**doc, "document_hash": file_hash(path)}
+    stats = ingest_sections(job, pages(), doc)
+    return {"detail": describe_ingest(stats, doc["filename"]), **stats}
+
+
+def run_url_ingest(job: Job, config: crawler.CrawlConfig, doc: dict) -> dict:
+    """
+    Crawl from the seed URLs (see crawler.py) and ingest every page as its own
+    document, named by `crawler.page_name`, a single page included: sharing a
+    site-level filename would make each page's ingest drop the others' chunks.
+    """
+    single = len(config.seeds) == 1 and config.max_depth == 0
+    totals = {"rows_written": 0, "unchanged": 0, "duplicates": 0, "kept": 0,
+              "reused": 0, "embedded": 0, "deleted": 0}
+    totals_lock = threading.Lock()
+
+    def ingest_page(filename: str, page: html_extract.HtmlPage):
+        part = job.part(filename)
+        part.progress(pages_extracted=1)
+        stats = ingest_sections(part, [page.text], {**doc, "filename": filename,
+                                                    "document_hash": content_hash(page.text)})
+        with totals_lock:
+            for key in totals:
+                totals[key] += int(stats[key])
+
+    crawl_stats, failures = crawler.crawl(config, ingest_page)
+    pages = crawl_stats.get("ingested", 0)
+    if not pages and not crawl_stats.get("unchanged") and (single or failures):
+        if single:
+            url = config.seeds[0]
+            raise RuntimeError(f"Failed to fetch {url}: {failures.get(url, 'nothing to ingest')}")
+        url, reason = next(iter(failures.items()))
+        raise RuntimeError(f"Crawl ingested no pages: {len(failures)} failed (first: {url}: {reason})")
+    detail = (f"Ingested {totals['rows_written']} new chunks from {pages} pages "
+              f"({crawl_stats.get('unchanged', 0) + totals['unchanged']} unchanged, "
+              f"{totals['reused']} reused embeddings, {totals['deleted']} removed)")
+    return {"detail": detail, "pages": pages, "crawl": crawl_stats, "failures": failures, **totals}
+
+
+def save_upload_temp(file: UploadFile, suffix: str) -> tuple[str, int]:
+    """Copy an upload to a new file of its own in UPLOAD_DIR; returns its path and size."""
+    fd, path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=suffix)
+    os.close(fd)
     try:
-        pages = []
-        with fitz.open(path) as doc:
-            for page in doc:
-                # Use block layout to preserve structure
-                blocks = page.get_text("blocks")  # (x0, y0, x1, y1, "text", block_no, block_type)
-                blocks = sorted(blocks, key=lambda b: (b[1], b[0]))  # sort top-to-bottom, then left-to-right
-                page_text = "\n".join(block[4].strip() for block in blocks if block[4].strip())
-                pages.append(page_text)
-        return "\n".join(pages)
+        return path, save_upload(file, path)
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+def save_upload(file: UploadFile, path: str) -> int:
+    file.file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file.file, out)
+    return os.path.getsize(path)
+
+
+def check_pdf(path: str) -> Optional[str]:
+    """Quick open/auth check; returns an error message or None."""
+    try:
+        doc = fitz.open(path)
+        if doc.is_encrypted and not doc.authenticate(""):
+            return "encrypted or password-protected"
+        doc.close()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PDF extraction failed: {e}")
-
-def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> list[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        separators=["\n\n", "\n", ".", " "],  # smart fallbacks
-        keep_separator=True
-    )
-    return splitter.split_text(text)
+        return str(e)
+    return None
+
 
 # ── Ingest PDF endpoint ──
 @app.post("/ingest_pdf")
@@ -123,210 +342,215 @@ async def ingest_pdf(
     owner:       str        = Form("Unknown"),
 ):
     try:
-        # ── Save upload to disk ──
-        temp_path = os.path.join(UPLOAD_DIR, file.filename)
-        file.file.seek(0)
-        with open(temp_path, "wb") as out:
-            shutil.copyfileobj(file.file, out)
-        size = os.path.getsize(temp_path)
+        # ── Save upload to disk (off the event loop) ──
+        # under a name of its own: the filename is only metadata, and another
+        # upload of the same name may arrive while this one is still queued
+        temp_path, size = await run_in_threadpool(save_upload_temp, file, ".pdf")
 
         # ── Quick open/auth check ──
-        open_error = None
-        try:
-            doc = fitz.open(temp_path)
-            if doc.is_encrypted and not doc.authenticate(""):
-                open_error = "encrypted or password-protected"
-            doc.close()
-        except Exception as e:
-            open_error = str(e)
+        open_error = await run_in_threadpool(check_pdf, temp_path)
         if open_error:
+            os.remove(temp_path)
             return {
                 "detail": "🚨 PDF open failed",
                 "written_bytes": size,
                 "open_error": open_error
             }
 
-        # ── Extract & chunk ──
-        full_text = extract_pdf_text(temp_path)
-        chunks    = chunk_text(full_text)
-        for i, ch in enumerate(chunks):
-            print(f"🧩 Chunk {i+1}:\n{ch[:80]}...\n")
-
-        # ── Connect & batch-embed ──
-        conn = get_db_connection()
-        cur  = conn.cursor()
-
-        resp = openai.Embedding.create(
-            input=chunks,
-            model="text-embedding-3-small"
-        )
-        embeddings = [d["embedding"] for d in resp["data"]]
-
-        # ── Insert each chunk with its embedding and metadata ──
-        for chunk, emb in zip(chunks, embeddings):
-            print("→ embedding length:", len(emb))
-            print("→ writing to DB:", os.getenv("DB_HOST"), "/", os.getenv("DB_NAME"))
-
-            cur.execute(
-                """
-                INSERT INTO documents
-                  (filename, country, job_area, source_type,
-                   target_group, owner, creation_date,
-                   full_text, content_embedding)
-                VALUES (%s,      %s,      %s,       %s,
-                        %s,          %s,    %s,
-                        %s,          %s)
-                """,
-                (
-                    file.filename,
-                    country,
-                    job_area,
-                    source_type,
-                    target_group,
-                    owner,
-                    date.today(),
-                    chunk,
-                    emb
-                )
+        # ── Queue extraction, embedding and insert ──
+        doc = {
+            "filename":     file.filename,
+            "country":      clean_value(country),
+            "job_area":     clean_value(job_area),
+            "source_type":  clean_value(source_type),
+            "target_group": target_group,
+            "owner":        owner,
+        }
+        try:
+            job_id = await run_in_threadpool(
+                job_queue.submit, "pdf", file.filename, run_pdf_ingest, temp_path, doc, params=doc
             )
-
-        conn.commit()
-        cur.close()
-        conn.close()
+        except Exception:
+            os.remove(temp_path)
+            raise
 
         return {
-            "detail": f"Ingested {len(chunks)} chunks from {file.filename}",
+            "detail": f"Queued ingestion of {file.filename}",
+            "job_id": job_id,
             "written_bytes": size
         }
 
     except Exception as e:
-        print("❌ ERROR in ingest_pdf:\n", traceback.format_exc())
+        log.exception("❌ ERROR in ingest_pdf")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-# ── Ingest URL endpoint ──
+# ── Ingest URL endpoint: one page, or a crawl from seed URLs (see crawler.py) ──
 @app.post("/ingest_url")
-async def ingest_url(
-    url:         str = Query(..., description="Webpage URL to ingest"),
+def ingest_url(
+    url:         list[str]           = Query(..., description="Webpage URL to ingest; repeat for several seeds"),
+    depth:       int                 = Query(0, ge=0, le=10, description="Follow links this many hops from the seeds"),
+    max_pages:   int                 = Query(200, ge=1, le=10_000),
+    domain:      Optional[list[str]] = Query(None, description="Domains to stay on, subdomains included (default: the seeds' hosts)"),
+    path_prefix: Optional[str]       = Query(None, description="Only follow links whose path starts with this"),
+    force:       bool                = Query(False, description="Refetch pages even if unchanged since the last crawl"),
     country:     str = Query("Unknown"),
     job_area:    str = Query("Unknown"),
     source_type: str = Query("HTML"),
     target_group:str = Query("Unknown"),
     owner:       str = Query("Unknown"),
 ):
-    # 1) fetch page
-    resp = requests.get(url)
-    if resp.status_code != 200:
-        raise HTTPException(status_code=400, detail=f"Failed to fetch {url}: {resp.status_code}")
-
-    # 2) parse HTML → raw text
-    soup      = BeautifulSoup(resp.text, "html.parser")
-    full_text = " ".join(soup.stripped_strings)   
-
-    # 3) split into chunks
-    chunks = chunk_text(full_text)                 
-
-    # 4) embed & store
-    conn = get_db_connection()
-    cur  = conn.cursor()
-    for i, chunk in enumerate(chunks):
-        emb = get_embedding(chunk)
-        host = urlparse(url).netloc.replace(".", "_")
-        fn   = host
-        cur.execute(
-            """
-            INSERT INTO documents
-              (filename, country, job_area, source_type,
-               target_group, owner, creation_date,
-               full_text, content_embedding)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-              fn, country, job_area, source_type,
-              target_group, owner, date.today(),
-              chunk, emb
-            )
-        )
-    conn.commit()
-    cur.close()
-    conn.close()
-
-    return {"detail": f"Ingested {len(chunks)} chunks from {url}"}
+    bad = [u for u in url if urlparse(u).scheme not in ("http", "https") or not urlparse(u).netloc]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Not an http(s) URL: {bad[0]}")
+    config = crawler.CrawlConfig(seeds=url, max_depth=depth, max_pages=max_pages,
+                                 domains=domain, path_prefix=path_prefix, force=force)
+    doc = {   # each page is stored under its own filename, see run_url_ingest
+        "country":      clean_value(country),
+        "job_area":     clean_value(job_area),
+        "source_type":  clean_value(source_type),
+        "target_group": target_group,
+        "owner":        owner,
+    }
+    crawl = depth > 0 or len(url) > 1
+    source = f"{url[0]} (+{len(url) - 1} more)" if len(url) > 1 else url[0]
+    params = {**doc, "crawl": {"seeds": url, "depth": depth, "max_pages": max_pages,
+                               "domains": domain, "path_prefix": path_prefix, "force": force}}
+    job_id = job_queue.submit("crawl" if crawl else "url", source, run_url_ingest, config, doc, params=params)
+    return {"detail": f"Queued {'crawl' if crawl else 'ingestion'} of {source}", "job_id": job_id}
+
+
+# ── Job status endpoint ──
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return jsonable_encoder(job)
 
 # ── Retrieval logic ──
-def retrieve(
+async def retrieve(
     query: str,
     k: int,
-    country: Optional[str] = None,
-    job_area: Optional[str] = None,
-    source_type: Optional[str] = None,
-    filenames: Optional[List[str]] = None
+    country: FilterValue = None,
+    job_area: FilterValue = None,
+    source_type: FilterValue = None,
+    filenames: Optional[List[str]] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    exact: bool = False,
+    hybrid: Optional[bool] = None,
+    rerank: Optional[bool] = None
 ):
-    q_emb = get_embedding(query)
+    """(filename, full_text, distance) rows, best first."""
+    q_emb = await get_embedding(query)
+    fs = FilterSet(country, job_area, source_type, filenames, embedding_model=embedder.model)
+    return await search_chunks(query, q_emb, fs, k, hybrid=hybrid, rerank=rerank,
+                               ef_search=ef_search, probes=probes, exact=exact)
 
-    filters = []
-    params = []
-    if country:
-        filters.append("country ILIKE %s");      params.append(f"%{country}%")
-    if job_area:
-        filters.append("job_area ILIKE %s");     params.append(f"%{job_area}%")
-    if source_type:
-        filters.append("source_type ILIKE %s");  params.append(f"%{source_type}%")
-    if filenames:
-        filters.append("filename = ANY(%s)")
-        params.append(filenames)
 
+async def search_chunks(
+    query: str,
+    q_emb: list[float],
+    fs: FilterSet,
+    k: int,
+    columns: tuple[str, ...] = ("filename", "full_text"),
+    hybrid: Optional[bool] = None,
+    rerank: Optional[bool] = None,
+    **knobs,
+):
+    """
+    Top-k rows (`columns` + distance): vector search, fused with full-text
+    search in hybrid mode, optionally over-fetched and reranked.
+    """
+    if not (rerank if rerank is not None else rerank_default()):
+        with stage("search"):
+            return await first_stage(query, q_emb, fs, k, columns, hybrid, **knobs)
+    if "full_text" not in columns:
+        columns = (*columns, "full_text")
+    with stage("search"):
+        rows = await first_stage(query, q_emb, fs, rerank_candidates(k), columns, hybrid, **knobs)
+    with stage("rerank"):
+        return await get_reranker().rerank(query, rows, columns.index("full_text"), k)
+
+
+async def first_stage(query: str, q_emb: list[float], fs: FilterSet, k: int, columns, hybrid, **knobs):
+    # lexical retrieval needs the Postgres full-text index
+    if store is not None or not (hybrid if hybrid is not None else hybrid_default()):
+        return await search_vectors(q_emb, fs, k, columns=columns, **knobs)
+    n = candidate_count(k)
+    with_id = ("id", *columns)
+    # both rankings run at once, each on its own pooled connection
+    vector_rows, lexical_rows = await asyncio.gather(
+        search_vectors(q_emb, fs, n, columns=with_id, **knobs),
+        fetch_all(*lexical_query(query, q_emb, fs, n, with_id)),
+    )
+    return rrf_fuse([vector_rows, lexical_rows], k)
 
-    where_sql = ""
-    if filters:
-        where_sql = "WHERE " + " AND ".join(filters)
 
-    sql = f"""
-      SELECT filename,
-             full_text,
-             content_embedding <=> (%s)::vector AS distance
-        FROM documents
-       {where_sql}
-       ORDER BY distance ASC
-       LIMIT %s
-    """
+async def search_vectors(q_emb: list[float], fs: FilterSet, k: int, **knobs):
+    if store is not None:
+        return await run_in_threadpool(store.search, q_emb, fs, k, **knobs)
+    # async pool when available; otherwise the sync pool on the threadpool
+    if db.async_pool_ready():
+        async with db.get_async_cursor() as cur:
+            return await avector_search(cur, q_emb, fs, k, **knobs)
+    return await run_in_threadpool(search_vectors_sync, q_emb, fs, k, **knobs)
+
+
+def search_vectors_sync(q_emb: list[float], fs: FilterSet, k: int, **knobs):
+    with db.get_cursor() as cur:
+        return vector_search(cur, q_emb, fs, k, **knobs)
 
-    # embed param first, then any filter params, then k
-    db_params = [q_emb] + params + [k]
 
-    conn = get_db_connection()
-    cur  = conn.cursor()
-    cur.execute(sql, db_params)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+async def fetch_all(sql: str, params: list):
+    if db.async_pool_ready():
+        async with db.get_async_cursor() as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+    return await run_in_threadpool(fetch_all_sync, sql, params)
+
+
+def fetch_all_sync(sql: str, params: list):
+    with db.get_cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
 
 # ── Request schema ──
 class QueryRequest(BaseModel):
     question:     str
     top_k:        int
-    country:      Optional[str] = None
-    job_area:     Optional[str] = None
-    source_type:  Optional[str] = None
+    country:      FilterValue   = None
+    job_area:     FilterValue   = None
+    source_type:  FilterValue   = None
+    ef_search:    Optional[int] = Field(None, ge=1, le=1000)
+    probes:       Optional[int] = Field(None, ge=1, le=10000)
+    exact:        bool          = False
+    hybrid:       Optional[bool] = None
+    rerank:       Optional[bool] = None
 
 # ── Query endpoint ──
 @app.post("/query")
-def ask_question(req: QueryRequest):
+async def ask_question(req: QueryRequest):
     try:
         # if req.country/job_area/source_type are None ⇒ retrieves ALL;
         # otherwise only those matching the metadata
-        hits = retrieve(
+        hits = await retrieve(
             query       = req.question,
             k           = req.top_k,
             country     = req.country,
             job_area    = req.job_area,
-            source_type = req.source_type
+            source_type = req.source_type,
+            ef_search   = req.ef_search,
+            probes      = req.probes,
+            exact       = req.exact,
+            hybrid      = req.hybrid,
+            rerank      = req.rerank
         )
-        return [
+        return json_response([
             {"filename": fn, "snippet": snip}
             for fn, snip, _ in hits
-        ]
+        ])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -344,317 +568,534 @@ def sanitize(obj):
 
 
 # ── Answer endpoint ──
+CHAT_MODEL    = "gpt-4-turbo"
+SYSTEM_PROMPT = "You are a helpful assistant. Use ONLY the context below to answer."
+
+
+def build_prompt(req: ChatRequest, hits) -> PackedPrompt:
+    messages = [{"role": m.role, "content": m.content} for m in req.messages]
+    return pack_prompt(SYSTEM_PROMPT, messages, hits, budget=req.token_budget)
+
+
+def format_sources(hits) -> list[dict]:
+    return [
+        {"filename": fn, "similarity": 1.0 / (1.0 + dist)}
+        for fn, _, dist, *_ in hits
+    ]
+
+
+def packed_sources(prompt: PackedPrompt, hits) -> list[dict]:
+    # only the chunks that made it into the prompt, in retrieval order
+    used = {id(hit) for p in prompt.passages for hit in p.hits}
+    return format_sources([hit for hit in hits if id(hit) in used])
+
+
+async def retrieve_for_chat(req: ChatRequest):
+    """Retrieve for the last user turn; returns (query embedding, answer cache scope, hits)."""
+    log.debug("🔍 Retrieving", extra={"filenames": req.filenames})
+    q_emb = await get_embedding(req.messages[-1].content)
+    fs = FilterSet(req.country, req.job_area, req.source_type, req.filenames, embedding_model=embedder.model)
+    rows = await search_chunks(req.messages[-1].content, q_emb, fs, req.top_k,
+                               columns=("filename", "full_text", "metadata"), hybrid=req.hybrid, rerank=req.rerank,
+                               ef_search=req.ef_search, probes=req.probes, exact=req.exact)
+    # (filename, text, distance, metadata): the chunk offsets let the prompt packer merge neighbours
+    hits = [(fn, text, dist, meta) for fn, text, meta, dist in rows]
+    history = [{"role": m.role, "content": m.content} for m in req.messages[:-1]]
+    return q_emb, scope_key(fs.signature(), hits, history), hits
+
+
+def cached_answer(q_emb, scope: str) -> Optional[dict]:
+    if answer_cache is None:
+        return None
+    cached = answer_cache.lookup(q_emb, scope)
+    metrics.CACHE_LOOKUPS.inc(cache="answer", result="miss" if cached is None else "hit")
+    return cached
+
+
+def remember_answer(q_emb, scope: str, hits, result: dict):
+    if answer_cache is not None and result["answer"]:
+        answer_cache.store(q_emb, scope, {fn for fn, *_ in hits}, result)
+
+
 @app.post("/answer")
-def answer_chat(req: ChatRequest):
+async def answer_chat(req: ChatRequest):
     try:
-        # 1)  get the last user turn for retrieval
-        user_query = req.messages[-1].content
-        print("🔍 Retrieving from files:", req.filenames)
-        hits = retrieve(
-            query       = user_query,
-            k           = req.top_k,
-            country     = req.country,
-            job_area    = req.job_area,
-            source_type = req.source_type,
-            filenames   = req.filenames
-        )
-
-        # 2) build context
-        context = "\n\n".join(chunk for _, chunk, _ in hits)
-
-        # 3) query GPT
-        chat_msgs = [
-            {"role": "system", "content": "You are a helpful assistant. Use ONLY the context below to answer."},
-            *[
-                {"role": m.role, "content": m.content}
-                for m in req.messages
-                ],
-                {"role": "system", "content": f"Context:\n{context}"}
-                ]
-        resp = openai.ChatCompletion.create(
-            model="gpt-4-turbo",
-            messages=chat_msgs
-            )
+        q_emb, scope, hits = await retrieve_for_chat(req)
+        cached = cached_answer(q_emb, scope)
+        if cached is not None:
+            return json_response({**cached, "cached": True})
+
+        prompt = build_prompt(req, hits)
+        await http_client.bind_openai()
+        with stage("llm"):
+            resp = await openai.ChatCompletion.acreate(
+                model=CHAT_MODEL,
+                messages=prompt.messages
+                )
         answer = resp.choices[0].message.content.strip()
+        result = {"answer": answer, "sources": packed_sources(prompt, hits), "context": prompt.report()}
+        remember_answer(q_emb, scope, hits, result)
+        return json_response({**result, "cached": False})
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # 4) build sources
-        sources = [
-            {"filename": fn, "similarity": 1.0 / (1.0 + dist)}
-            for fn, _, dist in hits
-        ]
 
-        return {"answer": answer, "sources": sources}
-        
+# ── Streaming answer endpoint (Server-Sent Events) ──
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(sanitize(data))}\n\n"
 
+
+@app.post("/answer/stream")
+async def answer_chat_stream(req: ChatRequest, request: Request):
+    """
+    Same as /answer, streamed: one `sources` event, then `delta` events as the
+    model generates, then `done` with the full answer and the context packing
+    report (or `error`). If the
+    client goes away the upstream completion is closed, so generation stops.
+    """
+    try:
+        q_emb, scope, hits = await retrieve_for_chat(req)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    cached = cached_answer(q_emb, scope)
+
+    async def events():
+        if cached is not None:
+            yield sse_event("sources", cached["sources"])
+            yield sse_event("delta", {"content": cached["answer"]})
+            yield sse_event("done", {"answer": cached["answer"], "context": cached.get("context"), "cached": True})
+            return
+
+        prompt  = build_prompt(req, hits)
+        sources = packed_sources(prompt, hits)
+        yield sse_event("sources", sources)
+        completion = None
+        parts = []
+        try:
+            await http_client.bind_openai()
+            completion = await openai.ChatCompletion.acreate(
+                model=CHAT_MODEL,
+                messages=prompt.messages,
+                stream=True,
+            )
+            async for chunk in completion:
+                if await request.is_disconnected():
+                    log.info("🛑 Client disconnected, cancelling completion")
+                    return
+                delta = chunk.choices[0].delta.get("content") if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield sse_event("delta", {"content": delta})
+            answer = "".join(parts).strip()
+            result = {"answer": answer, "sources": sources, "context": prompt.report()}
+            remember_answer(q_emb, scope, hits, result)
+            yield sse_event("done", {**result, "cached": False})
+        except asyncio.CancelledError:
+            log.info("🛑 Answer stream cancelled")
+            raise
+        except Exception as e:
+            log.exception("❌ ERROR in answer stream")
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            # closes the upstream HTTP response instead of reading it to the end
+            if completion is not None:
+                await completion.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
     
 # ── Search endpoint ──
 @app.get("/search/")
-def search(
+async def search(
     q: Optional[str] = Query(None),
-    country: Optional[str] = Query(None),
-    job_area: Optional[str] = Query(None),
-    source_type: Optional[str] = Query(None),
+    country: Optional[List[str]] = Query(None),
+    job_area: Optional[List[str]] = Query(None),
+    source_type: Optional[List[str]] = Query(None),
     filenames: List[str] = Query(None),
-    k: int = Query(5, ge=1, le=50)
+    k: int = Query(5, ge=1, le=50),
+    ef_search: Optional[int] = Query(None, ge=1, le=1000),
+    probes: Optional[int] = Query(None, ge=1, le=10000),
+    exact: bool = Query(False),
+    hybrid: Optional[bool] = Query(None, description="Fuse full-text and vector search (default: RETRIEVAL_MODE)"),
+    rerank: Optional[bool] = Query(None, description="Rerank with the local cross-encoder (default: RERANK)")
 ):
-    
-    if not q or not q.strip():
-        filters, params = [], []
-        if country:     filters.append("country ILIKE %s");    params.append(f"%{country}%")
-        if job_area:    filters.append("job_area ILIKE %s");   params.append(f"%{job_area}%")
-        if source_type: filters.append("source_type ILIKE %s");params.append(f"%{source_type}%")
-        if filenames: filters.append("filename = ANY(%s)"); params.append(filenames)
-        where = "WHERE " + " AND ".join(filters) if filters else ""
-        sql = f"""
-        SELECT filename
-        FROM documents
-        {where}
-        GROUP BY filename
-        ORDER BY MAX(creation_date) DESC
-        """
-        cur = get_db_connection().cursor()
-        cur.execute(sql, params)
-        files = [r[0] for r in cur.fetchall()]
-        cur.close()
-        return JSONResponse(content=[{"filename":f, "snippet":""} for f in files])
+    fs = FilterSet(country, job_area, source_type, filenames, embedding_model=embedder.model)
 
+    if not q or not q.strip():
+        files = await run_in_threadpool(filtered_filenames, fs)
+        return JSONResponse(content=[{"filename": f, "snippet": ""} for f in files])
 
     # 1) embed the query
-    emb = get_embedding(q)
-
-    # 2) build case‐insensitive filters
-    filters = []
-    params: list[Any] = []
-
-    if country:
-        filters.append("country ILIKE %s")
-        params.append(f"%{country}%")
-    if job_area:
-        filters.append("job_area ILIKE %s")
-        params.append(f"%{job_area}%")
-    if source_type:
-        filters.append("source_type ILIKE %s")
-        params.append(f"%{source_type}%")
-    if filenames:
-        filters.append("filename = ANY(%s)");   
-        params.append(filenames)
-
-    where_sql = ""
-    if filters:
-        where_sql = "WHERE " + " AND ".join(filters)
-
-    # 3) full SQL
+    emb = await get_embedding(q)
+
+    # 2) query
+    rows = await search_chunks(q, emb, fs, k, hybrid=hybrid, rerank=rerank, ef_search=ef_search, probes=probes, exact=exact)
+
+    # 3) return
+    return json_response([{"filename": fn, "snippet": text[:200]} for fn, text, _ in rows])
+
+
+def filtered_filenames(fs: FilterSet) -> list[str]:
+    if store is not None:
+        return store.filenames(fs)
+    where_sql, params = fs.where()
     sql = f"""
-        SELECT filename,
-               substring(full_text, 1, 200) AS snippet
+      SELECT filename
         FROM documents
-        {where_sql}
-        ORDER BY content_embedding <=> %s::vector
-        LIMIT %s
+       {where_sql}
+    GROUP BY filename
+    ORDER BY MAX(creation_date) DESC
     """
-    # append our vector + limit
-    params.extend([emb, k])
-
-    # 4) query
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    # 5) return
-    return JSONResponse(
-      content=[{"filename": fn, "snippet": sn} for fn, sn in rows]
-    )
+    with db.get_cursor() as cur:
+        cur.execute(sql, params)
+        return [row[0] for row in cur.fetchall()]
 
 # ── Metadata endpoint ──
 @app.get("/metadata")
 def list_metadata():
-    conn = get_db_connection()
-    cur  = conn.cursor()
-    # Distinct countries
-    cur.execute("SELECT DISTINCT country FROM documents ORDER BY country;")
-    countries = [row[0] for row in cur.fetchall()]
-    # Distinct job areas
-    cur.execute("SELECT DISTINCT job_area FROM documents ORDER BY job_area;")
-    job_areas = [row[0] for row in cur.fetchall()]
-    # Distinct source types
-    cur.execute("SELECT DISTINCT source_type FROM documents ORDER BY source_type;")
-    source_types = [row[0] for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    # one entry per normalized key, so "Germany" and "germany " show up once
+    if store is not None:
+        values = {field: store.field_values(field) for field in FILTER_FIELDS}
+    else:
+        values = {}
+        with db.get_cursor() as cur:
+            for field in FILTER_FIELDS:
+                cur.execute(f"SELECT min({field}) FROM documents GROUP BY {field}_key ORDER BY 1;")
+                values[field] = [row[0] for row in cur.fetchall()]
     return {
-        "countries": countries,
-        "job_areas": job_areas,
-        "source_types": source_types
+        "countries": values["country"],
+        "job_areas": values["job_area"],
+        "source_types": values["source_type"]
     }
     
     # ── List all stored filenames ──
 @app.get("/documents")
 def list_documents(
-    country: Optional[str] = Query(None, description="Filter by country"),
-    job_area: Optional[str] = Query(None, description="Filter by job_area"),
-    source_type: Optional[str] = Query(None, description="Filter by source_type"),
+    country: Optional[List[str]] = Query(None, description="Filter by country"),
+    job_area: Optional[List[str]] = Query(None, description="Filter by job_area"),
+    source_type: Optional[List[str]] = Query(None, description="Filter by source_type"),
     filenames: List[str]       = Query(None),
 ):
-    conn = get_db_connection()
-    cur  = conn.cursor()
-
-    # build dynamic WHERE clauses
-    filters = []
-    params  = []
-    if country:
-        filters.append("country ILIKE %s")
-        params.append(f"%{country}%")
-    if job_area:
-        filters.append("job_area ILIKE %s")
-        params.append(f"%{job_area}%")
-    if source_type:
-        filters.append("source_type ILIKE %s")
-        params.append(f"%{source_type}%")
-    if filenames:
-        filters.append("filename = ANY(%s)")
-        params.append(filenames)
-
-
-    where_sql = ("WHERE " + " AND ".join(filters)) if filters else ""
-
-    sql = f"""
-      SELECT filename
-        FROM documents
-       {where_sql}
-    GROUP BY filename
-    ORDER BY MAX(creation_date) DESC
-    """
-    cur.execute(sql, params)
-    files = [row[0] for row in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return files
+    return filtered_filenames(FilterSet(country, job_area, source_type, filenames))
 
 
 # ── Delete a document’s chunks by filename ──
 @app.delete("/documents")
 def delete_document(filename: str = Query(..., description="Filename to delete")):
-    conn = get_db_connection()
-    cur  = conn.cursor()
-    cur.execute("DELETE FROM documents WHERE filename = %s;", (filename,))
-    conn.commit()
-    cur.close()
-    conn.close()
+    if store is not None:
+        store.delete(filename)
+    else:
+        with db.get_cursor(commit=True) as cur:
+            cur.execute("DELETE FROM documents WHERE filename = %s;", (filename,))
+    crawler.forget(filename)
+    invalidate_answers(filename)
     return {"detail": f"Deleted all chunks for {filename}"}
 
+# ── Speech-to-text: spooled to disk, long recordings split and transcribed in parallel (see transcription.py) ──
 @app.post("/api/transcribe")
 async def transcribe_audio(file: UploadFile = File(...)):
     """
-    Reads an audio/webm blob, POSTs to OpenAI’s whisper transcription
-    REST endpoint, and returns the transcript text.
+    Transcribes an uploaded recording (the Dashboard sends audio/webm) and
+    returns the transcript text. Uploads over TRANSCRIBE_MAX_MB are refused
+    with 413 before they are read.
     """
+    workdir = await run_in_threadpool(tempfile.mkdtemp, prefix="transcribe_")
     try:
-        # 1) Read raw bytes
-        data = await file.read()
+        path = os.path.join(workdir, "recording" + transcription.extension(file.filename, file.content_type))
+        await run_in_threadpool(save_upload, file, path)
+        with stage("transcribe"):
+            result = await transcription.transcribe(path, file.content_type)
+        return {"transcript": result["text"], "segments": result["segments"]}
+    except transcription.TranscriptionError as e:
+        log.warning(f"❌ Transcription failed: {e}")
+        raise HTTPException(status_code=e.status_code, detail=f"Transcription failed: {e}")
+    except Exception as e:
+        log.exception("❌ Transcription failed")
+        raise HTTPException(status_code=500, detail=f"Transcription failed: {e}")
+    finally:
+        await run_in_threadpool(shutil.rmtree, workdir, True)
 
-        # 2) Prepare multipart/form-data payload
-        files = {
-            "file": (file.filename, data, file.content_type),
-        }
-        # whisper only needs the model param
-        payload = {
-            "model":    "whisper-1",
-            "language": "en"    
-            }
 
-        # 3) Call REST API
-        resp = requests.post(
-            "https://api.openai.com/v1/audio/transcriptions",
-            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
-            data=payload,
-            files=files,
-        )
-        resp.raise_for_status()
+# ── Text-to-speech: cached on disk, streamed on a miss (see tts_cache.py) ──
+TTS_MODEL = os.getenv("TTS_MODEL", "tts-1")
+TTS_VOICE = os.getenv("TTS_VOICE", "alloy")
+tts_cache = build_tts_cache()
 
-        # 4) Parse JSON and return
-        json_ = resp.json()
-        return {"transcript": json_["text"]}
 
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Transcription failed: {e}")
-    
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    Awaits `on_close()` however the response ends. The body generator's own
+    finally only runs once it has been started, and a BackgroundTask only
+    after a complete send; neither covers a client that disconnects before the
+    first chunk.
+    """
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.on_close()
 
 
 @app.post("/api/tts")
-async def tts(text: str = Form(...)):
+async def tts(text: str = Form(...), voice: Optional[str] = Form(None)):
     """
-    Receives `text` as form-data, calls OpenAI’s REST /v1/audio/speech endpoint,
-    and returns raw MP3 bytes with the correct MIME type.
+    Receives `text` (and optionally `voice`) as form-data and returns MP3 audio:
+    read from the disk cache when this text was synthesized before, otherwise
+    forwarded from OpenAI's /v1/audio/speech as the bytes arrive, so playback
+    can start before synthesis ends. Completed syntheses are cached.
     """
+    voice = voice or TTS_VOICE
+    key = audio_key(text, voice, TTS_MODEL)
+    if tts_cache is not None:
+        path = await run_in_threadpool(tts_cache.get, key)
+        metrics.CACHE_LOOKUPS.inc(cache="tts", result="miss" if path is None else "hit")
+        if path is not None:
+            return FileResponse(path, media_type="audio/mpeg", headers={"X-TTS-Cache": "hit"})
+
+    payload = {"model": TTS_MODEL, "voice": voice, "input": text, "response_format": "mp3"}
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}"}
+    session = await http_client.init_session()
     try:
-        payload = {
-            "model":  "tts-1",
-            "voice":  "alloy",
-            "input":  text,
-            "format": "mp3",
-            "stream": False
-        }
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type":  "application/json"
-        }
-
-        # Send the request
-        r = requests.post(
-            "https://api.openai.com/v1/audio/speech",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        r.raise_for_status()
-
-        # If the response is raw audio, grab bytes directly
-        content_type = r.headers.get("Content-Type", "")
-        if content_type.startswith("audio/"):
-            audio_bytes = r.content
-        else:
-            # Otherwise expect a JSON body with base64-encoded "audio"
-            try:
-                data = r.json()
-            except ValueError:
-                print("❌ TTS upstream returned invalid JSON:\n", r.text)
-                raise HTTPException(
-                    status_code=500,
-                    detail="TTS failed: upstream returned invalid JSON"
-                )
+        # time to the first byte; the rest streams to the client
+        with stage("tts"):
+            upstream = await session.post(
+                f"{openai.api_base}/audio/speech", headers=headers, json=payload,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60),
+            )
+    except Exception as e:
+        log.exception("❌ TTS failed")
+        raise HTTPException(status_code=500, detail=f"TTS failed: {e}")
 
-            audio_b64 = data.get("audio")
-            if not audio_b64:
-                print("❌ TTS JSON missing ‘audio’ key:", data)
-                raise HTTPException(
-                    status_code=500,
-                    detail="TTS failed: no audio in response"
-                )
-            audio_bytes = base64.b64decode(audio_b64)
+    if upstream.status != 200:
+        body = await upstream.text()
+        upstream.release()
+        log.error("❌ TTS upstream error", extra={"status": upstream.status, "body": body[:500]})
+        raise HTTPException(status_code=500, detail=f"TTS failed: upstream returned {upstream.status}")
 
-        # Return raw MP3 bytes
+    if not upstream.content_type.startswith("audio/"):
+        # otherwise expect a JSON body with base64-encoded "audio"
+        try:
+            data = await upstream.json(content_type=None)
+        except ValueError:
+            log.error("❌ TTS upstream returned invalid JSON")
+            raise HTTPException(status_code=500, detail="TTS failed: upstream returned invalid JSON")
+        finally:
+            upstream.release()
+        audio_b64 = data.get("audio") if isinstance(data, dict) else None
+        if not audio_b64:
+            log.error("❌ TTS JSON missing ‘audio’ key")
+            raise HTTPException(status_code=500, detail="TTS failed: no audio in response")
+        audio_bytes = base64.b64decode(audio_b64)
+        if tts_cache is not None:
+            await run_in_threadpool(tts_cache.put, key, audio_bytes)
         return Response(content=audio_bytes, media_type="audio/mpeg")
 
-    except HTTPException:
-        # Re-throw known HTTPExceptions
+    try:
+        writer = await run_in_threadpool(tts_cache.writer, key) if tts_cache is not None else None
+    except BaseException:
+        upstream.release()
         raise
-    except Exception as e:
-        # Log unexpected errors
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"TTS failed: {e}")
+
+    finished = False
+
+    async def finish(complete: bool):
+        # a client that hangs up closes the upstream response and leaves no cache entry
+        nonlocal finished
+        if finished:
+            return
+        finished = True
+        upstream.release()
+        if writer is not None:
+            await run_in_threadpool(writer.commit if complete else writer.abort)
+
+    async def audio():
+        complete = False
+        try:
+            async for chunk in upstream.content.iter_any():
+                if writer is not None:
+                    await run_in_threadpool(writer.write, chunk)
+                yield chunk
+            complete = True
+        finally:
+            # shielded: after a disconnect the response's task is being cancelled
+            with anyio.CancelScope(shield=True):
+                await finish(complete)
+
+    return ClosingStreamingResponse(
+        audio(),
+        on_close=lambda: finish(False),
+        media_type="audio/mpeg",
+        headers={"X-TTS-Cache": "miss" if writer is not None else "off", "Cache-Control": "no-cache"},
+    )
+
+
+# ── Prometheus metrics (see metrics.py) ──
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# ── DB pool stats ──
+@app.get("/health/db")
+def db_health():
+    try:
+        with db.get_cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+        return {"status": "ok", "pools": db.pool_stats()}
+    except HTTPException as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "detail": e.detail, "pools": db.pool_stats()}
+        )
+
+
+# ── Embedding cache stats ──
+@app.get("/health/embedding-cache")
+def embedding_cache_stats():
+    if embedding_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_cache.stats()}
 
 
+# ── TTS audio cache stats ──
+@app.get("/health/tts-cache")
+def tts_cache_stats():
+    if tts_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **tts_cache.stats()}
+
+
+# ── Answer cache stats ──
+@app.get("/health/answer-cache")
+def answer_cache_stats():
+    if answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **answer_cache.stats()}
+
+
+# ── Local vector store stats (see local_store.py) ──
+@app.get("/health/vector-store")
+def vector_store_stats():
+    if store is None:
+        return {"backend": "postgres"}
+    return store.stats()
+
+
+# ── Rerank stage status ──
+@app.get("/health/rerank")
+def rerank_status():
+    return {"default": rerank_default(), **rerank_info()}
+
+
+# ── Vector index admin ──
+class VectorIndexRequest(BaseModel):
+    method:          Literal["hnsw", "ivfflat"] = "hnsw"
+    m:               Optional[int] = Field(None, ge=2, le=100)
+    ef_construction: Optional[int] = Field(None, ge=4, le=1000)
+    lists:           Optional[int] = Field(None, ge=1, le=100000)
+
+
+@app.get("/admin/vector-index")
+def vector_index_info():
+    return {
+        "configured": vector_index.configured_method(),
+        "serving":    spec.describe() if (spec := vector_index.active_spec()) else None,
+        "rows":       vector_index.row_count(),
+        "indexes":    vector_index.list_indexes(),
+    }
+
+
+@app.post("/admin/vector-index")
+def rebuild_vector_index(req: VectorIndexRequest):
+    with vector_index.maintenance_lock():
+        built = vector_index.create_index(req.method, m=req.m, ef_construction=req.ef_construction, lists=req.lists,
+                                          spec=vector_index.index_spec())
+        dropped = vector_index.drop_indexes(keep=built["name"])
+    return {"built": built, "dropped": dropped}
+
+
+def maintain_vector_index():
+    try:
+        built = vector_index.maintain()
+        if built:
+            log.info(f"✔️  Built vector index {built['name']} {built['options']}")
+    except Exception:
+        log.exception("⚠️  Vector index maintenance failed")
+
+
+def check_embedding_dim():
+    if store is not None:
+        declared, target = store.dim, f"the local store at {store.path}"
+    else:
+        with db.get_cursor() as cur:
+            declared = vector_index.column_dimensions(cur)
+        target = "documents.content_embedding"
+    dim = embedder.dim
+    log.info(f"✔️  Embeddings: {embedder.provider} {embedder.model} ({dim} dims)")
+    if declared and declared != dim:
+        log.warning(f"⚠️  {target} holds {declared}-dim vectors but {embedder.model} produces "
+                    f"{dim}-dim vectors; ingestion and search will fail until it is migrated")
+
 
 # ── Startup log ──
 @app.on_event("startup")
-def on_startup():
-    print("🔌 SmartFusion RAG API starting…")
-    print(f"✔️  OpenAI key loaded: {'yes' if openai.api_key else 'no'}")
-    print("🚀  Endpoints: POST /ingest_pdf, /ingest_url, /query, /answer, GET /search, GET /documents, DELETE /documents")
+async def on_startup():
+    log.info("🔌 SmartFusion RAG API starting…")
+    log.info(f"✔️  OpenAI key loaded: {'yes' if openai.api_key else 'no'}")
+    if store is not None:
+        # no Postgres: chunks live in the local store and jobs in memory
+        use_memory_jobs()
+        crawler.use_memory()
+        stats = store.stats()
+        log.info(f"✔️  Local vector store: {stats['rows']} rows, {stats['files']} files in {stats['path']}"
+                 f" (hnsw {'on' if stats['hnsw'] else 'off'})")
+        check_embedding_dim()
+    else:
+        try:
+            pool = db.init_pool()
+            log.info(f"✔️  DB pool ready (size={pool.size}, overflow={pool.max_overflow})")
+            schema.ensure_schema()
+            ensure_jobs_schema()
+            crawler.ensure_schema()
+            check_embedding_dim()
+            # index builds can take minutes on a large table; don't hold up startup
+            threading.Thread(target=maintain_vector_index, name="vector-index", daemon=True).start()
+        except HTTPException as e:
+            log.warning(f"⚠️  DB pool not ready yet: {e.detail}")
+    job_queue.start()
+    log.info(f"✔️  Ingest workers started: {job_queue.workers}")
+    if store is None and db.async_pool_enabled():
+        try:
+            await db.init_async_pool()
+            log.info("✔️  Async DB pool ready")
+        except Exception as e:
+            log.warning(f"⚠️  Async DB pool not ready, using the sync pool: {e}")
+    await http_client.init_session()
+    if rerank_default():
+        get_reranker()   # start loading the model now rather than on the first request
+    log.info("🚀  Endpoints: POST /ingest_pdf, /ingest_url, /query, /answer, /answer/stream, GET /search, GET /documents, DELETE /documents, GET /jobs/{id}, GET|POST /admin/vector-index, GET /health/db, GET /health/embedding-cache, GET /health/answer-cache, GET /health/tts-cache, GET /health/rerank, GET /health/vector-store, GET /metrics")
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    job_queue.stop()
+    pdf_extract.shutdown()
+    db.close_pool()
+    await db.close_async_pool()
+    await http_client.close_session()
+    close_reranker()
+    embedder.close()
+    if store is not None:
+        store.close()
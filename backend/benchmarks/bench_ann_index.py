@@ -0,0 +1,101 @@
+"""
+Exact vs. ANN-indexed vector search on a synthetic corpus.
+
+Loads clustered unit vectors into a scratch table, measures exact (sequential
+scan) latency to get the ground truth, then builds an HNSW or IVFFlat index the
+same way vector_index.py does for `documents` and sweeps ef_search / probes,
+reporting latency percentiles and recall@k for each setting.
+
+Run from backend/ with the usual DB_* env vars:
+
+    python -m benchmarks.bench_ann_index --rows 50000 --dim 1536 --method hnsw --sweep 20,40,100,200
+    python -m benchmarks.bench_ann_index --method ivfflat --sweep 1,5,10,20
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+import db
+import vector_index
+from benchmarks.common import (
+    Timer, copy_vectors, percentiles, print_table, recall_at_k, synthetic_vectors, vector_literal,
+)
+
+TABLE  = "bench_ann_vectors"
+COLUMN = "embedding"
+
+
+def run_queries(queries, k: int, **settings) -> tuple[list[float], list[list[int]]]:
+    latencies, results = [], []
+    sql = f"SELECT id FROM {TABLE} ORDER BY {COLUMN} <=> %s::vector LIMIT %s"
+    for q in queries:
+        with db.get_cursor() as cur:
+            vector_index.apply_search_settings(cur, k, **settings)
+            with Timer() as t:
+                cur.execute(sql, (vector_literal(q), k))
+                ids = [r[0] for r in cur.fetchall()]
+        latencies.append(t.elapsed)
+        results.append(ids)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--method", choices=vector_index.METHODS, default="hnsw")
+    parser.add_argument("--sweep", default=None,
+                        help="comma-separated ef_search (hnsw) or probes (ivfflat) values")
+    parser.add_argument("--m", type=int, default=None)
+    parser.add_argument("--ef-construction", type=int, default=None)
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch table afterwards")
+    args = parser.parse_args()
+
+    load_dotenv()
+    knob  = "ef_search" if args.method == "hnsw" else "probes"
+    sweep = [int(v) for v in (args.sweep or ("20,40,100,200" if knob == "ef_search" else "1,5,10,20")).split(",")]
+
+    print(f"▶️  {args.rows} × {args.dim}d vectors, {args.queries} queries, k={args.k}, {args.method}")
+    corpus  = synthetic_vectors(args.rows, args.dim, seed=1)
+    queries = synthetic_vectors(args.queries, args.dim, seed=2)
+
+    with db.get_cursor(commit=True) as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cur.execute(f"CREATE UNLOGGED TABLE {TABLE} (id serial PRIMARY KEY, {COLUMN} vector({args.dim}))")
+        with Timer() as t:
+            copy_vectors(cur, TABLE, COLUMN, corpus)
+    print(f"   loaded in {t.elapsed:.1f}s")
+
+    try:
+        with db.get_cursor(commit=True) as cur:
+            cur.execute(f"ANALYZE {TABLE}")
+
+        exact_lat, truth = run_queries(queries, args.k, exact=True)
+        rows = [{"mode": "exact", knob: "-", "recall@k": 1.0, **percentiles(exact_lat)}]
+
+        with Timer() as t:
+            built = vector_index.create_index(
+                args.method, table=TABLE, column=COLUMN, concurrently=False,
+                m=args.m, ef_construction=args.ef_construction, lists=args.lists,
+            )
+        size = next(ix["size_bytes"] for ix in vector_index.list_indexes(TABLE, COLUMN))
+        print(f"   built {args.method} {built['options']} in {t.elapsed:.1f}s, {size / 2**20:.1f} MiB")
+
+        for value in sweep:
+            lat, found = run_queries(queries, args.k, **{knob: value})
+            rows.append({"mode": args.method, knob: value, "recall@k": recall_at_k(found, truth), **percentiles(lat)})
+
+        print()
+        print_table(rows)
+    finally:
+        if not args.keep:
+            with db.get_cursor(commit=True) as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Size, latency and recall of compact vector indexes on a synthetic corpus.
+
+Loads clustered unit vectors into a scratch table and builds one HNSW index per
+variant the way vector_index.py builds it for `documents`, then runs the same
+two-stage search the API uses: rescore factor x k candidates from the compact
+index, ranked exactly against the full vectors in the table. Recall@k is
+measured against an exact scan; rescore factor 1 shows the compact index alone.
+
+Variants are "<quantization>[:<dim>]": "none", "halfvec", "binary", or with
+Matryoshka truncation e.g. "halfvec:512" (anything but "none" needs pgvector
+>= 0.7). Run from backend/ with the usual DB_* env vars:
+
+    python -m benchmarks.bench_quantization --rows 50000 --dim 1536 --variants none,halfvec,binary,halfvec:512
+    python -m benchmarks.bench_quantization --variants binary --factors 1,4,10,20 --ef-search 200
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+import db
+import vector_index
+from benchmarks.common import (
+    Timer, copy_vectors, percentiles, print_table, recall_at_k, synthetic_vectors, vector_literal,
+)
+
+TABLE  = "bench_quantized_vectors"
+COLUMN = "embedding"
+
+
+def parse_variant(variant: str, full_dim: int) -> vector_index.IndexSpec:
+    quantization, _, dim = variant.partition(":")
+    return vector_index.IndexSpec(quantization or "none", int(dim) if dim else None, full_dim)
+
+
+def run_queries(queries, k: int, spec=None, factor: int = 1, **settings) -> tuple[list[float], list[list[int]]]:
+    if spec is not None and spec.compact:
+        fetch = k * factor
+        sql = f"""
+            SELECT id FROM (
+                SELECT id, {COLUMN} <=> %s::vector AS distance
+                  FROM {TABLE}
+                 ORDER BY {spec.order_by(COLUMN)}
+                 LIMIT %s
+            ) candidates
+             ORDER BY distance
+             LIMIT %s
+        """
+        params = lambda q: (q, q, fetch, k)
+    else:
+        fetch = k
+        sql = f"SELECT id FROM {TABLE} ORDER BY {COLUMN} <=> %s::vector LIMIT %s"
+        params = lambda q: (q, k)
+
+    latencies, results = [], []
+    for q in queries:
+        literal = vector_literal(q)
+        with db.get_cursor() as cur:
+            vector_index.apply_search_settings(cur, fetch, **settings)
+            with Timer() as t:
+                cur.execute(sql, params(literal))
+                ids = [r[0] for r in cur.fetchall()]
+        latencies.append(t.elapsed)
+        results.append(ids)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--variants", default="none,halfvec,binary,halfvec:512")
+    parser.add_argument("--factors", default="1,4,10", help="comma-separated rescore factors")
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch table afterwards")
+    args = parser.parse_args()
+
+    load_dotenv()
+    specs   = [(v, parse_variant(v, args.dim)) for v in args.variants.split(",")]
+    factors = [int(f) for f in args.factors.split(",")]
+
+    with db.get_cursor() as cur:
+        cur.execute(vector_index.EXTENSION_VERSION_SQL)
+        vector_index.record_extension_version(cur.fetchall())
+    if not vector_index.compact_index_known():
+        skipped = [v for v, spec in specs if spec.compact]
+        if skipped:
+            print(f"⚠️  pgvector < 0.7, skipping {', '.join(skipped)}")
+        specs = [(v, spec) for v, spec in specs if not spec.compact]
+
+    print(f"▶️  {args.rows} × {args.dim}d vectors, {args.queries} queries, k={args.k}")
+    corpus  = synthetic_vectors(args.rows, args.dim, seed=1)
+    queries = synthetic_vectors(args.queries, args.dim, seed=2)
+
+    with db.get_cursor(commit=True) as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cur.execute(f"CREATE UNLOGGED TABLE {TABLE} (id serial PRIMARY KEY, {COLUMN} vector({args.dim}))")
+        with Timer() as t:
+            copy_vectors(cur, TABLE, COLUMN, corpus)
+    print(f"   loaded in {t.elapsed:.1f}s")
+
+    try:
+        with db.get_cursor(commit=True) as cur:
+            cur.execute(f"ANALYZE {TABLE}")
+            cur.execute("SELECT pg_table_size(%s)", (TABLE,))
+            table_size = cur.fetchone()[0]
+        print(f"   table (full vectors, rescored from): {table_size / 2**20:.1f} MiB")
+
+        exact_lat, truth = run_queries(queries, args.k, exact=True)
+        rows = [{"variant": "exact", "index_mib": 0.0, "rescore": "-", "recall@k": 1.0, **percentiles(exact_lat)}]
+
+        for variant, spec in specs:
+            with Timer() as t:
+                built = vector_index.create_index("hnsw", table=TABLE, column=COLUMN, concurrently=False, spec=spec)
+            size = next(ix["size_bytes"] for ix in vector_index.list_indexes(TABLE, COLUMN)
+                        if ix["name"] == built["name"])
+            print(f"   built {variant} in {t.elapsed:.1f}s, {size / 2**20:.1f} MiB")
+
+            for factor in (factors if spec.compact else [1]):
+                lat, found = run_queries(queries, args.k, spec, factor, ef_search=args.ef_search)
+                rows.append({
+                    "variant":   variant,
+                    "index_mib": size / 2**20,
+                    "rescore":   factor if spec.compact else "-",
+                    "recall@k":  recall_at_k(found, truth),
+                    **percentiles(lat),
+                })
+            vector_index.drop_indexes(TABLE, COLUMN)
+
+        print()
+        print_table(rows)
+    finally:
+        if not args.keep:
+            with db.get_cursor(commit=True) as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
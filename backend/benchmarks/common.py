@@ -0,0 +1,99 @@
+"""
+Helpers shared by the benchmark scripts: synthetic corpora, timing and report formatting.
+"""
+import io
+import time
+from functools import lru_cache
+
+import numpy as np
+
+
+def synthetic_vectors(rows: int, dim: int, clusters: int = 64, spread: float = 0.35, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random cluster centres, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels  = rng.integers(0, clusters, size=rows)
+    vectors = centres[labels] + spread * rng.standard_normal((rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+VOCABULARY = (
+    "employer employee contract salary overtime leave holiday notice termination probation "
+    "insurance pension tax social security benefit allowance permit visa residence work hours "
+    "shift remote office safety training certificate qualification apprenticeship wage minimum "
+    "agreement union collective bargaining dismissal severance parental sick pay compensation "
+    "regulation compliance obligation requirement application deadline registration authority"
+).split()
+
+
+@lru_cache(maxsize=4)
+def _zipf_cdf(vocabulary: int) -> np.ndarray:
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    return np.cumsum(weights) / weights.sum()
+
+
+def synthetic_text(seed: int, words: int = 120, vocabulary: int = 20000) -> str:
+    """
+    Deterministic filler text for a chunk (the same seed gives the same text).
+    Word ranks are Zipf-distributed like natural text: the first few words are
+    everywhere, most of the `vocabulary` is rare, so full-text search stays selective.
+    """
+    rng = np.random.default_rng(seed)
+    ranks = np.searchsorted(_zipf_cdf(vocabulary), rng.random(words))
+    return " ".join(VOCABULARY[r] if r < len(VOCABULARY) else f"term{r}" for r in ranks) + f" ({seed})"
+
+
+def vector_literal(vec) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vec) + "]"
+
+
+def copy_vectors(cur, table: str, column: str, vectors: np.ndarray, batch: int = 5000):
+    """COPY `vectors` into `table.column` (ids are assigned by the table)."""
+    for start in range(0, len(vectors), batch):
+        buf = io.StringIO()
+        for vec in vectors[start:start + batch]:
+            buf.write(vector_literal(vec) + "\n")
+        buf.seek(0)
+        cur.copy_expert(f"COPY {table} ({column}) FROM STDIN", buf)
+
+
+def percentiles(samples: list[float]) -> dict:
+    arr = np.asarray(samples) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+    }
+
+
+def recall_at_k(found: list[list[int]], truth: list[list[int]]) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    total = sum(len(t) for t in truth)
+    return hits / total if total else 0.0
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def print_table(rows: list[dict]):
+    if not rows:
+        return
+    cols = list(rows[0])
+    widths = {c: max(len(c), *(len(_fmt(r[c])) for r in rows)) for c in cols}
+    print("  ".join(c.ljust(widths[c]) for c in cols))
+    print("  ".join("-" * widths[c] for c in cols))
+    for r in rows:
+        print("  ".join(_fmt(r[c]).ljust(widths[c]) for c in cols))
+
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
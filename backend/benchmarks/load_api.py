@@ -0,0 +1,442 @@
+"""
+Load test of the API on a synthetic corpus: latency percentiles and throughput
+per endpoint, and per stage (embed, search, rerank, llm, serialize) from the
+Server-Timing header the API returns (see stages.py).
+
+For each corpus scale the `documents` table is topped up with synthetic chunks
+(filenames "bench_corpus_*", embedded the way the stub embeds queries, so
+they cluster like real embeddings), the API is started under uvicorn against the stub OpenAI
+server (benchmarks/stub_openai.py), and each endpoint is driven by
+--concurrency closed-loop clients for --duration seconds. /ingest_pdf uploads
+--ingest-docs generated PDFs and is timed to job completion. The embedding and
+answer caches are off unless --warm-caches, so every request embeds and
+generates.
+
+Run from backend/ against a scratch database (the usual DB_* env vars); with
+VECTOR_BACKEND=local the corpus goes to a temporary local store instead:
+
+    python -m benchmarks.load_api --scales 1000,10000,100000 --concurrency 8 --duration 20
+    python -m benchmarks.load_api --endpoints search,query --country Germany --json results.json
+    python -m benchmarks.load_api --baseline results.json --tolerance 0.2   # exits 1 if a p95 regressed
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date
+
+import aiohttp
+import fitz  # PyMuPDF
+from dotenv import load_dotenv
+
+import db
+import schema
+import vector_index
+from benchmarks.common import Timer, percentiles, print_table, synthetic_text
+from benchmarks.stub_openai import stub_embedding
+from bulk_insert import write_rows
+from dedup import content_hash
+from embeddings import get_embedder
+from local_store import LocalVectorStore, backend
+from stages import parse_server_timing
+
+ENDPOINTS      = ("search", "query", "answer", "answer_stream", "ingest_pdf")
+BACKEND_DIR    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNKS_PER_DOC = 20
+COUNTRIES      = ("Germany", "France", "India", "Brazil", "Canada", "Japan", "Kenya", "Spain")
+JOB_AREAS      = ("Engineering", "Healthcare", "Logistics", "Finance", "Education", "Hospitality")
+SOURCE_TYPES   = ("PDF", "HTML")
+
+
+# ── Synthetic corpus ──
+def chunk_row(i: int, dim: int, model: str) -> dict:
+    """Chunk `i` of the corpus; the same index always gives the same row."""
+    text = synthetic_text(i)
+    doc  = i // CHUNKS_PER_DOC
+    return {
+        "filename":          f"bench_corpus_{doc:07d}.pdf",
+        "country":           COUNTRIES[doc % len(COUNTRIES)],
+        "job_area":          JOB_AREAS[doc % len(JOB_AREAS)],
+        "source_type":       SOURCE_TYPES[doc % len(SOURCE_TYPES)],
+        "target_group":      "Unknown",
+        "owner":             "benchmark",
+        "creation_date":     date.today(),
+        "full_text":         text,
+        "content_embedding": stub_embedding(text, dim).tolist(),
+        "metadata":          {"chunk_index": i % CHUNKS_PER_DOC, "page": i % CHUNKS_PER_DOC + 1},
+        "content_hash":      content_hash(text),
+        "document_hash":     f"bench-{doc}",
+        "embedding_model":   model,
+        "embedding_dim":     dim,
+    }
+
+
+def corpus_rows(store) -> int:
+    if store is not None:
+        return store.stats()["rows"]
+    with db.get_cursor() as cur:
+        cur.execute("SELECT count(*) FROM documents WHERE filename LIKE 'bench_corpus_%'")
+        return cur.fetchone()[0]
+
+
+def seed_corpus(start: int, stop: int, dim: int, model: str, store=None, batch: int = 2000):
+    for lo in range(start, stop, batch):
+        rows = [chunk_row(i, dim, model) for i in range(lo, min(stop, lo + batch))]
+        if store is not None:
+            store.append(rows)
+        else:
+            with db.get_cursor(commit=True) as cur:
+                write_rows(cur, rows)
+    if store is None:
+        with db.get_cursor(commit=True) as cur:
+            cur.execute("ANALYZE documents")
+        # build the ANN index now, rather than under load in the API's startup thread
+        vector_index.maintain()
+
+
+def drop_rows(pattern: str):
+    with db.get_cursor(commit=True) as cur:
+        cur.execute("DELETE FROM documents WHERE filename LIKE %s", (pattern,))
+
+
+def upload_pdf(seed: int, pages: int) -> bytes:
+    """A PDF with `pages` pages of filler text no other upload shares, so nothing is deduplicated."""
+    pdf = fitz.open()
+    for p in range(pages):
+        page = pdf.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), synthetic_text(seed * 1000 + p, words=350), fontsize=9)
+    data = pdf.tobytes()
+    pdf.close()
+    return data
+
+
+# ── Processes ──
+def start_process(args: list[str], env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "ab")
+    return subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop_process(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+async def wait_ready(url: str, proc: subprocess.Popen, log_path: str, timeout: float = 180.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                break
+            try:
+                async with session.get(url) as resp:
+                    if resp.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.25)
+    with open(log_path, errors="replace") as f:
+        tail = f.read()[-3000:]
+    raise RuntimeError(f"{url} did not come up:\n{tail}")
+
+
+# ── Load generation ──
+class Samples:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.stages = defaultdict(list)   # stage -> seconds
+        self.items      = 0
+        self.errors     = 0
+        self.last_error = None
+        self.elapsed    = 0.0
+
+    def add(self, seconds: float, stages: dict, items: int = 1):
+        self.latencies.append(seconds)
+        for name, ms in stages.items():
+            self.stages[name].append(ms / 1000)
+        self.items += items
+
+
+async def drive(call, concurrency: int, duration: float = None, requests: int = None) -> Samples:
+    """Closed loop: `concurrency` clients each send the next request as soon as the last returns."""
+    samples  = Samples()
+    counter  = itertools.count()
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def client():
+        while True:
+            i = next(counter)
+            if (requests is not None and i >= requests) or (deadline and time.perf_counter() >= deadline):
+                return
+            started = time.perf_counter()
+            try:
+                stages, items = await call(i)
+                samples.add(time.perf_counter() - started, stages, items)
+            except Exception as e:
+                samples.errors += 1
+                samples.last_error = f"{type(e).__name__}: {e}"
+
+    with Timer() as t:
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+    samples.elapsed = t.elapsed
+    return samples
+
+
+class ApiClient:
+    """One call per endpoint; each returns ({stage: ms}, items processed) and raises on failure."""
+
+    def __init__(self, session: aiohttp.ClientSession, base_url: str, queries: list[str], args):
+        self.session  = session
+        self.base_url = base_url
+        self.queries  = queries
+        self.top_k    = args.k
+        self.filters  = {"country": args.country} if args.country else {}
+        self.uploads: list[tuple[str, bytes]] = []
+
+    def query(self, i: int) -> str:
+        return self.queries[i % len(self.queries)]
+
+    async def _json(self, method: str, path: str, **kwargs):
+        async with self.session.request(method, self.base_url + path, **kwargs) as resp:
+            body = await resp.read()
+            if resp.status != 200:
+                raise RuntimeError(f"{path} → {resp.status}: {body[:200]!r}")
+            return json.loads(body), parse_server_timing(resp.headers.get("Server-Timing", ""))
+
+    async def search(self, i: int):
+        params = {"q": self.query(i), "k": self.top_k, **self.filters}
+        _, stages = await self._json("GET", "/search/", params=params)
+        return stages, 1
+
+    async def query_endpoint(self, i: int):
+        body = {"question": self.query(i), "top_k": self.top_k, **self.filters}
+        _, stages = await self._json("POST", "/query", json=body)
+        return stages, 1
+
+    def chat_body(self, i: int) -> dict:
+        return {"messages": [{"role": "user", "content": self.query(i)}], "top_k": self.top_k, **self.filters}
+
+    async def answer(self, i: int):
+        _, stages = await self._json("POST", "/answer", json=self.chat_body(i))
+        return stages, 1
+
+    async def answer_stream(self, i: int):
+        started = time.perf_counter()
+        first_delta = None
+        async with self.session.post(self.base_url + "/answer/stream", json=self.chat_body(i)) as resp:
+            if resp.status != 200:
+                raise RuntimeError(f"/answer/stream → {resp.status}")
+            stages = parse_server_timing(resp.headers.get("Server-Timing", ""))
+            async for line in resp.content:
+                if line.startswith(b"event: delta") and first_delta is None:
+                    first_delta = time.perf_counter()
+                elif line.startswith(b"event: error"):
+                    raise RuntimeError("/answer/stream sent an error event")
+        if first_delta is not None:
+            stages["first_delta"] = (first_delta - started) * 1000
+        return stages, 1
+
+    async def ingest_pdf(self, i: int):
+        filename, data = self.uploads[i]
+        form = aiohttp.FormData()
+        form.add_field("file", data, filename=filename, content_type="application/pdf")
+        form.add_field("owner", "benchmark")
+        started = time.perf_counter()
+        queued, _ = await self._json("POST", "/ingest_pdf", data=form)
+        uploaded = time.perf_counter()
+        if "job_id" not in queued:
+            raise RuntimeError(f"upload rejected: {queued}")
+        while True:
+            await asyncio.sleep(0.05)
+            job, _ = await self._json("GET", f"/jobs/{queued['job_id']}")
+            if job["status"] == "failed":
+                raise RuntimeError(f"ingest job failed: {job['error']}")
+            if job["status"] == "succeeded":
+                break
+        stages = {"upload": (uploaded - started) * 1000, "job": (time.perf_counter() - uploaded) * 1000}
+        return stages, job["rows_written"]
+
+
+async def run_scale(scale: int, base_url: str, args) -> tuple[list[dict], list[dict]]:
+    # a dozen words from chunks across the corpus, about the length of a user's question
+    queries = [" ".join(synthetic_text(i).split()[:args.query_words])
+               for i in range(0, scale, max(1, scale // args.queries))][:args.queries]
+    endpoint_rows, stage_rows = [], []
+    connector = aiohttp.TCPConnector(limit=args.concurrency * 2)
+    timeout   = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        api = ApiClient(session, base_url, queries, args)
+        calls = {
+            "search":        api.search,
+            "query":         api.query_endpoint,
+            "answer":        api.answer,
+            "answer_stream": api.answer_stream,
+            "ingest_pdf":    api.ingest_pdf,
+        }
+        for name in args.endpoints:
+            if name == "ingest_pdf":
+                salt = int(time.time())
+                api.uploads = [(f"bench_upload_{salt}_{i}.pdf", upload_pdf(salt + i, args.ingest_pages))
+                               for i in range(args.ingest_docs)]
+                samples = await drive(calls[name], min(args.concurrency, args.ingest_docs), requests=args.ingest_docs)
+            else:
+                await drive(calls[name], args.concurrency, requests=args.warmup)
+                samples = await drive(calls[name], args.concurrency, duration=args.duration)
+            if samples.errors:
+                print(f"⚠️  {name}: {samples.errors} errors, last: {samples.last_error}")
+            if not samples.latencies:
+                continue
+            row = {
+                "scale":    scale,
+                "endpoint": name,
+                "requests": len(samples.latencies),
+                "errors":   samples.errors,
+                "rps":      len(samples.latencies) / samples.elapsed,
+                **percentiles(samples.latencies),
+            }
+            if name == "ingest_pdf":
+                print(f"   ingest_pdf: {samples.items} chunks in {samples.elapsed:.1f}s "
+                      f"({samples.items / samples.elapsed:.1f} chunks/s)")
+            endpoint_rows.append(row)
+            for stage_name, values in samples.stages.items():
+                stage_rows.append({"scale": scale, "endpoint": name, "stage": stage_name,
+                                   "samples": len(values), **percentiles(values)})
+    return endpoint_rows, stage_rows
+
+
+def compare(rows: list[dict], baseline_path: str, tolerance: float) -> bool:
+    """Print p95 against the baseline run; True when any endpoint regressed by more than `tolerance`."""
+    with open(baseline_path) as f:
+        baseline = {(r["scale"], r["endpoint"]): r for r in json.load(f)["endpoints"]}
+    report, regressed = [], False
+    for row in rows:
+        base = baseline.get((row["scale"], row["endpoint"]))
+        if base is None:
+            continue
+        ratio = row["p95_ms"] / base["p95_ms"] if base["p95_ms"] else 1.0
+        worse = ratio > 1 + tolerance
+        regressed |= worse
+        report.append({"scale": row["scale"], "endpoint": row["endpoint"], "base_p95_ms": base["p95_ms"],
+                       "p95_ms": row["p95_ms"], "ratio": ratio, "status": "REGRESSED" if worse else "ok"})
+    print()
+    print_table(report)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1000,10000", help="comma-separated corpus sizes, in chunks")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per endpoint")
+    parser.add_argument("--warmup", type=int, default=10, help="unrecorded requests per endpoint")
+    parser.add_argument("--queries", type=int, default=200, help="distinct query texts")
+    parser.add_argument("--query-words", type=int, default=12)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--country", default=None, help="filter every retrieval, e.g. Germany or 'G*'")
+    parser.add_argument("--ingest-docs", type=int, default=8)
+    parser.add_argument("--ingest-pages", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--embed-ms", type=float, default=40.0, help="stub embeddings latency")
+    parser.add_argument("--chat-ms", type=float, default=400.0, help="stub time to first token")
+    parser.add_argument("--token-ms", type=float, default=15.0, help="stub latency per generated word")
+    parser.add_argument("--warm-caches", action="store_true", help="leave the embedding and answer caches on")
+    parser.add_argument("--json", default=None, help="write the results here")
+    parser.add_argument("--baseline", default=None, help="results JSON of an earlier run to compare p95 against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth over the baseline")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic corpus in Postgres for the next run")
+    args = parser.parse_args()
+    args.endpoints = [e for e in args.endpoints.split(",") if e]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    load_dotenv()
+    scales  = sorted(int(s) for s in args.scales.split(","))
+    embedder = get_embedder()
+    workdir = tempfile.mkdtemp(prefix="load_api_")
+    env = {
+        **os.environ,
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.stub_port}/v1",
+        "OPENAI_API_KEY":  os.getenv("OPENAI_API_KEY") or "stub",
+    }
+    if not args.warm_caches:
+        env.update(EMBED_CACHE_SIZE="0", EMBED_CACHE_SQLITE="", ANSWER_CACHE_SIZE="0")
+    local = backend() == "local"
+    store = None
+    if local:
+        env["LOCAL_STORE_PATH"] = os.path.join(workdir, "store")
+        store = LocalVectorStore(env["LOCAL_STORE_PATH"])
+    else:
+        schema.ensure_schema()
+
+    stub_log = os.path.join(workdir, "stub.log")
+    stub = start_process(["-m", "benchmarks.stub_openai", "--port", str(args.stub_port),
+                          "--embed-ms", str(args.embed_ms), "--chat-ms", str(args.chat_ms),
+                          "--token-ms", str(args.token_ms)], env, stub_log)
+    print(f"▶️  {embedder.provider}/{embedder.model} ({embedder.dim}d), {'local store' if local else 'Postgres'}, "
+          f"concurrency {args.concurrency}, {args.duration:.0f}s per endpoint")
+    endpoint_rows, stage_rows = [], []
+    try:
+        asyncio.run(wait_ready(f"http://127.0.0.1:{args.stub_port}/stats", stub, stub_log))
+        have = corpus_rows(store)
+        for scale in scales:
+            if have < scale:
+                with Timer() as t:
+                    seed_corpus(have, scale, embedder.dim, embedder.model, store)
+                print(f"   seeded {scale - have} chunks in {t.elapsed:.1f}s")
+                have = scale
+            if store is not None:
+                store.close()
+
+            api_log = os.path.join(workdir, f"api_{scale}.log")
+            api = start_process(["-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(args.api_port),
+                                 "--workers", str(args.workers), "--log-level", "warning"], env, api_log)
+            try:
+                base_url = f"http://127.0.0.1:{args.api_port}"
+                asyncio.run(wait_ready(base_url + "/health/rerank", api, api_log))
+                print(f"▶️  {scale} chunks")
+                rows, stages = asyncio.run(run_scale(scale, base_url, args))
+                endpoint_rows += rows
+                stage_rows    += stages
+            finally:
+                stop_process(api)
+            if store is not None:
+                store = LocalVectorStore(env["LOCAL_STORE_PATH"])
+            else:
+                drop_rows("bench_upload_%")
+
+        print()
+        print_table(endpoint_rows)
+        print()
+        print_table(stage_rows)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"args": vars(args), "endpoints": endpoint_rows, "stages": stage_rows}, f, indent=2)
+        regressed = compare(endpoint_rows, args.baseline, args.tolerance) if args.baseline else False
+    finally:
+        stop_process(stub)
+        if store is not None:
+            store.close()
+        else:
+            if not args.keep:
+                drop_rows("bench_corpus_%")
+            db.close_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+A stand-in for the OpenAI API, so the load tests measure this service rather
+than the network and OpenAI's queue.
+
+Serves `/v1/embeddings` (deterministic clustered unit vectors derived from the
+input text, base64 or float lists like the real API), `/v1/chat/completions`
+(a canned answer, streamed as SSE chunks when asked), `/v1/audio/speech`
+(filler bytes standing in for MP3, sent in chunks as they are "synthesized")
+and `/v1/audio/transcriptions` (a transcript naming the upload's size), each
+after a configurable simulated latency. Point the API at it with OPENAI_API_BASE:
+
+    python -m benchmarks.stub_openai --port 8900 --embed-ms 40 --chat-ms 400 --token-ms 15
+    OPENAI_API_BASE=http://127.0.0.1:8900/v1 uvicorn app:app
+
+benchmarks/load_api.py starts it by itself.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from functools import lru_cache
+
+import numpy as np
+from aiohttp import web
+
+MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+ANSWER = (
+    "Based on the provided documents, the relevant requirements are summarised above; "
+    "see the cited sources for the exact wording and any country-specific exceptions."
+)
+
+
+@lru_cache(maxsize=8)
+def _centres(dim: int, clusters: int = 64) -> np.ndarray:
+    return np.random.default_rng(1).standard_normal((clusters, dim)).astype(np.float32)
+
+
+def stub_embedding(text: str, dim: int = 1536, spread: float = 0.35) -> np.ndarray:
+    """
+    The vector the stub returns for `text`: a cluster centre picked by the text's
+    hash plus hash-seeded noise, so corpora seeded with it look like
+    benchmarks.common.synthetic_vectors and a chunk's text finds that chunk.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    rng = np.random.default_rng(seed)
+    centres = _centres(dim)
+    vec = centres[seed % len(centres)] + spread * rng.standard_normal(dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class StubOpenAI:
+    def __init__(self, embed_ms: float, embed_item_ms: float, chat_ms: float, token_ms: float,
+                 speech_ms: float = 150.0, transcribe_ms: float = 500.0):
+        self.embed_ms      = embed_ms
+        self.embed_item_ms = embed_item_ms
+        self.chat_ms       = chat_ms
+        self.token_ms      = token_ms
+        self.speech_ms     = speech_ms
+        self.transcribe_ms = transcribe_ms
+        self.calls         = {"embeddings": 0, "embedded_inputs": 0, "chat": 0, "speech": 0, "transcriptions": 0}
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body   = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        model  = body.get("model", "text-embedding-3-small")
+        dim    = body.get("dimensions") or MODEL_DIMENSIONS.get(model, 1536)
+        self.calls["embeddings"] += 1
+        self.calls["embedded_inputs"] += len(inputs)
+        await asyncio.sleep((self.embed_ms + self.embed_item_ms * len(inputs)) / 1000)
+
+        data = []
+        for i, text in enumerate(inputs):
+            vec = stub_embedding(text, dim)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vec.astype(np.float32).tobytes()).decode("ascii")
+            else:
+                embedding = vec.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(_tokens(t) for t in inputs)
+        return web.json_response({
+            "object": "list", "data": data, "model": model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        body  = await request.json()
+        model = body.get("model", "gpt-4o")
+        self.calls["chat"] += 1
+        await asyncio.sleep(self.chat_ms / 1000)
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": model}
+
+        if not body.get("stream"):
+            prompt_tokens = sum(_tokens(m.get("content") or "") for m in body.get("messages", []))
+            await asyncio.sleep(self.token_ms * _tokens(ANSWER) / 1000)
+            return web.json_response({
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": ANSWER}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": _tokens(ANSWER),
+                          "total_tokens": prompt_tokens + _tokens(ANSWER)},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in ANSWER.split(" "):
+            await asyncio.sleep(self.token_ms / 1000)
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        done = {**base, "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        await response.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def speech(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.calls["speech"] += 1
+        await asyncio.sleep(self.speech_ms / 1000)
+        response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        # ~1 KiB of "audio" per input word, in pieces as a real synthesis streams
+        seed = hashlib.sha256(body.get("input", "").encode("utf-8")).digest()
+        for _ in range(max(1, len(body.get("input", "").split()) // 8)):
+            await asyncio.sleep(self.speech_ms / 1000 / 4)
+            await response.write(seed * 256)
+        await response.write_eof()
+        return response
+
+    async def transcriptions(self, request: web.Request) -> web.Response:
+        size = 0
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == "file":
+                while chunk := await part.read_chunk():
+                    size += len(chunk)
+        self.calls["transcriptions"] += 1
+        await asyncio.sleep(self.transcribe_ms / 1000)
+        return web.json_response({"text": f"Transcript of {size} bytes."})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.calls)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 2**20)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_post("/v1/chat/completions", self.chat)
+        app.router.add_post("/v1/audio/speech", self.speech)
+        app.router.add_post("/v1/audio/transcriptions", self.transcriptions)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--embed-ms", type=float, default=40.0, help="latency per embeddings request")
+    parser.add_argument("--embed-item-ms", type=float, default=0.2, help="extra latency per embedded input")
+    parser.add_argument("--chat-ms", type=float, default=400.0, help="time to first token")
+    parser.add_argument("--token-ms", type=float, default=15.0, help="latency per generated word")
+    parser.add_argument("--speech-ms", type=float, default=150.0, help="speech time to first byte")
+    parser.add_argument("--transcribe-ms", type=float, default=500.0, help="latency per transcription request")
+    args = parser.parse_args()
+
+    stub = StubOpenAI(args.embed_ms, args.embed_item_ms, args.chat_ms, args.token_ms, args.speech_ms,
+                      args.transcribe_ms)
+    print(f"🤖 Stub OpenAI API on http://{args.host}:{args.port}/v1")
+    web.run_app(stub.app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Bulk ingestion of a directory tree into `documents`.
+
+    python bulk_ingest.py Uploads/ --country Germany --owner Ketan
+    python bulk_ingest.py Uploads/ --workers 8 --embed-concurrency 8 --restart
+
+Every supported file under the directory (PDF, DOCX, HTML, text; see
+file_extract.py) goes through the same chunk → dedup → embed → COPY pipeline as
+the API's ingest jobs, and is stored under its path relative to the directory:
+
+  * extraction fans out across a process pool (--workers), with a bounded
+    window of files (--files-in-flight) between extraction and the database;
+  * embedding runs on one event loop: the chunk batches of every file in flight
+    share --embed-concurrency requests, and chunk text already stored reuses
+    its embedding (dedup.py);
+  * each file is written with one COPY and committed once (bulk_insert.py),
+    --writers files at a time; unchanged files are skipped by their hash.
+
+After each file commits, a line is appended to the checkpoint file (default
+<dir>/.bulk_ingest_checkpoint.jsonl). An interrupted run started again skips
+files recorded as done whose size and mtime are unchanged; a file cut off
+mid-way was never committed and is simply ingested again. Failed files are
+reported, recorded and retried on the next run.
+
+Throughput (pages/s, chunks/s, tokens/s) and per-stage times are printed at
+the end. Uses the DB_* and EMBEDDING_* env vars of the API.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import openai
+from dotenv import load_dotenv
+
+import db
+import file_extract
+import http_client
+import schema
+import vector_index
+from bulk_insert import chunk_rows, write_rows
+from chunking import iter_chunks
+from dedup import IncrementalIngest, content_hash, file_hash, lookup_embeddings
+from embeddings import count_tokens, get_embedder
+
+CHECKPOINT_NAME = ".bulk_ingest_checkpoint.jsonl"
+
+
+def find_files(root: str) -> list[str]:
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        found += [os.path.join(dirpath, f) for f in sorted(filenames)
+                  if not f.startswith(".") and file_extract.supported(f)]
+    return found
+
+
+def identity(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+# ── Checkpoints ──
+class Checkpoint:
+    """Append-only JSON lines, one per finished file; the last line for a path wins."""
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.done: dict[str, dict] = {}
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:   # a line cut off by a crash
+                        continue
+                    self.done[record["file"]] = record
+        self._out = open(path, "a", encoding="utf-8")
+
+    def finished(self, name: str, ident: dict) -> bool:
+        record = self.done.get(name)
+        return (record is not None and record["status"] in ("ingested", "unchanged")
+                and record["size"] == ident["size"] and record["mtime_ns"] == ident["mtime_ns"])
+
+    def record(self, name: str, ident: dict, status: str, **fields):
+        record = {"file": name, **ident, "status": status, **fields, "at": time.time()}
+        self.done[name] = record
+        self._out.write(json.dumps(record) + "\n")
+        self._out.flush()
+        os.fsync(self._out.fileno())
+
+    def close(self):
+        self._out.close()
+
+
+# ── Pipeline ──
+class BulkIngest:
+    def __init__(self, args, embedder, checkpoint: Checkpoint):
+        self.args        = args
+        self.embedder    = embedder
+        self.checkpoint  = checkpoint
+        self.totals      = Counter()
+        self.seconds     = Counter()   # per stage, summed over files
+        self.batch_size  = embedder.max_batch_size
+        self.total_files = 0
+        self._done       = 0
+
+    def doc_for(self, name: str, path: str) -> dict:
+        return {
+            "filename":     name,
+            "country":      self.args.country,
+            "job_area":     self.args.job_area,
+            "source_type":  self.args.source_type or file_extract.source_type(path),
+            "target_group": self.args.target_group,
+            "owner":        self.args.owner,
+        }
+
+    async def run(self, pool: ProcessPoolExecutor, files: list[tuple[str, str]]):
+        self.pool        = pool
+        self.total_files = len(files)
+        self.file_slots  = asyncio.Semaphore(self.args.files_in_flight)
+        self.embed_slots = asyncio.Semaphore(self.args.embed_concurrency)
+        self.write_slots = asyncio.Semaphore(self.args.writers)
+        try:
+            await asyncio.gather(*(self.ingest_file(name, path) for name, path in files))
+        finally:
+            await http_client.close_session()
+
+    async def timed(self, stage: str, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.seconds[stage] += time.perf_counter() - started
+
+    async def ingest_file(self, name: str, path: str):
+        async with self.file_slots:
+            started = time.perf_counter()
+            ident = identity(path)
+            try:
+                status, stats = await self._ingest(name, path)
+            except Exception as e:
+                self.totals["failed"] += 1
+                self.checkpoint.record(name, ident, "failed", error=str(e) or type(e).__name__)
+                self._report(name, f"❌ failed: {e!r}")
+                return
+            self.totals[status] += 1
+            self.checkpoint.record(name, ident, status, **stats)
+            took = time.perf_counter() - started
+            if status == "unchanged":
+                self._report(name, f"⏭️  unchanged ({took:.1f}s)")
+            else:
+                self._report(name, f"✅ {stats['pages']} pages, {stats['chunks']} chunks "
+                                   f"({stats['embedded']} embedded, {stats['reused']} reused, {stats['kept']} kept), "
+                                   f"{stats['rows_written']} rows ({took:.1f}s)")
+
+    def _report(self, name: str, message: str):
+        self._done += 1
+        print(f"[{self._done}/{self.total_files}] {name}: {message}", flush=True)
+
+    async def _ingest(self, name: str, path: str) -> tuple[str, dict]:
+        loop = asyncio.get_running_loop()
+        doc = self.doc_for(name, path)
+        doc["document_hash"] = await asyncio.to_thread(file_hash, path)
+        sections = None
+        while True:
+            delta = await asyncio.to_thread(IncrementalIngest, doc, self.embedder.model)
+            if delta.unchanged():
+                return "unchanged", {}
+            if sections is None:
+                sections = await self.timed("extract", loop.run_in_executor(self.pool, file_extract.extract, path))
+            chunks = await self.timed("chunk", asyncio.to_thread(
+                lambda: list(delta.new_chunks(iter_chunks(sections)))))
+            vectors, tokens = await self.timed("embed", self.embed(chunks, delta))
+            async with self.write_slots:
+                written = await self.timed("write", asyncio.to_thread(self.write, doc, list(zip(chunks, vectors)), delta))
+            if written is not None:
+                break
+            # another ingest of this filename committed since the delta was taken: redo it
+
+        stats = {"pages": len(sections), "chunks": len(chunks) + delta.counts["kept"],
+                 "tokens": tokens, "rows_written": written, **delta.counts}
+        for key in ("pages", "chunks", "tokens", "rows_written", "embedded", "reused", "kept", "deleted"):
+            self.totals[key] += stats[key]
+        return "ingested", stats
+
+    async def embed(self, chunks, delta: IncrementalIngest) -> tuple[list[list[float]], int]:
+        """Vectors for `chunks`: stored ones reused, the rest embedded in batches sharing the request slots."""
+        hashes  = [content_hash(c.text) for c in chunks]
+        reused  = await asyncio.to_thread(lookup_embeddings, set(hashes), self.embedder.model)
+        missing = [i for i, h in enumerate(hashes) if h not in reused]
+
+        async def run(batch: list[int]) -> list[list[float]]:
+            async with self.embed_slots:
+                return await self.embedder.aembed([chunks[i].text for i in batch])
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        fresh = {}
+        for batch, vectors in zip(batches, await asyncio.gather(*(run(b) for b in batches))):
+            fresh.update(zip(batch, vectors))
+        delta.counts["reused"]   += len(chunks) - len(missing)
+        delta.counts["embedded"] += len(missing)
+        tokens = sum(count_tokens(chunks[i].text) for i in missing)
+        return [fresh[i] if i in fresh else reused[hashes[i]] for i in range(len(chunks))], tokens
+
+    def write(self, doc: dict, embedded, delta: IncrementalIngest) -> Optional[int]:
+        """Rows written, or None (and nothing written) if the file's stored state changed under the delta."""
+        with db.get_cursor(commit=True) as cur:
+            if not delta.lock(cur):
+                return None
+            written = write_rows(cur, chunk_rows(doc, embedded, self.embedder.model))
+            delta.finalize(cur)
+        return written
+
+
+def extraction_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Worker processes for extraction, started right away. Forked where possible:
+    this runs before any thread, DB connection or model exists, and spawned
+    workers would each re-import this script's dependencies (~2s apiece).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    pool = ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context("fork" if "fork" in methods else "spawn"))
+    pool.submit(int).result()   # fork-context pools start all their workers on the first task
+    return pool
+
+
+def print_report(run: BulkIngest, skipped: int, elapsed: float):
+    t = run.totals
+    rate = lambda n: n / elapsed if elapsed > 0 else 0.0
+    print(f"\n📊 {run.total_files + skipped} files in {elapsed:.1f}s: {t['ingested']} ingested, "
+          f"{t['unchanged']} unchanged, {skipped} done in an earlier run, {t['failed']} failed")
+    print(f"   pages   {t['pages']:>9,}   {rate(t['pages']):>10,.1f} pages/s")
+    print(f"   chunks  {t['chunks']:>9,}   {rate(t['chunks']):>10,.1f} chunks/s   "
+          f"({t['embedded']:,} embedded, {t['reused']:,} reused, {t['kept']:,} kept)")
+    print(f"   tokens  {t['tokens']:>9,}   {rate(t['tokens']):>10,.1f} tokens/s (embedded)")
+    print(f"   rows    {t['rows_written']:>9,}   written, {t['deleted']:,} stale rows removed")
+    stages = ", ".join(f"{name} {secs:.1f}s" for name, secs in run.seconds.items())
+    if stages:
+        print(f"   stage time summed over files: {stages}")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--country", default="Unknown")
+    parser.add_argument("--job-area", default="Unknown")
+    parser.add_argument("--source-type", default=None, help="default: from the file type (PDF, DOCX, HTML, Text)")
+    parser.add_argument("--target-group", default="Unknown")
+    parser.add_argument("--owner", default="Unknown")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="extraction processes")
+    parser.add_argument("--files-in-flight", type=int, default=None,
+                        help="files between extraction and the database (default 2 x workers)")
+    parser.add_argument("--embed-concurrency", type=int, default=None,
+                        help="embedding requests in flight (default EMBED_CONCURRENCY or 4)")
+    parser.add_argument("--writers", type=int, default=2, help="files written to the database at once")
+    parser.add_argument("--checkpoint", default=None, help=f"default <directory>/{CHECKPOINT_NAME}")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args(argv)
+    args.files_in_flight = args.files_in_flight or 2 * args.workers
+    args.embed_concurrency = args.embed_concurrency or int(os.getenv("EMBED_CONCURRENCY", "4"))
+
+    if not os.path.isdir(args.directory):
+        print(f"❌ Not a directory: {args.directory}")
+        return 2
+    pool = extraction_pool(args.workers)
+    load_dotenv()
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    embedder = get_embedder()
+    schema.ensure_schema()
+
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.directory, CHECKPOINT_NAME), restart=args.restart)
+    files, skipped = [], 0
+    for path in find_files(args.directory):
+        name = os.path.relpath(path, args.directory).replace(os.sep, "/")
+        if checkpoint.finished(name, identity(path)):
+            skipped += 1
+        else:
+            files.append((name, path))
+    print(f"▶️  {len(files)} files to ingest from {args.directory} ({skipped} done in an earlier run); "
+          f"embeddings: {embedder.provider} {embedder.model}, {args.workers} extraction workers")
+
+    run = BulkIngest(args, embedder, checkpoint)
+    started = time.perf_counter()
+    interrupted = False
+    try:
+        asyncio.run(run.run(pool, files))
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n⏸️  Interrupted; run again to resume from the checkpoint")
+    finally:
+        pool.shutdown(cancel_futures=True)
+        checkpoint.close()
+        embedder.close()
+    print_report(run, skipped, time.perf_counter() - started)
+
+    if run.totals["rows_written"]:
+        built = vector_index.maintain()
+        if built:
+            print(f"🗂️  Built vector index {built['name']}")
+    db.close_pool()
+    if interrupted:
+        return 130
+    return 1 if run.totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Bulk writer for chunk rows in the `documents` table.
+
+Rows are streamed to Postgres either with `COPY ... FROM STDIN` (default) or
+with `execute_values` pages, inside the caller's transaction, so a whole
+document is written in one round-trip burst and committed once.
+
+    BULK_INSERT_METHOD     "copy" or "values"           (default "copy")
+    BULK_INSERT_PAGE_SIZE  rows per execute_values page (default 500)
+"""
+import json
+import os
+from datetime import date
+from typing import Iterable, Iterator, Optional
+
+from psycopg2.extras import Json, execute_values
+
+from chunking import Chunk
+from dedup import content_hash
+
+COLUMNS = (
+    "filename", "country", "job_area", "source_type",
+    "target_group", "owner", "creation_date",
+    "full_text", "content_embedding", "metadata",
+    "content_hash", "document_hash",
+    "embedding_model", "embedding_dim",
+)
+
+
+def chunk_rows(
+    doc: dict,
+    embedded: Iterable[tuple[Chunk, list[float]]],
+    embedding_model: Optional[str] = None,
+) -> Iterator[dict]:
+    """
+    Yield one row per `(chunk, embedding)` pair, sharing the document-level
+    fields in `doc`; the chunk's page and char span are merged into `metadata`,
+    and `embedding_model` is recorded with the vector's size.
+    """
+    base = {"creation_date": date.today(), **doc}
+    for chunk, emb in embedded:
+        yield {
+            **base,
+            "full_text":         chunk.text,
+            "content_embedding": emb,
+            "metadata":          {**(doc.get("metadata") or {}), **chunk.metadata()},
+            "content_hash":      content_hash(chunk.text),
+            "embedding_model":   embedding_model,
+            "embedding_dim":     len(emb),
+        }
+
+
+# ── COPY (text format) ──
+def _copy_field(value) -> str:
+    if value is None:
+        return r"\N"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(repr(float(x)) for x in value) + "]"
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        value = json.dumps(value)
+    value = str(value).replace("\x00", "")
+    return (value.replace("\\", "\\\\")
+                 .replace("\t", "\\t")
+                 .replace("\n", "\\n")
+                 .replace("\r", "\\r"))
+
+
+class _CopyStream:
+    """File-like object that renders rows into COPY text lazily as psycopg2 reads."""
+
+    def __init__(self, rows: Iterable[dict]):
+        self._rows   = iter(rows)
+        self._buffer = b""
+        self.count   = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = "\t".join(_copy_field(row.get(col)) for col in COLUMNS) + "\n"
+            self._buffer += line.encode("utf-8")
+            self.count += 1
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _write_copy(cur, rows: Iterable[dict]) -> int:
+    stream = _CopyStream(rows)
+    cur.copy_expert(f"COPY documents ({', '.join(COLUMNS)}) FROM STDIN", stream)
+    return stream.count
+
+
+# ── execute_values pages ──
+def _values_row(row: dict) -> tuple:
+    values = []
+    for col in COLUMNS:
+        value = row.get(col)
+        if col == "metadata" and value is not None:
+            value = Json(value)
+        elif col == "full_text" and value is not None:
+            value = value.replace("\x00", "")
+        values.append(value)
+    return tuple(values)
+
+
+def _write_values(cur, rows: Iterable[dict], page_size: int) -> int:
+    count = 0
+    page  = []
+    template = "(" + ", ".join("%s::vector" if c == "content_embedding" else "%s" for c in COLUMNS) + ")"
+    sql = f"INSERT INTO documents ({', '.join(COLUMNS)}) VALUES %s"
+    for row in rows:
+        page.append(_values_row(row))
+        if len(page) >= page_size:
+            execute_values(cur, sql, page, template=template, page_size=page_size)
+            count += len(page)
+            page = []
+    if page:
+        execute_values(cur, sql, page, template=template, page_size=page_size)
+        count += len(page)
+    return count
+
+
+def write_rows(cur, rows: Iterable[dict], method: Optional[str] = None, page_size: Optional[int] = None) -> int:
+    """
+    Stream `rows` into `documents` using `cur`'s transaction; returns the row count.
+    The caller owns the commit so one document lands atomically.
+    """
+    method = method or os.getenv("BULK_INSERT_METHOD", "copy")
+    if method == "copy":
+        return _write_copy(cur, rows)
+    if method == "values":
+        return _write_values(cur, rows, page_size or int(os.getenv("BULK_INSERT_PAGE_SIZE", "500")))
+    raise ValueError(f"Unknown bulk insert method: {method}")
@@ -0,0 +1,226 @@
+"""
+Streaming chunker shared by the API and the bulk ingest CLI.
+
+`iter_chunks()` consumes an iterator of page/section texts and yields chunks as
+soon as no later text can change them, each tagged with the page it starts on
+and its character span in the document (pages joined by "\\n"). The chunks are
+exactly those of `split_text()` on the whole document: the recursive
+separator splitting is replayed incrementally, one `_Level` per separator,
+so only the text of chunks still being assembled is buffered.
+"""
+import re
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional, Union
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+CHUNK_SIZE    = 800
+CHUNK_OVERLAP = 100
+SEPARATORS    = ("\n\n", "\n", ".", " ")   # smart fallbacks
+
+Section = Union[str, tuple[int, str]]
+
+
+@dataclass
+class Chunk:
+    index:    int
+    text:     str
+    page:     int
+    page_end: int
+    start:    int
+    end:      int
+
+    def metadata(self) -> dict:
+        return {
+            "chunk_index": self.index,
+            "page":        self.page,
+            "page_end":    self.page_end,
+            "char_start":  self.start,
+            "char_end":    self.end,
+        }
+
+
+@lru_cache(maxsize=8)
+def get_splitter(chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        separators=list(SEPARATORS),
+        keep_separator=True
+    )
+
+
+def split_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    return get_splitter(chunk_size, overlap).split_text(text)
+
+
+# ── Incremental splitting ──
+# RecursiveCharacterTextSplitter splits a text at its first separator (kept at
+# the start of each piece), greedily merges runs of pieces shorter than
+# chunk_size with overlap, and splits longer pieces again at the next
+# separator. A text without that separator is one long piece, so a level can
+# always split at its own separator and settle a piece once the separator
+# after it (or chunk_size characters of it) has arrived.
+Span = tuple[int, str]   # (document offset, text)
+
+
+class _Merge:
+    """RecursiveCharacterTextSplitter._merge_splits over pieces fed one at a time."""
+
+    def __init__(self, chunk_size: int, overlap: int):
+        self.chunk_size = chunk_size
+        self.overlap    = overlap
+        self.current: deque[Span] = deque()
+        self.total = 0
+
+    def add(self, start: int, piece: str) -> list[Span]:
+        out = []
+        if self.total + len(piece) > self.chunk_size:
+            if self.current:
+                out.extend(self._join())
+                while self.total > self.overlap or (self.total + len(piece) > self.chunk_size and self.total > 0):
+                    self.total -= len(self.current.popleft()[1])
+        self.current.append((start, piece))
+        self.total += len(piece)
+        return out
+
+    def finish(self) -> list[Span]:
+        return self._join()
+
+    def _join(self) -> list[Span]:
+        text = "".join(piece for _, piece in self.current)
+        stripped = text.strip()
+        if not stripped:
+            return []
+        return [(self.current[0][0] + len(text) - len(text.lstrip()), stripped)]
+
+
+class _Level:
+    """One separator's level of the recursive split, fed the text of one piece of the level above."""
+
+    def __init__(self, separators: tuple[str, ...], chunk_size: int, overlap: int, start: int):
+        self.sep        = separators[0]
+        self.rest       = separators[1:]
+        self.pattern    = re.compile(re.escape(self.sep))
+        self.chunk_size = chunk_size
+        self.overlap    = overlap
+        self.pending    = ""      # unsettled text: the current piece, or the tail not yet passed to `child`
+        self.start      = start   # document offset of pending[0]
+        self.in_piece   = False   # pending starts with a separator already matched
+        self.child: Optional[_Level] = None   # splits the current piece, once it's known to be long
+        self.merge: Optional[_Merge] = None   # the current run of short pieces
+
+    def feed(self, text: str) -> list[Span]:
+        out = []
+        pending, i = self.pending + text, 0
+        while True:
+            if self.child is not None:
+                m = self.pattern.search(pending, i)
+                if m is None:
+                    # a separator may be starting in the last few characters
+                    cut = max(i, len(pending) - len(self.sep) + 1)
+                    out.extend(self.child.feed(pending[i:cut]))
+                    i = cut
+                    break
+                out.extend(self.child.feed(pending[i:m.start()]))
+                out.extend(self.child.finish())
+                self.child = None
+                i, self.in_piece = m.start(), True
+                continue
+            m = self.pattern.search(pending, i + (len(self.sep) if self.in_piece else 0))
+            if m is None:
+                if len(pending) - i >= self.chunk_size and self.rest:
+                    # long whatever follows: split it at the next separator as it arrives
+                    out.extend(self._end_run())
+                    self.child = _Level(self.rest, self.chunk_size, self.overlap, self.start + i)
+                    if self.in_piece:   # the piece's own separator, not the one ending it
+                        out.extend(self.child.feed(pending[i:i + len(self.sep)]))
+                        i, self.in_piece = i + len(self.sep), False
+                    continue
+                break
+            out.extend(self._piece(self.start + i, pending[i:m.start()]))
+            i, self.in_piece = m.start(), True
+        self.pending, self.start = pending[i:], self.start + i
+        return out
+
+    def finish(self) -> list[Span]:
+        if self.child is not None:
+            out = self.child.feed(self.pending) + self.child.finish()
+            self.child = None
+        else:
+            out = self._piece(self.start, self.pending)
+        self.pending = ""
+        return out + self._end_run()
+
+    def _piece(self, start: int, piece: str) -> list[Span]:
+        if not piece:
+            return []
+        if len(piece) < self.chunk_size:
+            if self.merge is None:
+                self.merge = _Merge(self.chunk_size, self.overlap)
+            return self.merge.add(start, piece)
+        out = self._end_run()
+        if not self.rest:
+            return out + [(start, piece)]   # nothing left to split at: kept whole, unstripped
+        child = _Level(self.rest, self.chunk_size, self.overlap, start)
+        return out + child.feed(piece) + child.finish()
+
+    def _end_run(self) -> list[Span]:
+        if self.merge is None:
+            return []
+        out, self.merge = self.merge.finish(), None
+        return out
+
+
+def iter_chunks(
+    sections: Iterable[Section],
+    chunk_size: int = CHUNK_SIZE,
+    overlap: int = CHUNK_OVERLAP,
+) -> Iterator[Chunk]:
+    """
+    Yield `Chunk`s from a stream of sections, either plain strings (numbered
+    from 1) or `(page_number, text)` pairs; the same chunks `split_text()`
+    returns for the sections joined by "\\n", with their spans.
+    """
+    splitter    = _Level(SEPARATORS, chunk_size, overlap, 0)
+    page_starts = []          # document offsets where each page begins
+    page_nos    = []
+    index       = 0
+
+    def page_at(offset: int) -> int:
+        return page_nos[max(0, bisect_right(page_starts, offset) - 1)]
+
+    def chunks(spans: list[Span]) -> Iterator[Chunk]:
+        nonlocal index
+        for start, text in spans:
+            end = start + len(text)
+            yield Chunk(
+                index    = index,
+                text     = text,
+                page     = page_at(start),
+                page_end = page_at(max(start, end - 1)),
+                start    = start,
+                end      = end,
+            )
+            index += 1
+
+    doc_len = 0
+    for number, section in enumerate(sections, 1):
+        page_no, text = section if isinstance(section, tuple) else (number, section)
+        if number > 1:
+            text = "\n" + text
+            page_starts.append(doc_len + 1)
+        else:
+            page_starts.append(0)
+        page_nos.append(page_no)
+        doc_len += len(text)
+        yield from chunks(splitter.feed(text))
+
+    yield from chunks(splitter.finish())
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    return [c.text for c in iter_chunks([text], chunk_size, overlap)]
@@ -0,0 +1,239 @@
+"""
+Token-budgeted prompt assembly for /answer.
+
+Retrieved chunks and the conversation are packed into a fixed token budget:
+
+  1. chunks from the same file that repeat each other, overlap (the chunker
+     repeats the tail of a chunk at the start of the next) or are adjacent
+     (by the char offsets in their metadata) are merged into one passage,
+     keeping the best relevance of its parts;
+  2. the conversation keeps the newest turns that fit HISTORY_TOKEN_BUDGET,
+     and older turns collapse into one line listing the earlier questions;
+  3. passages fill what is left of CONTEXT_TOKEN_BUDGET in retrieval order; the
+     first one that doesn't fit is truncated, the rest are dropped.
+
+    CONTEXT_TOKEN_BUDGET   prompt tokens for system + history + context  (default 6000)
+    HISTORY_TOKEN_BUDGET   max tokens of earlier conversation turns      (default 1500)
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+from embeddings import count_tokens, truncate_tokens
+
+MESSAGE_OVERHEAD = 4     # role/separator tokens OpenAI adds per chat message
+MIN_OVERLAP      = 20    # shortest suffix/prefix match treated as chunk overlap
+MAX_OVERLAP      = 400   # longest overlap searched for (chunker overlap is 100-200 chars)
+MAX_GAP          = 4     # whitespace the chunker strips between adjacent chunks
+MIN_TRUNCATED    = 64    # don't bother adding a passage truncated below this many tokens
+
+
+@dataclass
+class Passage:
+    filename: str
+    text:     str
+    distance: float
+    hits:     list = field(default_factory=list)   # the retrieved rows merged into this passage
+    start:    Optional[int] = None                  # character offsets in the source document
+    end:      Optional[int] = None
+    rank:     int = 0                               # best retrieval rank among its rows
+
+
+@dataclass
+class PackedPrompt:
+    messages:         list[dict]
+    passages:         list[Passage]
+    budget:           int
+    prompt_tokens:    int
+    context_tokens:   int
+    history_tokens:   int
+    chunks_retrieved: int
+    chunks_merged:    int
+    chunks_dropped:   int
+    turns_dropped:    int
+    truncated:        bool
+
+    def report(self) -> dict:
+        return {
+            "token_budget":     self.budget,
+            "prompt_tokens":    self.prompt_tokens,
+            "context_tokens":   self.context_tokens,
+            "history_tokens":   self.history_tokens,
+            "chunks_retrieved": self.chunks_retrieved,
+            "chunks_merged":    self.chunks_merged,
+            "chunks_dropped":   self.chunks_dropped,
+            "turns_dropped":    self.turns_dropped,
+            "truncated":        self.truncated,
+        }
+
+
+def _message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _join_text(left: str, right: str) -> Optional[str]:
+    """`left` and `right` as one text if they repeat or overlap each other, else None."""
+    if right in left:
+        return left
+    if left in right:
+        return right
+    size = _overlap(left, right)
+    if size:
+        return left + right[size:]
+    size = _overlap(right, left)
+    if size:
+        return right + left[size:]
+    return None
+
+
+def _join_spans(left: Passage, right: Passage) -> Optional[str]:
+    """
+    Text of `left` followed by `right` (left.start <= right.start) when their
+    stored offsets overlap or touch; the overlapping text has to agree, since
+    pages ingested from one site share a filename.
+    """
+    if right.start > left.end + MAX_GAP:
+        return None
+    if right.end <= left.end:
+        inner = left.text[right.start - left.start:right.end - left.start]
+        return left.text if inner == right.text else None
+    shared = left.end - right.start
+    if shared <= 0:
+        # same length as the stripped whitespace, so offsets stay valid
+        return left.text + "\n" * -shared + right.text
+    return left.text + right.text[shared:] if left.text.endswith(right.text[:shared]) else None
+
+
+def _merge_file(passages: list[Passage]) -> list[Passage]:
+    def combine(a: Passage, b: Passage, text: str, start=None, end=None) -> Passage:
+        return Passage(a.filename, text, min(a.distance, b.distance), a.hits + b.hits, start, end,
+                       min(a.rank, b.rank))
+
+    # adjacent/overlapping chunks by offset, in document order
+    spans = sorted((p for p in passages if p.start is not None), key=lambda p: p.start)
+    merged: list[Passage] = []
+    for p in spans:
+        text = _join_spans(merged[-1], p) if merged else None
+        if text is None:
+            merged.append(p)
+        else:
+            merged[-1] = combine(merged[-1], p, text, merged[-1].start, max(merged[-1].end, p.end))
+
+    # rows without offsets (ingested before they were recorded): by text overlap
+    for p in (p for p in passages if p.start is None):
+        for i, other in enumerate(merged):
+            text = _join_text(other.text, p.text)
+            if text is not None:
+                merged[i] = combine(other, p, text, other.start if text == other.text else None,
+                                    other.end if text == other.text else None)
+                break
+        else:
+            merged.append(p)
+    return merged
+
+
+def merge_hits(hits) -> list[Passage]:
+    """
+    Merge retrieved rows (filename, text, distance[, metadata]), best first,
+    that repeat, overlap or sit next to each other in the same file; passages
+    keep the retrieval order of their best row.
+    """
+    by_file: dict[str, list[Passage]] = {}
+    for rank, hit in enumerate(hits):
+        meta = (hit[3] if len(hit) > 3 else None) or {}
+        start, end = meta.get("char_start"), meta.get("char_end")
+        if start is None or end is None or end - start != len(hit[1]):
+            start = end = None
+        by_file.setdefault(hit[0], []).append(Passage(hit[0], hit[1], hit[2], [hit], start, end, rank))
+
+    passages = [p for group in by_file.values() for p in _merge_file(group)]
+    return sorted(passages, key=lambda p: p.rank)
+
+
+def _pack_history(history: list[dict], budget: int) -> tuple[list[dict], int, int]:
+    """Newest turns that fit `budget`, plus a one-line digest of the earlier questions."""
+    kept, used = [], 0
+    for message in reversed(history):
+        tokens = _message_tokens(message)
+        if used + tokens > budget:
+            break
+        kept.insert(0, message)
+        used += tokens
+
+    dropped = history[:len(history) - len(kept)]
+    if dropped:
+        questions = " | ".join(m["content"].strip().replace("\n", " ") for m in dropped if m["role"] == "user")
+        if questions:
+            room = budget - used - MESSAGE_OVERHEAD
+            digest = truncate_tokens(f"Earlier in this conversation the user asked: {questions}", room)
+            if digest:
+                summary = {"role": "system", "content": digest}
+                kept.insert(0, summary)
+                used += _message_tokens(summary)
+    return kept, used, len(dropped)
+
+
+def pack_prompt(
+    system_prompt: str,
+    messages: list[dict],
+    hits,
+    budget: Optional[int] = None,
+    history_budget: Optional[int] = None,
+) -> PackedPrompt:
+    """
+    Build the chat messages for `messages` (oldest first, last one is the
+    question) grounded in `hits`, within `budget` prompt tokens.
+    """
+    budget = budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+    history_budget = history_budget or int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+
+    system   = {"role": "system", "content": system_prompt}
+    question = messages[-1]
+    fixed    = _message_tokens(system) + _message_tokens(question) + MESSAGE_OVERHEAD + count_tokens("Context:\n")
+
+    history, history_tokens, turns_dropped = _pack_history(
+        messages[:-1], max(0, min(history_budget, budget - fixed))
+    )
+
+    room = budget - fixed - history_tokens
+    passages = merge_hits(hits)
+    packed, texts, truncated = [], [], False
+    for passage in passages:
+        cost = count_tokens(passage.text) + (1 if texts else 0)
+        if cost <= room:
+            packed.append(passage)
+            texts.append(passage.text)
+            room -= cost
+            continue
+        if room >= MIN_TRUNCATED:
+            text = truncate_tokens(passage.text, room - 1)
+            packed.append(Passage(passage.filename, text, passage.distance, passage.hits, passage.start,
+                                  rank=passage.rank))
+            texts.append(text)
+            truncated = True
+        break
+
+    context = {"role": "system", "content": "Context:\n" + "\n\n".join(texts)}
+    chat = [system, *history, question, context]
+    context_tokens = _message_tokens(context)
+    return PackedPrompt(
+        messages         = chat,
+        passages         = packed,
+        budget           = budget,
+        prompt_tokens    = sum(_message_tokens(m) for m in chat),
+        context_tokens   = context_tokens,
+        history_tokens   = history_tokens,
+        chunks_retrieved = len(hits),
+        chunks_merged    = len(hits) - len(passages),
+        chunks_dropped   = sum(len(p.hits) for p in passages[len(packed):]),
+        turns_dropped    = turns_dropped,
+        truncated        = truncated,
+    )
@@ -0,0 +1,382 @@
+"""
+Concurrent, polite crawler feeding URL ingestion.
+
+Starting from seed URLs, pages are fetched breadth-first up to `max_depth`
+links away, on the seeds' hosts (or an explicit list of domains, subdomains
+included), under an optional path prefix and up to `max_pages`. One pooled
+aiohttp session serves the whole crawl with CRAWL_CONCURRENCY requests in
+flight; pages are parsed (html_extract.py) and handed to the ingestion
+callback on worker threads, CRAWL_INGEST_WORKERS at a time, so fetching
+continues while earlier pages are embedded.
+
+Politeness, per host:
+
+  * robots.txt is honoured for CRAWL_USER_AGENT, including Crawl-delay;
+  * at most CRAWL_PER_HOST open connections, and requests start at least
+    CRAWL_HOST_DELAY seconds apart (or the Crawl-delay, if longer);
+  * 429 and 503 responses push the host's next request back by Retry-After.
+
+Each ingested page's ETag, Last-Modified and outgoing links are remembered
+(the `crawl_pages` table; in memory with the local vector store, see
+`use_memory()`). A re-crawl sends conditional requests: unchanged pages answer
+304 and are neither downloaded nor re-ingested, and the crawl continues
+through their remembered links.
+
+Pages that could not be fetched or had nothing to ingest are reported with
+the reason; an exception from the ingestion callback is re-raised once the
+rest of the crawl has finished.
+
+    CRAWL_CONCURRENCY     requests in flight                   (default 16)
+    CRAWL_PER_HOST        connections per host                 (default 4)
+    CRAWL_HOST_DELAY      seconds between requests to a host   (default 0.25)
+    CRAWL_INGEST_WORKERS  pages ingested at once               (default 2)
+    CRAWL_TIMEOUT         seconds per request                  (default 30)
+    CRAWL_MAX_MB          largest page fetched, in MiB         (default 5)
+    CRAWL_USER_AGENT      default "SmartFusionBot/1.0"
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from urllib.parse import urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+import db
+import html_extract
+from stages import stage
+
+log = logging.getLogger(__name__)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS crawl_pages (
+    url            TEXT PRIMARY KEY,
+    filename       TEXT        NOT NULL,
+    etag           TEXT,
+    last_modified  TEXT,
+    links          JSONB,
+    fetched_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS crawl_pages_filename_idx ON crawl_pages (filename)
+"""
+
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+# not worth a request: the crawl only ingests HTML
+SKIP_EXTENSIONS = (
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".css", ".js", ".json", ".xml",
+    ".zip", ".gz", ".tar", ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx",
+    ".mp3", ".mp4", ".webm", ".woff", ".woff2", ".ttf", ".exe", ".dmg",
+)
+
+
+def user_agent() -> str:
+    return os.getenv("CRAWL_USER_AGENT", "SmartFusionBot/1.0")
+
+
+def normalize_url(url: str) -> str:
+    """Lower-case scheme and host, no default port, no fragment, "/" for an empty path."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if parts.port and not (parts.scheme == "http" and parts.port == 80
+                           or parts.scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((parts.scheme.lower(), host, parts.path or "/", parts.query, ""))
+
+
+def page_name(url: str) -> str:
+    """The `filename` a crawled page is stored under: its URL without the scheme."""
+    parts = urlsplit(url)
+    return parts.netloc + parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+# ── Remembered validators and links ──
+# page records by url when they are kept in memory rather than in `crawl_pages`
+_memory: Optional[dict[str, dict]] = None
+_memory_lock = threading.Lock()
+
+
+def use_memory():
+    global _memory
+    if _memory is None:
+        _memory = {}
+
+
+def ensure_schema():
+    with db.get_cursor(commit=True) as cur:
+        cur.execute(SCHEMA_SQL)
+
+
+def remembered(url: str) -> Optional[dict]:
+    if _memory is not None:
+        with _memory_lock:
+            return _memory.get(url)
+    with db.get_cursor() as cur:
+        cur.execute("SELECT filename, etag, last_modified, links FROM crawl_pages WHERE url = %s", (url,))
+        row = cur.fetchone()
+    return {"filename": row[0], "etag": row[1], "last_modified": row[2], "links": row[3] or []} if row else None
+
+
+def remember(url: str, filename: str, etag: Optional[str], last_modified: Optional[str], links: list[str]):
+    record = {"filename": filename, "etag": etag, "last_modified": last_modified, "links": links}
+    if _memory is not None:
+        with _memory_lock:
+            _memory[url] = record
+        return
+    with db.get_cursor(commit=True) as cur:
+        cur.execute(
+            """
+            INSERT INTO crawl_pages (url, filename, etag, last_modified, links)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (url) DO UPDATE
+               SET filename = EXCLUDED.filename, etag = EXCLUDED.etag,
+                   last_modified = EXCLUDED.last_modified, links = EXCLUDED.links, fetched_at = now()
+            """,
+            (url, filename, etag, last_modified, json.dumps(links)),
+        )
+
+
+def forget(filename: str):
+    """Drop what is remembered for pages stored under `filename`, so the next crawl fetches them in full."""
+    if _memory is not None:
+        with _memory_lock:
+            for url in [u for u, r in _memory.items() if r["filename"] == filename]:
+                del _memory[url]
+        return
+    with db.get_cursor(commit=True) as cur:
+        cur.execute("DELETE FROM crawl_pages WHERE filename = %s", (filename,))
+
+
+# ── Crawl ──
+@dataclass
+class CrawlConfig:
+    seeds:       list[str]
+    max_depth:   int = 0
+    max_pages:   int = 200
+    domains:     Optional[list[str]] = None   # default: the seeds' hosts
+    path_prefix: Optional[str] = None
+    force:       bool = False                 # fetch in full even when remembered
+
+    def __post_init__(self):
+        self.seeds = [normalize_url(u) for u in self.seeds]
+        if self.domains:
+            self.domains = [d.lower().strip(".") for d in self.domains]
+
+    def allows(self, url: str) -> bool:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or parts.path.lower().endswith(SKIP_EXTENSIONS):
+            return False
+        if self.path_prefix and not parts.path.startswith(self.path_prefix):
+            return False
+        host = (parts.hostname or "").lower()
+        if self.domains:
+            return any(host == d or host.endswith("." + d) for d in self.domains)
+        return host in {urlsplit(s).hostname for s in self.seeds}
+
+
+@dataclass
+class _Host:
+    delay:   float
+    robots:  Optional[RobotFileParser] = None
+    next_at: float = 0.0
+    lock:    asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    async def turn(self):
+        """Wait until this host may be sent another request."""
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def back_off(self, seconds: float):
+        self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+
+def _retry_after(value: Optional[str]) -> float:
+    try:
+        return min(float(value), 300.0)
+    except (TypeError, ValueError):
+        return 30.0
+
+
+class Crawler:
+    def __init__(self, config: CrawlConfig, ingest: Callable[[str, html_extract.HtmlPage], None]):
+        """`ingest(filename, page)` stores one page (on a worker thread) under its `page_name`."""
+        self.config      = config
+        self.ingest      = ingest
+        self.concurrency = int(os.getenv("CRAWL_CONCURRENCY", "16"))
+        self.host_delay  = float(os.getenv("CRAWL_HOST_DELAY", "0.25"))
+        self.max_bytes   = int(float(os.getenv("CRAWL_MAX_MB", "5")) * 2**20)
+        self.hosts: dict[str, _Host] = {}
+        self.seen:  set[str] = set()
+        self.stats  = Counter()
+        self.failures: dict[str, str] = {}   # url -> why it wasn't ingested
+        self.ingest_errors: list[tuple[str, Exception]] = []
+        self._ingest_slots = asyncio.Semaphore(int(os.getenv("CRAWL_INGEST_WORKERS", "2")))
+
+    async def run(self) -> dict:
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=int(os.getenv("CRAWL_PER_HOST", "4")), ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(total=float(os.getenv("CRAWL_TIMEOUT", "30")))
+        queue: asyncio.Queue = asyncio.Queue()
+        for url in self.config.seeds:
+            if url not in self.seen:
+                self.seen.add(url)
+                queue.put_nowait((url, 0))
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={"User-Agent": user_agent()}) as session:
+            workers = [asyncio.create_task(self._work(session, queue)) for _ in range(self.concurrency)]
+            await queue.join()
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return dict(self.stats)
+
+    async def _work(self, session: aiohttp.ClientSession, queue: asyncio.Queue):
+        while True:
+            url, depth = await queue.get()
+            try:
+                links = await self._visit(session, url)
+                if depth < self.config.max_depth:
+                    for link in links:
+                        link = normalize_url(link)
+                        if len(self.seen) >= self.config.max_pages:
+                            break
+                        if link not in self.seen and self.config.allows(link):
+                            self.seen.add(link)
+                            queue.put_nowait((link, depth + 1))
+            except Exception as e:
+                self._skip(url, "errors", str(e) or type(e).__name__)
+                log.warning(f"⚠️  Crawl of {url} failed: {e!r}")
+            finally:
+                queue.task_done()
+
+    def _skip(self, url: str, stat: str, reason: str):
+        self.stats[stat] += 1
+        self.failures[url] = reason
+
+    async def _host(self, session: aiohttp.ClientSession, url: str) -> _Host:
+        parts = urlsplit(url)
+        host = self.hosts.get(parts.netloc)
+        if host is None:
+            host = self.hosts[parts.netloc] = _Host(delay=self.host_delay)
+        async with host.lock:
+            if host.robots is None:
+                host.robots = await self._robots(session, f"{parts.scheme}://{parts.netloc}/robots.txt")
+                crawl_delay = host.robots.crawl_delay(user_agent())
+                if crawl_delay:
+                    host.delay = max(host.delay, min(float(crawl_delay), 30.0))
+        return host
+
+    async def _robots(self, session: aiohttp.ClientSession, url: str) -> RobotFileParser:
+        robots = RobotFileParser(url)
+        try:
+            async with session.get(url) as resp:
+                if resp.status in (401, 403) or resp.status >= 500:
+                    robots.disallow_all = True
+                elif resp.status >= 400:
+                    robots.allow_all = True
+                else:
+                    robots.parse((await resp.text(errors="replace")).splitlines())
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            robots.allow_all = True
+        return robots
+
+    async def _visit(self, session: aiohttp.ClientSession, url: str) -> list[str]:
+        """Fetch and ingest one page; returns the links to follow from it."""
+        host = await self._host(session, url)
+        if not host.robots.can_fetch(user_agent(), url):
+            self._skip(url, "disallowed", "disallowed by robots.txt")
+            return []
+
+        filename = page_name(url)
+        known = None if self.config.force else await asyncio.to_thread(remembered, url)
+        if known and known["filename"] != filename:
+            known = None   # stored under an older, site-level name: this document doesn't have it yet
+        headers = {}
+        if known:
+            if known["etag"]:
+                headers["If-None-Match"] = known["etag"]
+            if known["last_modified"]:
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        await host.turn()
+        with stage("fetch"):
+            async with session.get(url, headers=headers) as resp:
+                if resp.status == 304 and known:
+                    self.stats["unchanged"] += 1
+                    return known["links"]
+                if resp.status in (429, 503):
+                    host.back_off(_retry_after(resp.headers.get("Retry-After")))
+                if resp.status != 200:
+                    self._skip(url, f"http_{resp.status}", f"HTTP {resp.status}")
+                    return []
+                final_url = normalize_url(str(resp.url))
+                if final_url != url and (final_url in self.seen or not self.config.allows(final_url)):
+                    self._skip(url, "redirected_away", f"redirected to {final_url}")
+                    return []
+                self.seen.add(final_url)
+                if resp.content_type not in HTML_TYPES:
+                    self._skip(url, "not_html", f"not HTML ({resp.content_type})")
+                    return []
+                if (resp.content_length or 0) > self.max_bytes:
+                    self._skip(url, "too_large", f"larger than {self.max_bytes // 2**20} MiB")
+                    return []
+                body = bytearray()
+                async for block in resp.content.iter_chunked(1 << 16):
+                    body += block
+                    if len(body) > self.max_bytes:
+                        self._skip(url, "too_large", f"larger than {self.max_bytes // 2**20} MiB")
+                        return []
+                etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+                charset = resp.charset
+        self.stats["fetched"] += 1
+        self.stats["bytes"] += len(body)
+
+        page = await asyncio.to_thread(self._extract, bytes(body), final_url, charset)
+        if page.noindex:
+            self._skip(url, "skipped_noindex", "marked noindex")
+        elif not page.text:
+            self._skip(url, "empty", "no text")
+        else:
+            async with self._ingest_slots:
+                try:
+                    await asyncio.to_thread(self.ingest, filename, page)
+                except Exception as e:
+                    # the rest of the crawl goes on; crawl() re-raises at the end
+                    self.ingest_errors.append((url, e))
+                    self._skip(url, "ingest_failed", str(e) or type(e).__name__)
+                    log.warning(f"⚠️  Ingesting {url} failed: {e!r}")
+                    return page.links
+            self.stats["ingested"] += 1
+            await asyncio.to_thread(remember, url, filename, etag, last_modified, page.links)
+        return page.links
+
+    @staticmethod
+    def _extract(body: bytes, url: str, charset: Optional[str]) -> html_extract.HtmlPage:
+        with stage("extract"):
+            return html_extract.extract(body, url, encoding=charset)
+
+
+def crawl(config: CrawlConfig, ingest: Callable[[str, html_extract.HtmlPage], None]) -> tuple[dict, dict[str, str]]:
+    """
+    Run a crawl to completion on a fresh event loop (ingest jobs run on worker
+    threads); returns its stats and the reason each page not ingested was
+    skipped. The first exception `ingest` raised is re-raised at the end.
+    """
+    crawler = Crawler(config, ingest)
+    stats = asyncio.run(crawler.run())
+    if crawler.ingest_errors:
+        url, error = crawler.ingest_errors[0]
+        others = len(crawler.ingest_errors) - 1
+        raise RuntimeError(f"Ingesting {url} failed: {error}"
+                           + (f" ({others} more pages failed)" if others else "")) from error
+    return stats, crawler.failures
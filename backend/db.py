@@ -0,0 +1,343 @@
+"""
+Shared Postgres access layer for the SmartFusion RAG API.
+
+A single sync pool is created at startup and shared by every handler that runs
+on FastAPI's threadpool; an optional async pool (psycopg 3) is available for
+`async def` code paths. Both pools are sized from env vars:
+
+    DB_POOL_MIN           connections opened eagerly at startup   (default 1)
+    DB_POOL_SIZE          connections kept open in the pool       (default 10)
+    DB_POOL_MAX_OVERFLOW  extra short-lived connections on bursts (default 5)
+    DB_POOL_TIMEOUT       seconds to wait for a free connection   (default 10)
+    DB_POOL_RECYCLE       max connection age in seconds           (default 1800)
+    DB_POOL_PRE_PING      ping idle connections older than this   (default 30)
+    DB_ASYNC_POOL         "0" to skip the async pool (opened at startup when psycopg 3 is installed)
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional
+
+import psycopg2
+import psycopg2.extensions
+from fastapi import HTTPException
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def connection_kwargs() -> dict:
+    return {
+        "dbname":   os.getenv("DB_NAME"),
+        "user":     os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "host":     os.getenv("DB_HOST"),
+        "port":     os.getenv("DB_PORT"),
+    }
+
+
+# ── Sync pool ──
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 pool with overflow, timeouts and health checks.
+
+    Up to `size` connections are kept idle for reuse; when they are all checked
+    out, up to `max_overflow` additional connections are opened and closed again
+    on return. Callers beyond that wait up to `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        size: int = 10,
+        max_overflow: int = 5,
+        timeout: float = 10.0,
+        recycle: float = 1800.0,
+        pre_ping: float = 30.0,
+        min_size: int = 1,
+        **connect_kwargs,
+    ):
+        self.size         = size
+        self.max_overflow = max_overflow
+        self.timeout      = timeout
+        self.recycle      = recycle
+        self.pre_ping     = pre_ping
+        self.min_size     = min(min_size, size)
+        self._connect_kwargs = connect_kwargs
+
+        self._cond   = threading.Condition()
+        self._idle   = deque()  # (conn, last_used)
+        self._born   = {}       # id(conn) -> creation time
+        self._open   = 0
+        self._in_use = 0
+        self._closed = False
+        self._stats  = {
+            "connections_created": 0,
+            "connections_closed":  0,
+            "checkouts":           0,
+            "timeouts":            0,
+            "wait_seconds_total":  0.0,
+            "health_check_failures": 0,
+            "recycled":            0,
+        }
+
+    def open(self):
+        """Eagerly open `min_size` connections so the first requests don't pay for them."""
+        conns = []
+        try:
+            for _ in range(self.min_size):
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    # ── connection lifecycle ──
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._born.pop(id(conn), None)
+            self._open -= 1
+            self._stats["connections_closed"] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - self._born.get(id(conn), now) > self.recycle:
+            with self._cond:
+                self._stats["recycled"] += 1
+            return False
+        if now - last_used > self.pre_ping:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                return False
+        return True
+
+    # ── checkout / return ──
+    def getconn(self):
+        started  = time.monotonic()
+        deadline = started + self.timeout
+        entry    = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("connection pool is closed")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise HTTPException(status_code=503, detail="DB pool exhausted, try again later")
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds_total"] += time.monotonic() - started
+
+        try:
+            if entry is not None:
+                conn, last_used = entry
+                if self._is_healthy(conn, last_used):
+                    return conn
+                # replace the stale connection in the same slot
+                self._discard(conn)
+                with self._cond:
+                    self._open += 1
+            return self._connect()
+        except Exception as e:
+            with self._cond:
+                self._open   -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise HTTPException(status_code=500, detail=f"DB connection failed: {e}")
+
+    def putconn(self, conn, discard: bool = False):
+        with self._cond:
+            self._in_use -= 1
+
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+        if conn.closed:
+            discard = True
+
+        with self._cond:
+            keep = not discard and not self._closed and len(self._idle) < self.size
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size":         self.size,
+                "max_overflow": self.max_overflow,
+                "open":         self._open,
+                "idle":         len(self._idle),
+                "in_use":       self._in_use,
+                "overflow":     max(0, self._open - self.size),
+                **self._stats,
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def init_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = ConnectionPool(
+                size         = _env_int("DB_POOL_SIZE", 10),
+                max_overflow = _env_int("DB_POOL_MAX_OVERFLOW", 5),
+                timeout      = float(_env_int("DB_POOL_TIMEOUT", 10)),
+                recycle      = float(_env_int("DB_POOL_RECYCLE", 1800)),
+                pre_ping     = float(_env_int("DB_POOL_PRE_PING", 30)),
+                min_size     = _env_int("DB_POOL_MIN", 1),
+                **connection_kwargs(),
+            )
+            pool.open()
+            _pool = pool
+    return _pool
+
+
+def get_pool() -> ConnectionPool:
+    return _pool or init_pool()
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection; rolls back on error and always returns it."""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                pool.putconn(conn, discard=True)
+                raise
+        pool.putconn(conn)
+        raise
+    else:
+        pool.putconn(conn)
+
+
+@contextmanager
+def get_cursor(commit: bool = False):
+    """Borrow a pooled connection and yield a cursor; commits on success if asked."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            yield cur
+        if commit:
+            conn.commit()
+
+
+# ── Async pool (psycopg 3, optional) ──
+_async_pool = None
+
+
+async def init_async_pool():
+    global _async_pool
+    if _async_pool is None:
+        try:
+            from psycopg_pool import AsyncConnectionPool
+        except ImportError as e:
+            raise RuntimeError("Async pool requires `pip install psycopg[binary] psycopg-pool`") from e
+        size = _env_int("DB_POOL_SIZE", 10)
+        pool = AsyncConnectionPool(
+            kwargs       = {k: v for k, v in connection_kwargs().items() if v is not None},
+            min_size     = min(_env_int("DB_POOL_MIN", 1), size),
+            max_size     = size + _env_int("DB_POOL_MAX_OVERFLOW", 5),
+            timeout      = float(_env_int("DB_POOL_TIMEOUT", 10)),
+            max_lifetime = float(_env_int("DB_POOL_RECYCLE", 1800)),
+            check        = AsyncConnectionPool.check_connection,
+            open         = False,
+        )
+        await pool.open()
+        _async_pool = pool
+    return _async_pool
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+@asynccontextmanager
+async def get_async_cursor(commit: bool = False):
+    pool = await init_async_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            yield cur
+        if commit:
+            await conn.commit()
+
+
+def pool_stats() -> dict:
+    stats = {"sync": _pool.stats() if _pool else None, "async": None}
+    if _async_pool is not None:
+        stats["async"] = _async_pool.get_stats()
+    return stats
+
+
+def async_pool_enabled() -> bool:
+    if os.getenv("DB_ASYNC_POOL", "1") == "0":
+        return False
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def async_pool_ready() -> bool:
+    return _async_pool is not None
@@ -0,0 +1,182 @@
+"""
+Content-hash deduplication for incremental ingestion.
+
+Every chunk row stores the sha256 of its text (`content_hash`) and of the
+source document (`document_hash`). On (re-)ingestion:
+
+  * a document whose hash and document-level fields (country, job_area, ...)
+    match what is stored is skipped outright;
+  * chunks whose hash already exists under the same filename, embedded by the
+    current model, are kept as-is; rows from another model count as stale;
+  * chunks whose text exists under any filename reuse that stored embedding,
+    if it came from the current embedding model;
+  * only the remaining chunks are embedded and inserted, and rows for chunks
+    that disappeared from the document are deleted.
+
+Identical chunks within one document are stored once. Ingests of the same
+filename are serialized by a transaction-level advisory lock on the filename,
+taken by the writer before it settles the delta (`IncrementalIngest.lock`).
+"""
+import hashlib
+import json
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from psycopg2.extras import Json, execute_values
+
+import db
+from chunking import Chunk
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# document-level columns compared by `IncrementalIngest.unchanged()`
+DOC_FIELDS = ("document_hash", "country", "job_area", "source_type", "target_group", "owner")
+
+
+class DocumentState(NamedTuple):
+    documents: set[tuple]   # distinct DOC_FIELDS values plus embedding_model across the file's rows
+    chunks:    set[str]     # hashes of the chunks stored with a `model` embedding
+
+
+def document_state(filename: str, model: str, cur=None) -> DocumentState:
+    """What is currently stored for `filename`, read with `cur` or a pooled connection."""
+    if cur is None:
+        with db.get_cursor() as cur:
+            return document_state(filename, model, cur)
+    cur.execute(
+        f"SELECT DISTINCT {', '.join(DOC_FIELDS)}, embedding_model, content_hash FROM documents WHERE filename = %s",
+        (filename,),
+    )
+    rows = cur.fetchall()
+    return DocumentState({tuple(r[:-1]) for r in rows}, {r[-1] for r in rows if r[-1] and r[-2] == model})
+
+
+def lookup_embeddings(hashes: Iterable[str], model: str) -> dict[str, list[float]]:
+    """Stored `model` embeddings for any of `hashes`, regardless of which file they came from."""
+    hashes = list(hashes)
+    if not hashes:
+        return {}
+    # a separate pooled connection: the writer's connection is busy with COPY
+    with db.get_cursor() as cur:
+        cur.execute(
+            """
+            SELECT DISTINCT ON (content_hash) content_hash, content_embedding::text
+              FROM documents
+             WHERE content_hash = ANY(%s) AND embedding_model = %s AND content_embedding IS NOT NULL
+            """,
+            (hashes, model),
+        )
+        return {h: json.loads(vec) for h, vec in cur.fetchall()}
+
+
+class IncrementalIngest:
+    """Tracks one document's chunk delta while the ingestion pipeline streams through it."""
+
+    def __init__(self, doc: dict, model: str):
+        self.doc   = doc
+        self.model = model   # the embedder's: rows embedded by any other model are replaced
+        self.state = document_state(doc["filename"], model)
+        self.seen   = set()
+        self.kept   = []   # (hash, chunk) already stored under this filename by `model`
+        self.counts = {"duplicates": 0, "kept": 0, "reused": 0, "embedded": 0, "deleted": 0}
+
+    def unchanged(self) -> bool:
+        fields = [i for i, k in enumerate(DOC_FIELDS) if k in self.doc]
+        wanted = (*(self.doc[DOC_FIELDS[i]] for i in fields), self.model)
+        stored = {(*(d[i] for i in fields), d[-1]) for d in self.state.documents}
+        return bool(self.state.chunks) and stored == {wanted}
+
+    def lock(self, cur) -> bool:
+        """
+        Serialize with other ingests of this filename until `cur`'s transaction
+        ends, and re-read the stored state under the lock. Returns False if it
+        changed since this delta was started; chunks already passed through
+        `new_chunks()` were then judged against the old state.
+        """
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (self.doc["filename"],))
+        before, self.state = self.state, document_state(self.doc["filename"], self.model, cur)
+        return self.state == before
+
+    def new_chunks(self, chunks: Iterable[Chunk]) -> Iterator[Chunk]:
+        """Drop chunks that are repeated in this document or already stored for it."""
+        for chunk in chunks:
+            h = content_hash(chunk.text)
+            if h in self.seen:
+                self.counts["duplicates"] += 1
+                continue
+            self.seen.add(h)
+            if h in self.state.chunks:
+                self.kept.append((h, chunk))
+                self.counts["kept"] += 1
+                continue
+            yield chunk
+
+    def embed(self, chunks: Iterable[Chunk], embedder, group_size: Optional[int] = None) -> Iterator[tuple[Chunk, list[float]]]:
+        """Like `embedder.embed_stream`, but reuses stored embeddings for known chunk text (`embedder.model` is `model`)."""
+        group_size = group_size or embedder.max_batch_size * embedder.concurrency
+        group = []
+        for chunk in chunks:
+            group.append(chunk)
+            if len(group) >= group_size:
+                yield from self._embed_group(group, embedder)
+                group = []
+        if group:
+            yield from self._embed_group(group, embedder)
+
+    def _embed_group(self, group: list[Chunk], embedder):
+        hashes  = [content_hash(c.text) for c in group]
+        reused  = lookup_embeddings(set(hashes), embedder.model)
+        missing = [i for i, h in enumerate(hashes) if h not in reused]
+        fresh   = dict(zip(missing, embedder.embed([group[i].text for i in missing])))
+        self.counts["reused"]   += len(group) - len(missing)
+        self.counts["embedded"] += len(missing)
+        for i, chunk in enumerate(group):
+            yield chunk, fresh[i] if i in fresh else reused[hashes[i]]
+
+    def finalize(self, cur):
+        """
+        After the new rows are written (same transaction): delete rows for chunks
+        no longer in the document or embedded by another model, and refresh document-level fields and chunk
+        offsets on the rows that were kept.
+        """
+        filename = self.doc["filename"]
+        cur.execute(
+            """
+            DELETE FROM documents
+             WHERE filename = %s
+               AND (content_hash IS NULL OR NOT (content_hash = ANY(%s))
+                    OR embedding_model IS DISTINCT FROM %s)
+            """,
+            (filename, list(self.seen), self.model),
+        )
+        self.counts["deleted"] = cur.rowcount
+
+        if not self.kept:
+            return
+        fields = {k: v for k, v in self.doc.items() if k not in ("filename", "metadata")}
+        assignments = ", ".join(f"{k} = %s" for k in fields)
+        cur.execute(
+            f"UPDATE documents SET {assignments} WHERE filename = %s",
+            (*fields.values(), filename),
+        )
+        base_meta = self.doc.get("metadata") or {}
+        execute_values(
+            cur,
+            """
+            UPDATE documents AS d
+               SET metadata = v.metadata::jsonb
+              FROM (VALUES %s) AS v(filename, content_hash, metadata)
+             WHERE d.filename = v.filename AND d.content_hash = v.content_hash
+            """,
+            [(filename, h, Json({**base_meta, **chunk.metadata()})) for h, chunk in self.kept],
+        )
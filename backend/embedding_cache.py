@@ -0,0 +1,319 @@
+"""
+Query-embedding cache for the SmartFusion RAG API.
+
+Embeddings are keyed by (model name, normalized text), so re-phrasings that only
+differ in case or whitespace share one entry. Two tiers are available:
+
+    MemoryCache   in-process LRU bounded by entry count and TTL
+    SQLiteCache   on-disk tier that survives restarts
+
+Async callers use `aget` / `aput`: the in-memory tier is served on the event
+loop, the SQLite tier is read on a worker thread and written in the background.
+
+`build_cache()` wires them together from env vars:
+
+    EMBED_CACHE_SIZE         max in-memory entries          (default 2048, 0 disables)
+    EMBED_CACHE_TTL          seconds an entry stays valid   (default 86400)
+    EMBED_CACHE_SQLITE       path of the on-disk cache      (unset disables)
+    EMBED_CACHE_SQLITE_ROWS  max rows kept on disk          (default 100000)
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+_WS = re.compile(r"\s+")
+# background writes to the on-disk tier, referenced until they finish
+_writes: set = set()
+
+
+def _write_in_background(fn, *args):
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(fn, *args))
+    _writes.add(task)
+    task.add_done_callback(_write_done)
+
+
+def _write_done(task: asyncio.Task):
+    _writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.warning(f"⚠️  Embedding cache write failed: {task.exception()!r}")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    return _WS.sub(" ", text).strip().casefold()
+
+
+def cache_key(text: str, model: str) -> str:
+    payload = f"{model}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """Base interface: subclasses implement `_get` / `_put`; counters live here."""
+
+    name = "base"
+    blocking = False   # _get / _put do file I/O, so async callers keep them off the event loop
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.hits   = 0
+        self.misses = 0
+
+    def get(self, text: str, model: str) -> Optional[list[float]]:
+        value = self._get(cache_key(text, model))
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, text: str, model: str, embedding: list[float]):
+        self._put(cache_key(text, model), embedding)
+
+    async def aget(self, text: str, model: str) -> Optional[list[float]]:
+        if self.blocking:
+            return await asyncio.to_thread(self.get, text, model)
+        return self.get(text, model)
+
+    async def aput(self, text: str, model: str, embedding: list[float]):
+        if self.blocking:
+            _write_in_background(self.put, text, model, embedding)
+        else:
+            self.put(text, model, embedding)
+
+    def _get(self, key: str) -> Optional[list[float]]:
+        raise NotImplementedError
+
+    def _put(self, key: str, embedding: list[float]):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "backend":  self.name,
+                "hits":     self.hits,
+                "misses":   self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# ── In-process LRU ──
+class MemoryCache(EmbeddingCache):
+    name = "memory"
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 86400.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl         = ttl
+        self._data       = OrderedDict()  # key -> (expires_at, embedding)
+        self._lock       = threading.Lock()
+        self.evictions   = 0
+
+    def _get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, emb = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return emb
+
+    def _put(self, key, embedding):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, list(embedding))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        return {**super().stats(), "size": size, "max_entries": self.max_entries,
+                "ttl": self.ttl, "evictions": self.evictions}
+
+
+# ── On-disk tier ──
+class SQLiteCache(EmbeddingCache):
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, ttl: float = 86400.0, max_rows: int = 100_000):
+        super().__init__()
+        self.path     = path
+        self.ttl      = ttl
+        self.max_rows = max_rows
+        self._lock    = threading.Lock()
+        self._puts    = 0
+        self._conn    = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key        TEXT PRIMARY KEY,
+                    vector     BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at    REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings(used_at)")
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            blob, created_at = row
+            with self._conn:
+                if created_at + self.ttl < now:
+                    self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                    return None
+                self._conn.execute("UPDATE embeddings SET used_at = ? WHERE key = ?", (now, key))
+        return array("f", blob).tolist()
+
+    def _put(self, key, embedding):
+        now = time.time()
+        blob = array("f", embedding).tobytes()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, blob, now, now),
+            )
+            self._puts += 1
+            # prune occasionally rather than on every write
+            if self._puts % 256 == 0:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        self._conn.execute("DELETE FROM embeddings WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            """
+            DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY used_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_rows,),
+        )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {**super().stats(), "size": size, "max_rows": self.max_rows,
+                "ttl": self.ttl, "path": self.path}
+
+
+# ── Memory in front of disk ──
+class TieredCache(EmbeddingCache):
+    name = "tiered"
+
+    def __init__(self, *tiers: EmbeddingCache):
+        super().__init__()
+        self.tiers = tiers
+        self.blocking = any(t.blocking for t in tiers)
+
+    def get(self, text, model):
+        key = cache_key(text, model)
+        for i, tier in enumerate(self.tiers):
+            value = tier._get(key)
+            if self._record(i, key, value):
+                return value
+        return self._missed()
+
+    async def aget(self, text, model):
+        # tier by tier, so a memory hit never leaves the event loop
+        key = cache_key(text, model)
+        for i, tier in enumerate(self.tiers):
+            value = await asyncio.to_thread(tier._get, key) if tier.blocking else tier._get(key)
+            if self._record(i, key, value):
+                return value
+        return self._missed()
+
+    def _record(self, i: int, key: str, value: Optional[list[float]]) -> bool:
+        tier = self.tiers[i]
+        with tier._stats_lock:
+            if value is None:
+                tier.misses += 1
+            else:
+                tier.hits += 1
+        if value is None:
+            return False
+        # promote into the faster tiers
+        for faster in self.tiers[:i]:
+            faster._put(key, value)
+        with self._stats_lock:
+            self.hits += 1
+        return True
+
+    def _missed(self) -> None:
+        with self._stats_lock:
+            self.misses += 1
+        return None
+
+    def _put(self, key, embedding):
+        for tier in self.tiers:
+            tier._put(key, embedding)
+
+    async def aput(self, text, model, embedding):
+        key = cache_key(text, model)
+        for tier in self.tiers:
+            if tier.blocking:
+                _write_in_background(tier._put, key, embedding)
+            else:
+                tier._put(key, embedding)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self):
+        return {**super().stats(), "tiers": [t.stats() for t in self.tiers]}
+
+
+def build_cache() -> Optional[EmbeddingCache]:
+    size = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+    ttl  = float(os.getenv("EMBED_CACHE_TTL", "86400"))
+    path = os.getenv("EMBED_CACHE_SQLITE")
+
+    tiers = []
+    if size > 0:
+        tiers.append(MemoryCache(max_entries=size, ttl=ttl))
+    if path:
+        tiers.append(SQLiteCache(path, ttl=ttl, max_rows=int(os.getenv("EMBED_CACHE_SQLITE_ROWS", "100000"))))
+
+    if not tiers:
+        return None
+    if len(tiers) == 1:
+        return tiers[0]
+    return TieredCache(*tiers)
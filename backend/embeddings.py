@@ -0,0 +1,367 @@
+"""
+Embedding providers, selected by EMBEDDING_PROVIDER:
+
+    openai   OpenAI embeddings API. Chunks are packed into batches bounded by an
+             estimated token budget and a max input count, batches are sent
+             concurrently with bounded parallelism, and rate-limit / transient
+             errors are retried with exponential backoff.
+    local    a sentence-transformers model, loaded once and run on CPU; concurrent
+             query embeddings are coalesced into one forward pass.
+    fake     deterministic pseudo-random unit vectors derived from the text, for
+             tests and load runs without a model or an API key.
+
+Every provider has a `model` name and a vector size `dim`, which are stored
+with each row (`embedding_model`, `embedding_dim`) so retrieval only compares
+vectors from the model that embedded the query.
+
+    EMBEDDING_PROVIDER      "openai" (default), "local" or "fake"
+    EMBEDDING_MODEL         model name (default text-embedding-3-small / BAAI/bge-small-en-v1.5)
+    EMBEDDING_DIM           vector size of the fake provider, or of an OpenAI model
+                            not listed in OPENAI_DIMENSIONS (default 1536)
+    EMBED_BATCH_TOKENS      token budget per request     (default 50000)
+    EMBED_BATCH_SIZE        max inputs per request       (default 256)
+    EMBED_CONCURRENCY       requests in flight at once   (default 4)
+    EMBED_MAX_RETRIES       retries per batch            (default 5)
+    EMBED_LOCAL_BATCH_SIZE  texts per forward pass of the local model (default 32)
+    EMBED_LOCAL_DEVICE      torch device of the local model           (default "cpu")
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+import numpy as np
+import openai
+
+import http_client
+
+log = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+LOCAL_EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+
+OPENAI_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+# Hard per-input limit of the OpenAI embedding models
+MAX_INPUT_TOKENS = 8191
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or the encoding couldn't be downloaded: estimate from characters
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # ~4 chars per token for English text
+    return max(1, math.ceil(len(text) / 4))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of `text` that stays within `max_tokens`."""
+    if max_tokens <= 0:
+        return ""
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else _encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+T = TypeVar("T")
+
+_RETRYABLE = (
+    openai.error.RateLimitError,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+)
+
+
+class Embedder:
+    """Common interface of the providers: `embed` / `aembed` return vectors in input order."""
+
+    provider       = "base"
+    model: str     = ""
+    dim: int       = 0
+    max_batch_size = 256   # with `concurrency`, sizes the groups embed_stream hands to embed()
+    concurrency    = 1
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self.embed, texts)
+
+    def embed_stream(
+        self,
+        items: Iterable[T],
+        key: Callable[[T], str] = lambda item: item,
+        group_size: Optional[int] = None,
+    ) -> Iterator[tuple[T, list[float]]]:
+        """
+        Embed a stream lazily, `group_size` items at a time (enough to keep every
+        concurrent request busy), yielding `(item, embedding)` pairs in order.
+        """
+        group_size = group_size or self.max_batch_size * self.concurrency
+        group = []
+        for item in items:
+            group.append(item)
+            if len(group) >= group_size:
+                yield from zip(group, self.embed([key(i) for i in group]))
+                group = []
+        if group:
+            yield from zip(group, self.embed([key(i) for i in group]))
+
+    def info(self) -> dict:
+        return {"provider": self.provider, "model": self.model, "dim": self.dim}
+
+    def close(self):
+        pass
+
+
+# ── OpenAI ──
+class EmbeddingBatcher(Embedder):
+    provider = "openai"
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        max_batch_tokens: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.model            = model
+        self.max_batch_tokens = max_batch_tokens or int(os.getenv("EMBED_BATCH_TOKENS", "50000"))
+        self.max_batch_size   = max_batch_size or int(os.getenv("EMBED_BATCH_SIZE", "256"))
+        self.concurrency      = concurrency or int(os.getenv("EMBED_CONCURRENCY", "4"))
+        self.max_retries      = max_retries if max_retries is not None else int(os.getenv("EMBED_MAX_RETRIES", "5"))
+        self.backoff_base     = backoff_base
+        self.backoff_max      = backoff_max
+        self.dim              = OPENAI_DIMENSIONS.get(model) or int(os.getenv("EMBEDDING_DIM", "1536"))
+
+    def make_batches(self, texts: list[str]) -> list[list[int]]:
+        """Group text indices into batches that respect the token and size budgets."""
+        batches, current, current_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            if tokens > MAX_INPUT_TOKENS:
+                raise ValueError(f"Chunk {i} has ~{tokens} tokens, above the {MAX_INPUT_TOKENS} model limit")
+            if current and (current_tokens + tokens > self.max_batch_tokens
+                            or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, inputs: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            try:
+                resp = openai.Embedding.create(input=inputs, model=self.model)
+                data = sorted(resp["data"], key=lambda d: d["index"])
+                return [d["embedding"] for d in data]
+            except _RETRYABLE as e:
+                attempt += 1
+                time.sleep(self._retry_delay(attempt, e))
+
+    async def _aembed_batch(self, inputs: list[str]) -> list[list[float]]:
+        attempt = 0
+        while True:
+            try:
+                await http_client.bind_openai()
+                resp = await openai.Embedding.acreate(input=inputs, model=self.model)
+                data = sorted(resp["data"], key=lambda d: d["index"])
+                return [d["embedding"] for d in data]
+            except _RETRYABLE as e:
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(attempt, e))
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """Backoff before retry `attempt`; re-raises once retries are exhausted."""
+        if attempt > self.max_retries:
+            raise error
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        delay *= 0.5 + random.random()  # jitter so parallel batches don't retry in lockstep
+        log.warning("⏳ Embedding batch retry", extra={"attempt": attempt, "max_retries": self.max_retries,
+                                                     "delay_s": round(delay, 1), "error": str(error)})
+        return delay
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embed `texts`, returning vectors in the same order."""
+        if not texts:
+            return []
+        batches = self.make_batches(texts)
+        results: list[Optional[list[float]]] = [None] * len(texts)
+
+        def run(indices):
+            vectors = self._embed_batch([texts[i] for i in indices])
+            for i, vec in zip(indices, vectors):
+                results[i] = vec
+
+        if len(batches) == 1:
+            run(batches[0])
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+                # list() re-raises the first batch failure
+                list(pool.map(run, batches))
+        return results
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        """`embed` on the event loop: batches run concurrently, at most `concurrency` at a time."""
+        if not texts:
+            return []
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def run(indices):
+            async with limit:
+                return await self._aembed_batch([texts[i] for i in indices])
+
+        batches = self.make_batches(texts)
+        results: list[Optional[list[float]]] = [None] * len(texts)
+        for indices, vectors in zip(batches, await asyncio.gather(*(run(b) for b in batches))):
+            for i, vec in zip(indices, vectors):
+                results[i] = vec
+        return results
+
+
+# ── Local sentence-transformers ──
+def _resolve(future: asyncio.Future, value=None, error: Optional[BaseException] = None):
+    if future.done():   # the request was cancelled meanwhile
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+
+
+class LocalEmbedder(Embedder):
+    provider = "local"
+
+    def __init__(self, model: Optional[str] = None, batch_size: Optional[int] = None, device: Optional[str] = None):
+        self.model          = model or os.getenv("EMBEDDING_MODEL", LOCAL_EMBEDDING_MODEL)
+        self.max_batch_size = batch_size or int(os.getenv("EMBED_LOCAL_BATCH_SIZE", "32"))
+        self.device         = device or os.getenv("EMBED_LOCAL_DEVICE", "cpu")
+        self._model         = None
+        self._load_lock     = threading.Lock()
+        # one forward pass at a time: concurrent passes just split the same cores
+        self._executor      = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-local")
+        self._pending: list = []   # (texts, future, loop) waiting for the next pass
+        self._pending_lock  = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model, device=self.device)
+                log.info(f"✔️  Local embedding model ready: {self.model}")
+        return self._model
+
+    @property
+    def dim(self) -> int:
+        return self._load().get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        vectors = self._load().encode(
+            texts, batch_size=self.max_batch_size, normalize_embeddings=True,
+            convert_to_numpy=True, show_progress_bar=False,
+        )
+        return vectors.tolist()
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        """Queue `texts` for the next forward pass, shared with whatever else is waiting."""
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._pending_lock:
+            self._pending.append((texts, future, loop))
+            first = len(self._pending) == 1
+        if first:
+            self._executor.submit(self._drain)
+        return await future
+
+    def _drain(self):
+        while True:
+            with self._pending_lock:
+                waiting, self._pending = self._pending, []
+            if not waiting:
+                return
+            try:
+                vectors = self.embed([t for texts, _, _ in waiting for t in texts])
+            except Exception as e:
+                for _, future, loop in waiting:
+                    loop.call_soon_threadsafe(_resolve, future, None, e)
+                continue
+            offset = 0
+            for texts, future, loop in waiting:
+                loop.call_soon_threadsafe(_resolve, future, vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ── Deterministic fake ──
+class FakeEmbedder(Embedder):
+    provider = "fake"
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim   = dim or int(os.getenv("EMBEDDING_DIM", "1536"))
+        self.model = f"fake-{self.dim}"
+
+    def _vector(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vec = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vec / np.linalg.norm(vec)).tolist()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(t) for t in texts]
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        return self.embed(texts)
+
+
+PROVIDERS = {"openai": EmbeddingBatcher, "local": LocalEmbedder, "fake": FakeEmbedder}
+
+
+def build_embedder(provider: Optional[str] = None) -> Embedder:
+    provider = (provider or os.getenv("EMBEDDING_PROVIDER", "openai")).lower()
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER: {provider}")
+    if provider == "openai":
+        return EmbeddingBatcher(model=os.getenv("EMBEDDING_MODEL", EMBEDDING_MODEL))
+    return PROVIDERS[provider]()
+
+
+_embedder: Optional[Embedder] = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder:
+    """The configured provider, shared by ingestion and the query path."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = build_embedder()
+        return _embedder
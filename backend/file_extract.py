@@ -0,0 +1,98 @@
+"""
+Text extraction by file type, for bulk ingestion (see bulk_ingest.py).
+
+Each extractor returns a document as `(page_number, text)` sections, the shape
+iter_chunks() consumes. They are plain top-level functions so they can run in
+worker processes.
+
+    .pdf          page by page with PyMuPDF (pdf_extract.page_text)
+    .docx         paragraphs of word/document.xml, read with lxml; pages follow
+                  the page breaks Word recorded when it last laid the file out
+    .html .htm    main text, boilerplate removed (html_extract.py)
+    .txt .md      as-is
+"""
+import os
+import zipfile
+
+import fitz  # PyMuPDF
+from lxml import etree
+
+import html_extract
+from pdf_extract import page_text
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+SOURCE_TYPES = {
+    ".pdf": "PDF", ".docx": "DOCX", ".html": "HTML", ".htm": "HTML", ".txt": "Text", ".md": "Text",
+}
+
+
+def supported(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in SOURCE_TYPES
+
+
+def source_type(path: str) -> str:
+    return SOURCE_TYPES[os.path.splitext(path)[1].lower()]
+
+
+def extract_pdf(path: str) -> list[tuple[int, str]]:
+    with fitz.open(path) as doc:
+        return [(i + 1, page_text(page)) for i, page in enumerate(doc)]
+
+
+def extract_docx(path: str) -> list[tuple[int, str]]:
+    pages, paragraphs, page = [], [], 1
+    with zipfile.ZipFile(path) as z, z.open("word/document.xml") as xml:
+        for _, p in etree.iterparse(xml, events=("end",), tag=f"{W}p"):
+            parts, breaks = [], 0
+            for el in p.iter():
+                if el.tag == f"{W}t" and el.text:
+                    parts.append(el.text)
+                elif el.tag == f"{W}tab":
+                    parts.append("\t")
+                elif el.tag in (f"{W}br", f"{W}cr"):
+                    if el.get(f"{W}type") == "page":
+                        breaks += 1
+                    else:
+                        parts.append("\n")
+                elif el.tag == f"{W}lastRenderedPageBreak":
+                    breaks += 1
+            # the paragraph counts towards the page it starts on
+            text = "".join(parts).strip()
+            if text:
+                paragraphs.append(text)
+            if breaks:
+                if paragraphs:
+                    pages.append((page, "\n".join(paragraphs)))
+                    paragraphs = []
+                page += breaks
+            p.clear()   # nested paragraphs (table cells, text boxes) are not counted twice
+    if paragraphs:
+        pages.append((page, "\n".join(paragraphs)))
+    return pages
+
+
+def extract_html(path: str) -> list[tuple[int, str]]:
+    with open(path, "rb") as f:
+        page = html_extract.extract(f.read(), f"file://{os.path.abspath(path)}")
+    return [(1, page.text)] if page.text else []
+
+
+def extract_text(path: str) -> list[tuple[int, str]]:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    return [(1, text)] if text.strip() else []
+
+
+EXTRACTORS = {
+    ".pdf": extract_pdf, ".docx": extract_docx, ".html": extract_html, ".htm": extract_html,
+    ".txt": extract_text, ".md": extract_text,
+}
+
+
+def extract(path: str) -> list[tuple[int, str]]:
+    """The document's `(page_number, text)` sections; raises for unsupported or unreadable files."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXTRACTORS:
+        raise ValueError(f"Unsupported file type: {ext or path}")
+    return EXTRACTORS[ext](path)
@@ -0,0 +1,294 @@
+"""
+Metadata filters and filtered vector search planning.
+
+`country`, `job_area` and `source_type` each have a normalized `<field>_key`
+column (lower-cased, whitespace-collapsed, generated by Postgres so every
+writer gets it for free) with a `text_pattern_ops` B-tree index. Filter values
+are matched against those keys:
+
+    "Germany"            exact match           country_key = 'germany'
+    "Ger*"               prefix match          country_key LIKE 'ger%'
+    ["Germany", "India"] set membership        country_key = ANY(...)
+    "*man*"              substring (unindexed) country_key LIKE '%man%'
+
+Filtered vector searches are planned from the planner's row estimate for the
+filter: selective filters pre-filter through the B-tree and rank the few
+matching rows exactly; broad filters go through the ANN index, with iterative
+scans (pgvector >= 0.8) or a larger ef_search so enough rows survive the filter.
+When the ANN index is compact (see vector_index.IndexSpec), its candidates are
+rescored against the full vectors.
+
+    FILTER_PREFILTER_MAX_ROWS  pre-filter when at most this many rows match (default 20000)
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Union
+
+import vector_index
+
+FILTER_FIELDS = ("country", "job_area", "source_type")
+
+FilterValue = Union[str, List[str], None]
+
+_WS = re.compile(r"\s+", re.ASCII)
+
+
+def clean_value(value: str) -> str:
+    """Display form stored at ingest: trimmed, internal whitespace collapsed."""
+    return _WS.sub(" ", value).strip(" ")
+
+
+def normalize(value: str) -> str:
+    """Key form; must match the `<field>_key` generated columns in schema.py."""
+    return clean_value(value).lower()
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def parse_terms(value: FilterValue) -> list[tuple[str, str]]:
+    """A filter value as (kind, normalized text) terms; kind is "exact", "prefix" or "substring"."""
+    if value is None:
+        return []
+    terms = []
+    for v in ([value] if isinstance(value, str) else value):
+        if not v or not v.strip():
+            continue
+        if len(v) > 2 and v.startswith("*") and v.endswith("*"):
+            terms.append(("substring", normalize(v[1:-1])))
+        elif len(v) > 1 and v.endswith("*"):
+            terms.append(("prefix", normalize(v[:-1])))
+        else:
+            terms.append(("exact", normalize(v)))
+    return terms
+
+
+def key_matches(terms: list[tuple[str, str]], key: str) -> bool:
+    """Whether a normalized key passes `terms`, the same way `_condition`'s SQL does."""
+    for kind, text in terms:
+        if (kind == "exact" and key == text or kind == "prefix" and key.startswith(text)
+                or kind == "substring" and text in key):
+            return True
+    return False
+
+
+def _condition(field: str, terms: list[tuple[str, str]]) -> Optional[tuple[str, list]]:
+    column = f"{field}_key"
+    if not terms:
+        return None
+
+    exact, clauses, params = [], [], []
+    for kind, text in terms:
+        if kind == "substring":
+            clauses.append(f"{column} LIKE %s")
+            params.append(f"%{_escape_like(text)}%")
+        elif kind == "prefix":
+            clauses.append(f"{column} LIKE %s")
+            params.append(f"{_escape_like(text)}%")
+        else:
+            exact.append(text)
+    if len(exact) == 1:
+        clauses.insert(0, f"{column} = %s")
+        params.insert(0, exact[0])
+    elif exact:
+        clauses.insert(0, f"{column} = ANY(%s)")
+        params.insert(0, exact)
+
+    sql = clauses[0] if len(clauses) == 1 else "(" + " OR ".join(clauses) + ")"
+    return sql, params
+
+
+class FilterSet:
+    def __init__(
+        self,
+        country: FilterValue = None,
+        job_area: FilterValue = None,
+        source_type: FilterValue = None,
+        filenames: Optional[List[str]] = None,
+        embedding_model: Optional[str] = None,
+    ):
+        self.clauses: list[str] = []
+        self.params:  list = []
+        # the parsed filters, for backends that evaluate them without SQL (local_store.py)
+        self.terms = {f: t for f, v in zip(FILTER_FIELDS, (country, job_area, source_type)) if (t := parse_terms(v))}
+        self.filenames = sorted(set(filenames)) if filenames else None
+        # not a filter of its own (bool(fs) stays False): it only keeps rows
+        # embedded by another model out of a search
+        self.embedding_model = embedding_model
+        for field, terms in self.terms.items():
+            cond = _condition(field, terms)
+            self.clauses.append(cond[0])
+            self.params.extend(cond[1])
+        if self.filenames:
+            self.clauses.append("filename = ANY(%s)")
+            self.params.append(self.filenames)
+
+    def __bool__(self):
+        return bool(self.clauses)
+
+    def where(self, keyword: str = "WHERE") -> tuple[str, list]:
+        """The conditions as a SQL fragment; pass keyword="AND" to extend an existing WHERE."""
+        clauses, params = list(self.clauses), list(self.params)
+        if self.embedding_model:
+            clauses.append("embedding_model = %s")
+            params.append(self.embedding_model)
+        if not clauses:
+            return "", []
+        return f"{keyword} " + " AND ".join(clauses), params
+
+    def signature(self) -> str:
+        return json.dumps([self.clauses, self.params, self.embedding_model], default=str)
+
+
+# ── Selectivity estimates ──
+_estimates = OrderedDict()   # signature -> (expires_at, rows)
+_estimates_lock = threading.Lock()
+ESTIMATE_TTL = 60.0
+
+
+def _cached_estimate(fs: FilterSet) -> Optional[int]:
+    with _estimates_lock:
+        hit = _estimates.get(fs.signature())
+    return hit[1] if hit and hit[0] > time.monotonic() else None
+
+
+def _store_estimate(fs: FilterSet, plan) -> int:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    rows = int(plan[0]["Plan"]["Plan Rows"])
+    with _estimates_lock:
+        _estimates[fs.signature()] = (time.monotonic() + ESTIMATE_TTL, rows)
+        while len(_estimates) > 1024:
+            _estimates.popitem(last=False)
+    return rows
+
+
+# ── Filtered vector search ──
+def _search_steps(q_emb, fs: FilterSet, k: int, columns, ef_search, probes, exact):
+    """
+    The statements for one filtered vector search, as a generator: it yields
+    (sql, params) and is sent back each statement's fetched rows, so the same
+    planning runs under psycopg2 (`vector_search`) and psycopg 3 (`avector_search`).
+    Its return value is the result rows.
+    """
+    cols = ", ".join(columns)
+    where_sql, params = fs.where()
+    strategy = "ann"
+    iterative = False
+    # with a compact (quantized / truncated) index, fetch extra candidates to rescore exactly
+    spec = None if exact else vector_index.active_spec()
+    fetch = spec.rescore_candidates(k) if spec else k
+
+    if fs and not exact:
+        # the planner's row estimate for the filter, cached briefly per filter
+        matching = _cached_estimate(fs)
+        if matching is None:
+            rows = yield f"EXPLAIN (FORMAT JSON) SELECT 1 FROM documents {where_sql}", params
+            matching = _store_estimate(fs, rows[0][0])
+        if vector_index.iterative_scan_known() is None:
+            vector_index.record_extension_version((yield vector_index.EXTENSION_VERSION_SQL, []))
+
+        if matching <= int(os.getenv("FILTER_PREFILTER_MAX_ROWS", "20000")):
+            strategy = "prefilter"
+        elif vector_index.iterative_scan_known():
+            iterative = True
+        elif ef_search is None:
+            # without iterative scans HNSW returns at most ef_search candidates
+            # before filtering, so widen it by the inverse selectivity
+            rows = yield "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = 'documents'", []
+            total = int(rows[0][0]) if rows else 0
+            selectivity = matching / max(total, matching, 1)
+            ef_search = min(1000, max(fetch, math.ceil(fetch / max(selectivity, 1e-3))))
+
+    if strategy == "prefilter":
+        # MATERIALIZED keeps the planner from pushing the ORDER BY into the ANN index:
+        # the B-tree narrows the rows, then the small set is ranked exactly
+        sql = f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT {cols}, content_embedding FROM documents {where_sql}
+            )
+            SELECT {cols}, content_embedding <=> %s::vector AS distance
+              FROM candidates
+             ORDER BY distance
+             LIMIT %s
+        """
+        db_params = params + [q_emb, k]
+    elif spec and spec.compact:
+        settings = vector_index.search_settings(fetch, ef_search, probes, iterative=iterative)
+        if settings:
+            yield settings
+        # the inner query walks the compact index; only its candidates are ranked by full vectors
+        sql = f"""
+            SELECT {cols}, distance FROM (
+                SELECT {cols}, content_embedding <=> %s::vector AS distance
+                  FROM documents
+                 {where_sql}
+                 ORDER BY {spec.order_by()}
+                 LIMIT %s
+            ) candidates
+             ORDER BY distance
+             LIMIT %s
+        """
+        db_params = [q_emb] + params + [q_emb, fetch, k]
+    else:
+        settings = vector_index.search_settings(k, ef_search, probes, exact, iterative=iterative)
+        if settings:
+            yield settings
+        sql = f"""
+            SELECT {cols}, content_embedding <=> %s::vector AS distance
+              FROM documents
+             {where_sql}
+             ORDER BY distance
+             LIMIT %s
+        """
+        db_params = [q_emb] + params + [k]
+
+    return (yield sql, db_params)
+
+
+def vector_search(
+    cur,
+    q_emb: list[float],
+    fs: FilterSet,
+    k: int,
+    columns: tuple[str, ...] = ("filename", "full_text"),
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    exact: bool = False,
+) -> list[tuple]:
+    """Top-k rows by cosine distance under `fs`; each row is `columns` + distance."""
+    steps = _search_steps(q_emb, fs, k, columns, ef_search, probes, exact)
+    rows = None
+    try:
+        while True:
+            cur.execute(*steps.send(rows))
+            rows = cur.fetchall()
+    except StopIteration as done:
+        return done.value
+
+
+async def avector_search(
+    cur,
+    q_emb: list[float],
+    fs: FilterSet,
+    k: int,
+    columns: tuple[str, ...] = ("filename", "full_text"),
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    exact: bool = False,
+) -> list[tuple]:
+    """`vector_search` on a psycopg 3 async cursor."""
+    steps = _search_steps(q_emb, fs, k, columns, ef_search, probes, exact)
+    rows = None
+    try:
+        while True:
+            await cur.execute(*steps.send(rows))
+            rows = await cur.fetchall()
+    except StopIteration as done:
+        return done.value
@@ -0,0 +1,177 @@
+"""
+Main-text extraction from HTML pages, for URL ingestion and the crawler.
+
+Pages are parsed with lxml (libxml2), which builds and walks the tree in C:
+several times faster than BeautifulSoup, whose trees are Python objects even
+on the lxml builder. Links are collected from the whole page first, since
+navigation is how a crawl finds the rest of a site. Then boilerplate is
+removed before the text is taken:
+
+  * when the page marks its content with <main>, <article> or role="main",
+    only that is kept; otherwise page chrome (nav, header, footer, aside) goes;
+  * scripts, styles, forms, embedded media and ARIA navigation/banner landmarks;
+  * elements whose class or id names them as menus, breadcrumbs, sidebars,
+    cookie banners, share buttons and the like;
+  * link lists: blocks whose text is mostly link text.
+
+Block-level elements become paragraph breaks, so the chunker splits on them.
+"""
+import codecs
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urldefrag, urljoin
+
+from lxml import etree
+from lxml import html as lxml_html
+
+ALWAYS_DROP = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+               "form", "button", "select", "nav", "dialog"}
+CHROME      = {"header", "footer", "aside"}
+DROP_ROLES  = {"navigation", "banner", "contentinfo", "search", "menu", "menubar", "dialog", "alert"}
+BOILERPLATE = re.compile(
+    r"(?:^|[-_ ])(?:nav|navbar|navigation|menu|breadcrumbs?|sidebar|cookies?|consent|gdpr|share|sharing|"
+    r"social|related|comments?|advert|ads|promo|newsletter|subscribe|skip-link|pagination|toc)(?:$|[-_ ])",
+    re.IGNORECASE,
+)
+LINK_LIST_TAGS = {"ul", "ol", "div", "section", "table"}
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "h1", "h2", "h3", "h4", "h5", "h6",
+              "ul", "ol", "li", "dl", "dt", "dd", "table", "tr", "pre", "blockquote", "figure",
+              "figcaption", "details", "summary", "header", "footer", "aside"}
+NO_TEXT = {"script", "style", "noscript", "template"}
+
+
+@dataclass
+class HtmlPage:
+    title:    str
+    text:     str
+    links:    list[str] = field(default_factory=list)
+    noindex:  bool = False   # <meta name="robots" content="noindex">: don't ingest the text
+
+
+def _robots_meta(root) -> set[str]:
+    directives = set()
+    for meta in root.iter("meta"):
+        if (meta.get("name") or "").lower() == "robots":
+            directives |= {d.strip().lower() for d in (meta.get("content") or "").split(",")}
+    return directives
+
+
+def _links(root, base_url: str) -> list[str]:
+    base = root.find(".//base[@href]")
+    if base is not None:
+        base_url = urljoin(base_url, base.get("href"))
+    seen, links = set(), []
+    for a in root.iter("a"):
+        href = a.get("href")
+        if not href or "nofollow" in (a.get("rel") or "").lower().split():
+            continue
+        url = urldefrag(urljoin(base_url, href.strip()))[0]
+        if url.startswith(("http://", "https://")) and url not in seen:
+            seen.add(url)
+            links.append(url)
+    return links
+
+
+def _is_boilerplate(el) -> bool:
+    if el.tag in ("html", "body", "main", "article"):
+        return False
+    if (el.get("role") or "").lower() in DROP_ROLES:
+        return True
+    return bool(BOILERPLATE.search(f"{el.get('class') or ''} {el.get('id') or ''}"))
+
+
+def _measure(root) -> dict:
+    """(text chars, linked text chars) of every element under `root`, in one bottom-up pass."""
+    sizes = {}
+    for _, el in etree.iterwalk(root, events=("end",)):
+        text = 0 if el.tag in NO_TEXT else len((el.text or "").strip())
+        linked = 0
+        for child in el:
+            t, l = sizes[child]
+            text += t + len((child.tail or "").strip())
+            linked += l
+        sizes[el] = (text, text if el.tag == "a" else linked)
+    return sizes
+
+
+def _main_content(root, sizes: dict):
+    candidates = [root.find(".//main"), root.find('.//*[@role="main"]'), root.find(".//article")]
+    for candidate in candidates:
+        if candidate is not None and sizes[candidate][0] > 0:
+            return candidate, True
+    body = root.find("body")
+    return (body if body is not None else root), False
+
+
+def _clean(root, marked: bool, sizes: dict):
+    drop = ALWAYS_DROP if marked else ALWAYS_DROP | CHROME
+    total = sizes[root][0] or 1
+    stack = [root]
+    while stack:
+        for child in list(stack.pop()):
+            if not isinstance(child.tag, str):   # comments, processing instructions
+                child.drop_tree()
+                continue
+            text, linked = sizes[child]
+            # never drop something holding most of the page (e.g. <div class="has-sidebar">)
+            minor = text < total / 2
+            if (child.tag in drop
+                    or minor and _is_boilerplate(child)
+                    or minor and child.tag in LINK_LIST_TAGS and text and linked / text > 0.6):
+                child.drop_tree()   # keeps the text that follows it
+            else:
+                stack.append(child)
+
+
+def _block_text(root) -> str:
+    parts = []
+    for event, el in etree.iterwalk(root, events=("start", "end")):
+        if event == "start":
+            if el.tag == "br":
+                parts.append("\n")
+            elif el.tag in BLOCK_TAGS:
+                parts.append("\n\n")
+            if el.text:
+                parts.append(el.text)
+        else:
+            if el.tag in BLOCK_TAGS:
+                parts.append("\n\n")
+            if el.tail and el is not root:
+                parts.append(el.tail)
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _parser(encoding: Optional[str]) -> lxml_html.HTMLParser:
+    """A parser for `encoding` as given, by Python's name for it, or (unknown to both) sniffing the page."""
+    try:
+        python_name = codecs.lookup(encoding).name if encoding else None
+    except LookupError:
+        python_name = None
+    for name in dict.fromkeys((encoding, python_name, None)):
+        try:
+            return lxml_html.HTMLParser(encoding=name, remove_comments=True, remove_pis=True)
+        except LookupError:   # libxml2 spells some charsets differently, e.g. "latin-1"
+            continue
+
+
+def extract(html, base_url: str, encoding: Optional[str] = None) -> HtmlPage:
+    """Title, boilerplate-free text and outgoing links of a page (`html` as str or bytes)."""
+    if isinstance(html, str):   # lxml refuses str input that carries an encoding declaration
+        html, encoding = html.encode("utf-8"), "utf-8"
+    try:
+        root = lxml_html.document_fromstring(html, parser=_parser(encoding))
+    except (etree.ParserError, ValueError):   # empty or not HTML at all
+        return HtmlPage(title="", text="")
+    robots = _robots_meta(root)
+    title = " ".join((root.findtext(".//title") or "").split())
+    links = [] if "nofollow" in robots or "none" in robots else _links(root, base_url)
+
+    sizes = _measure(root)
+    content, marked = _main_content(root, sizes)
+    _clean(content, marked, sizes)
+    text = _block_text(content)
+    if title and not text.startswith(title):
+        text = f"{title}\n\n{text}" if text else title
+    return HtmlPage(title=title, text=text, links=links, noindex="noindex" in robots or "none" in robots)
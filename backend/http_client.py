@@ -0,0 +1,42 @@
+"""
+Shared async HTTP session for outbound API calls.
+
+openai's async client opens (and tears down) a new aiohttp session per call
+unless one is bound to its `aiosession` context variable, which costs a TCP +
+TLS handshake on every embedding and chat request. One keep-alive session is
+created at startup and bound per call with `bind_openai()`.
+
+    HTTP_MAX_CONNECTIONS   total pooled connections                  (default 100)
+    HTTP_KEEPALIVE         seconds an idle connection is kept alive  (default 30)
+"""
+import os
+from typing import Optional
+
+import aiohttp
+import openai
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def init_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit             = int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            keepalive_timeout = float(os.getenv("HTTP_KEEPALIVE", "30")),
+            ttl_dns_cache     = 300,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+async def bind_openai():
+    """Make openai's async calls in the current task reuse the shared session."""
+    openai.aiosession.set(await init_session())
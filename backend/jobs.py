@@ -0,0 +1,337 @@
+"""
+Background ingestion jobs.
+
+Ingest endpoints enqueue work on a local queue served by a small pool of worker
+threads and return a job id right away. Each job's state and progress counters
+are persisted in the `ingest_jobs` table so `/jobs/{id}` can still report them
+after the job finishes or the server restarts. Without Postgres (the local
+vector store, see local_store.py) `use_memory()` keeps them in process instead.
+
+Several server processes can share the table, so each job records the
+process that owns it, and that process keeps a heartbeat on its queued and
+running jobs. A job whose heartbeat has lapsed lost its process (a crash or a
+restart; the local queue doesn't survive either) and is marked failed by
+whichever process notices first.
+
+    INGEST_WORKERS          number of worker threads (default 2)
+    JOB_HEARTBEAT_SECONDS   heartbeat interval; a job is given up after
+                            three missed beats (default 30)
+    JOB_MEMORY_TTL          with use_memory(), seconds a finished job stays
+                            visible to /jobs/{id} (default 86400)
+    JOB_MEMORY_MAX          with use_memory(), finished jobs kept at most (default 1000)
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+import db
+import logs
+import metrics
+
+log = logging.getLogger(__name__)
+
+PROGRESS_FIELDS = ("pages_extracted", "chunks_embedded", "rows_written")
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id               TEXT PRIMARY KEY,
+    kind             TEXT        NOT NULL,
+    source           TEXT        NOT NULL,
+    status           TEXT        NOT NULL DEFAULT 'queued',
+    pages_extracted  INTEGER     NOT NULL DEFAULT 0,
+    chunks_embedded  INTEGER     NOT NULL DEFAULT 0,
+    rows_written     INTEGER     NOT NULL DEFAULT 0,
+    params           JSONB,
+    result           JSONB,
+    error            TEXT,
+    created_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at       TIMESTAMPTZ,
+    finished_at      TIMESTAMPTZ
+);
+ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS owner TEXT;
+ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS ingest_jobs_unfinished_idx ON ingest_jobs (heartbeat_at)
+    WHERE status IN ('queued', 'running')
+"""
+
+
+# job records by id when jobs are kept in memory rather than in `ingest_jobs`
+_memory: Optional[dict[str, dict]] = None
+_memory_lock = threading.Lock()
+
+
+def use_memory():
+    global _memory
+    if _memory is None:
+        _memory = {}
+
+
+def _prune_memory():
+    """Forget finished in-memory jobs past JOB_MEMORY_TTL, then the oldest beyond JOB_MEMORY_MAX."""
+    cutoff   = _now() - timedelta(seconds=float(os.getenv("JOB_MEMORY_TTL", "86400")))
+    finished = sorted((r for r in _memory.values() if r["finished_at"] is not None),
+                      key=lambda r: r["finished_at"])
+    excess   = len(finished) - int(os.getenv("JOB_MEMORY_MAX", "1000"))
+    for i, record in enumerate(finished):
+        if i < excess or record["finished_at"] < cutoff:
+            del _memory[record["id"]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def owner() -> str:
+    """This process, as recorded on the jobs it queues."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def heartbeat_seconds() -> float:
+    return float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+
+
+class Job:
+    """Handle passed to job functions for reporting progress."""
+
+    def __init__(self, job_id: str, kind: str, source: str):
+        self.id     = job_id
+        self.kind   = kind
+        self.source = source
+        self._parts = {}   # part key -> its latest counters, see part()
+        self._parts_lock = threading.Lock()
+
+    def progress(self, **counters):
+        """Set absolute values for any of pages_extracted / chunks_embedded / rows_written."""
+        unknown = set(counters) - set(PROGRESS_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown progress fields: {sorted(unknown)}")
+        if not counters:
+            return
+        if _memory is not None:
+            with _memory_lock:
+                _memory[self.id].update(counters)
+            return
+        assignments = ", ".join(f"{name} = %s" for name in counters)
+        with db.get_cursor(commit=True) as cur:
+            cur.execute(
+                f"UPDATE ingest_jobs SET {assignments} WHERE id = %s",
+                (*counters.values(), self.id),
+            )
+
+    def part(self, key: str) -> "JobPart":
+        """Handle for one of several documents a job ingests; their counters add up to the job's."""
+        return JobPart(self, key)
+
+
+class JobPart:
+    def __init__(self, job: Job, key: str):
+        self.job = job
+        self.key = key
+
+    def progress(self, **counters):
+        """Set this part's absolute counters; the job reports the sum over its parts."""
+        job = self.job
+        with job._parts_lock:
+            job._parts.setdefault(self.key, {}).update(counters)
+            totals = {name: sum(p.get(name, 0) for p in job._parts.values()) for name in counters}
+            job.progress(**totals)   # under the lock, so a stale total never lands after a newer one
+
+
+class JobQueue:
+    def __init__(self, workers: Optional[int] = None):
+        self.workers  = workers or int(os.getenv("INGEST_WORKERS", "2"))
+        self._queue   = queue.Queue()
+        self._threads = []
+        self._held    = set()   # ids of this process's queued and running jobs
+        self._held_lock = threading.Lock()
+        self._stopping  = threading.Event()
+        self._heartbeat = None
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if _memory is None:
+            self._stopping.clear()
+            self._heartbeat = threading.Thread(target=self._beat, name="ingest-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def stop(self):
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join(timeout=5)
+        self._threads = []
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout=5)
+            self._heartbeat = None
+
+    def _beat(self):
+        interval = heartbeat_seconds()
+        while not self._stopping.wait(interval):
+            with self._held_lock:
+                held = list(self._held)
+            try:
+                with db.get_cursor(commit=True) as cur:
+                    if held:
+                        cur.execute("UPDATE ingest_jobs SET heartbeat_at = now() WHERE id = ANY(%s)", (held,))
+                    fail_abandoned(cur, interval)
+            except Exception:
+                log.exception("❌ Job heartbeat failed")
+
+    def submit(self, kind: str, source: str, fn: Callable, *args, params: Optional[dict] = None) -> str:
+        """Persist a queued job and hand `fn(job, *args)` to the workers; returns the job id."""
+        job_id = uuid.uuid4().hex
+        with self._held_lock:
+            self._held.add(job_id)
+        if _memory is not None:
+            with _memory_lock:
+                _prune_memory()
+                _memory[job_id] = {
+                    "id": job_id, "kind": kind, "source": source, "status": "queued",
+                    **{field: 0 for field in PROGRESS_FIELDS},
+                    "params": params or {}, "result": None, "error": None,
+                    "created_at": _now(), "started_at": None, "finished_at": None,
+                }
+        else:
+            try:
+                with db.get_cursor(commit=True) as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO ingest_jobs (id, kind, source, params, owner, heartbeat_at)
+                        VALUES (%s, %s, %s, %s, %s, now())
+                        """,
+                        (job_id, kind, source, json.dumps(params or {}), owner()),
+                    )
+            except Exception:
+                with self._held_lock:
+                    self._held.discard(job_id)
+                raise
+        # the submitting request's id follows the job into the worker's log lines
+        self._queue.put((Job(job_id, kind, source), fn, args, logs.request_id.get()))
+        return job_id
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job, fn, args, request_id = item
+            logs.request_id.set(request_id)
+            started = time.perf_counter()
+            status = "failed"
+            try:
+                _set_status(job.id, "running", started=True)
+                result = fn(job, *args)
+                _set_status(job.id, "succeeded", result=result)
+                status = "succeeded"
+            except Exception as e:
+                log.exception(f"❌ Job {job.id} ({job.kind} {job.source}) failed")
+                try:
+                    _set_status(job.id, "failed", error=str(e) or type(e).__name__)
+                except Exception:
+                    log.exception(f"❌ Could not record the failure of job {job.id}")
+            finally:
+                with self._held_lock:
+                    self._held.discard(job.id)
+                metrics.INGEST_JOBS.inc(kind=job.kind, status=status)
+                metrics.INGEST_JOB_SECONDS.observe(time.perf_counter() - started, kind=job.kind)
+                log.info("Job finished", extra={"job_id": job.id, "kind": job.kind, "status": status,
+                                                "duration_s": round(time.perf_counter() - started, 3)})
+                self._queue.task_done()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+
+def _set_status(job_id: str, status: str, started: bool = False,
+                result: Optional[dict] = None, error: Optional[str] = None):
+    finished = status in ("succeeded", "failed")
+    if _memory is not None:
+        with _memory_lock:
+            record = _memory[job_id]
+            record["status"] = status
+            record["result"] = result if result is not None else record["result"]
+            record["error"]  = error if error is not None else record["error"]
+            if started:
+                record["started_at"] = _now()
+            if finished:
+                record["finished_at"] = _now()
+                _prune_memory()
+        return
+    with db.get_cursor(commit=True) as cur:
+        cur.execute(
+            f"""
+            UPDATE ingest_jobs
+               SET status = %s,
+                   result = COALESCE(%s, result),
+                   error  = COALESCE(%s, error)
+                   {", started_at = now()" if started else ""}
+                   {", finished_at = now()" if finished else ""}
+             WHERE id = %s
+            """,
+            (status, json.dumps(result) if result is not None else None, error, job_id),
+        )
+
+
+def fail_abandoned(cur, interval: float, restarted: Optional[str] = None) -> int:
+    """
+    Mark failed the unfinished jobs whose owner missed three heartbeats (or
+    predates them), and those of `restarted`, an owner known to be gone.
+    """
+    cur.execute(
+        """
+        UPDATE ingest_jobs
+           SET status = 'failed', error = 'interrupted: the server running it stopped', finished_at = now()
+         WHERE status IN ('queued', 'running')
+           AND (heartbeat_at IS NULL OR heartbeat_at < now() - %s * interval '1 second' OR owner = %s)
+        """,
+        (3 * interval, restarted),
+    )
+    if cur.rowcount:
+        log.warning(f"⚠️  Marked {cur.rowcount} abandoned jobs failed")
+    return cur.rowcount
+
+
+def ensure_schema():
+    with db.get_cursor(commit=True) as cur:
+        cur.execute(SCHEMA_SQL)
+        # other processes' live jobs keep their heartbeat; only lost ones are failed,
+        # and any under this process's name (a container restarted with the same pid)
+        fail_abandoned(cur, heartbeat_seconds(), restarted=owner())
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    if _memory is not None:
+        with _memory_lock:
+            record = _memory.get(job_id)
+            return dict(record) if record else None
+    with db.get_cursor() as cur:
+        cur.execute(
+            """
+            SELECT id, kind, source, status, pages_extracted, chunks_embedded, rows_written,
+                   params, result, error, created_at, started_at, finished_at
+              FROM ingest_jobs
+             WHERE id = %s
+            """,
+            (job_id,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            return None
+        columns = [d[0] for d in cur.description]
+    return dict(zip(columns, row))
+
+
+job_queue = JobQueue()
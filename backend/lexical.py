@@ -0,0 +1,105 @@
+"""
+Lexical (full-text) retrieval and reciprocal rank fusion with vector search.
+
+`documents.full_text_tsv` indexes every chunk with the "simple" text search
+config (no stemming, no stop words), so exact tokens such as course codes,
+paragraph numbers or names match literally. A question becomes an OR query
+over its terms, minus the stop words of LEXICAL_STOPWORD_CONFIGS, ranked with
+ts_rank normalized by chunk length.
+
+Ranking costs time per matching chunk, and a question with one common word
+matches most of the corpus, so at most LEXICAL_CANDIDATES matches are ranked
+(ts_rank; ts_rank_cd was ~4x slower per row), and the cosine distance (which
+reads the stored embedding) is only computed for the k rows returned.
+
+Hybrid retrieval runs the lexical and the vector query side by side, each
+fetching HYBRID_CANDIDATES x k rows, and fuses the two rankings with RRF:
+score(row) = sum over rankings of 1 / (RRF_K + rank). It costs the database
+about twice the work of a vector search, so it is opt-in: per request with
+`hybrid`, or for every request with RETRIEVAL_MODE=hybrid.
+
+    RETRIEVAL_MODE            "vector" (default) or "hybrid"
+    HYBRID_CANDIDATES         candidates per ranking, as a multiple of k  (default 4)
+    LEXICAL_CANDIDATES        matching chunks ranked at most              (default 1000)
+    RRF_K                     rank smoothing constant                     (default 60)
+    LEXICAL_STOPWORD_CONFIGS  text search configs whose stop words are ignored
+                              in questions (default "english,german")
+"""
+import os
+from typing import Iterable, Optional
+
+from filters import FilterSet
+
+
+def hybrid_default() -> bool:
+    return os.getenv("RETRIEVAL_MODE", "vector").lower() == "hybrid"
+
+
+def candidate_count(k: int) -> int:
+    return max(k, k * int(os.getenv("HYBRID_CANDIDATES", "4")))
+
+
+def lexical_candidates() -> int:
+    return int(os.getenv("LEXICAL_CANDIDATES", "1000"))
+
+
+def _stopword_configs() -> list[str]:
+    return [c.strip() for c in os.getenv("LEXICAL_STOPWORD_CONFIGS", "english,german").split(",") if c.strip()]
+
+
+def lexical_query(
+    query: str,
+    q_emb: list[float],
+    fs: FilterSet,
+    k: int,
+    columns: tuple[str, ...],
+) -> tuple[str, list]:
+    """
+    (sql, params) for the top-k chunks matching `query`'s terms under `fs`.
+    Rows are `columns` + cosine distance to `q_emb`, like filters.vector_search.
+    """
+    configs = _stopword_configs()
+    # a term is kept unless one of the configs drops it as a stop word
+    keep = " AND ".join("to_tsvector(%s::regconfig, term) <> ''::tsvector" for _ in configs) or "TRUE"
+    where_sql, params = fs.where("AND")
+    cols = ", ".join(f"d.{c}" for c in columns)
+    sql = f"""
+        WITH q AS (
+            SELECT to_tsquery('simple', string_agg(quote_literal(term), ' | ')) AS query
+              FROM unnest(tsvector_to_array(to_tsvector('simple', %s))) AS term
+             WHERE {keep}
+        ),
+        candidates AS (
+            SELECT d.id, d.full_text_tsv
+              FROM documents d, q
+             WHERE d.full_text_tsv @@ q.query
+               {where_sql}
+             LIMIT %s
+        ),
+        top AS (
+            SELECT c.id, ts_rank(c.full_text_tsv, q.query, 1) AS rank
+              FROM candidates c, q
+             ORDER BY rank DESC
+             LIMIT %s
+        )
+        SELECT {cols}, d.content_embedding <=> %s::vector AS distance
+          FROM top JOIN documents d ON d.id = top.id
+         ORDER BY top.rank DESC
+    """
+    return sql, [query, *configs, *params, max(k, lexical_candidates()), k, q_emb]
+
+
+def rrf_fuse(rankings: Iterable[list[tuple]], k: int, rrf_k: Optional[int] = None) -> list[tuple]:
+    """
+    Fuse rankings of rows whose first column is a row id; returns the top-k
+    rows without the id, best first.
+    """
+    rrf_k = rrf_k if rrf_k is not None else int(os.getenv("RRF_K", "60"))
+    scores: dict = {}
+    rows: dict = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row[0]] = scores.get(row[0], 0.0) + 1.0 / (rrf_k + rank)
+            rows.setdefault(row[0], row[1:])
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [rows[row_id] for row_id in best]
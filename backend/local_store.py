@@ -0,0 +1,428 @@
+"""
+In-process vector store for offline / edge deployments and tests.
+
+With VECTOR_BACKEND=local, chunks are kept in a directory instead of the
+`documents` table:
+
+    vectors.f32   float32 matrix, one L2-normalized row per chunk, memory-mapped
+    rows.jsonl    metadata sidecar: one JSON object per row, in matrix order,
+                  read lazily by byte offset
+    deleted.u8    tombstone flag per row
+    hnsw.bin      optional hnswlib graph over the rows (LOCAL_STORE_HNSW=1)
+
+Appends grow the files in place; deletes only set tombstones, and `compact()`
+rewrites the store without them. A search builds a row mask from the filters
+(each field is dictionary-encoded, so a filter is evaluated once per distinct
+value) and takes the top-k of one matrix-vector product over the rows that
+pass. With the HNSW graph, broad searches walk the graph with the mask as a
+filter, and selective ones still rank their few rows exactly.
+
+    VECTOR_BACKEND        "postgres" (default) or "local"
+    LOCAL_STORE_PATH      directory of the store                  (default ./vector_store)
+    LOCAL_STORE_HNSW      "1" to keep an HNSW graph (needs hnswlib)
+    LOCAL_STORE_HNSW_EF   graph search breadth                     (default 64)
+    LOCAL_STORE_EXACT_MAX rank exactly when at most this many rows pass the filter
+                          (default FILTER_PREFILTER_MAX_ROWS, 20000)
+"""
+import json
+import logging
+import os
+import threading
+from datetime import date
+from typing import Iterable, Optional
+
+import numpy as np
+
+from filters import FILTER_FIELDS, FilterSet, key_matches, normalize
+
+try:  # optional: approximate search for large stores
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+log = logging.getLogger(__name__)
+
+CODED_FIELDS = (*FILTER_FIELDS, "filename", "embedding_model")
+
+
+def backend() -> str:
+    return os.getenv("VECTOR_BACKEND", "postgres").lower()
+
+
+class _Column:
+    """Growable int32 array of dictionary codes, plus the values behind them."""
+
+    def __init__(self):
+        self.codes   = np.empty(1024, dtype=np.int32)
+        self.keys:   list[str] = []     # normalized value per code
+        self.labels: list[str] = []     # first display value seen per code
+        self._index: dict[str, int] = {}
+
+    def code(self, value: Optional[str], key: Optional[str] = None) -> int:
+        value = value if value is not None else ""
+        key = key if key is not None else value
+        code = self._index.get(key)
+        if code is None:
+            code = self._index[key] = len(self.keys)
+            self.keys.append(key)
+            self.labels.append(value)
+        return code
+
+    def lookup(self, key: str) -> Optional[int]:
+        return self._index.get(key)
+
+    def set(self, row: int, code: int):
+        if row >= len(self.codes):
+            # a fresh array, so searches holding the old one keep a consistent snapshot
+            grown = np.empty(max(row + 1, 2 * len(self.codes)), dtype=np.int32)
+            grown[:len(self.codes)] = self.codes
+            self.codes = grown
+        self.codes[row] = code
+
+
+class LocalVectorStore:
+    def __init__(self, path: str, hnsw: Optional[bool] = None):
+        self.path      = path
+        self.use_hnsw  = (os.getenv("LOCAL_STORE_HNSW", "0") == "1") if hnsw is None else hnsw
+        self.dim: Optional[int] = None
+        self.count     = 0                 # rows, deleted ones included
+        self.vectors   = None              # read-only memmap of the first `count` rows
+        self.deleted   = np.zeros(1024, dtype=np.uint8)
+        self.offsets   = np.zeros(1024, dtype=np.int64)
+        self.columns   = {f: _Column() for f in CODED_FIELDS}
+        self.graph     = None
+        self._lock     = threading.RLock()
+        self._load()
+
+    # ── Files ──
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        rows_path = self._file("rows.jsonl")
+        offsets, rows, end = [], [], 0
+        if os.path.exists(rows_path):
+            with open(rows_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break   # torn write: the row never finished
+                    offsets.append(end)
+                    rows.append(json.loads(line))
+                    end += len(line)
+
+        meta_path, vectors_path = self._file("meta.json"), self._file("vectors.f32")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        n_vectors = os.path.getsize(vectors_path) // (4 * self.dim) if self.dim and os.path.exists(vectors_path) else 0
+        n = min(len(rows), n_vectors)
+
+        # drop whatever an interrupted append left beyond the last complete row
+        if os.path.exists(rows_path):
+            with open(rows_path, "ab") as f:
+                f.truncate(offsets[n] if n < len(offsets) else end)
+        if self.dim and os.path.exists(vectors_path):
+            with open(vectors_path, "ab") as f:
+                f.truncate(n * self.dim * 4)
+
+        for i, row in enumerate(rows[:n]):
+            self._index_row(i, row)
+        self.offsets = _grow(self.offsets, n)
+        self.offsets[:n] = offsets[:n]
+        self.deleted = _grow(self.deleted, n)
+        deleted_path = self._file("deleted.u8")
+        if os.path.exists(deleted_path):
+            flags = np.fromfile(deleted_path, dtype=np.uint8)[:n]
+            self.deleted[:len(flags)] = flags
+        if os.path.exists(rows_path):
+            self.deleted[:n].tofile(deleted_path)   # exactly one flag per row from here on
+        self.count = n
+        self._remap()
+        if self.use_hnsw and self.dim:
+            self._open_graph()
+
+    def _remap(self):
+        if self.dim and self.count:
+            self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r",
+                                     shape=(self.count, self.dim))
+        else:
+            self.vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+
+    def _index_row(self, i: int, row: dict):
+        for field in CODED_FIELDS:
+            value = row.get(field)
+            key = normalize(value) if field in FILTER_FIELDS and value is not None else value
+            column = self.columns[field]
+            column.set(i, column.code(value, key))
+
+    # ── HNSW graph ──
+    def _open_graph(self):
+        if hnswlib is None:
+            log.warning("⚠️  LOCAL_STORE_HNSW needs hnswlib; searching exactly")
+            self.use_hnsw = False
+            return
+        graph = hnswlib.Index(space="cosine", dim=self.dim)
+        graph_path = self._file("hnsw.bin")
+        capacity = max(1024, 2 * self.count)
+        if os.path.exists(graph_path):
+            graph.load_index(graph_path, max_elements=capacity)
+        else:
+            graph.init_index(max_elements=capacity, ef_construction=200, M=16)
+        stored = graph.get_current_count()
+        if stored > self.count:
+            # the graph is newer than the rows (interrupted compaction): rebuild it
+            graph = hnswlib.Index(space="cosine", dim=self.dim)
+            graph.init_index(max_elements=capacity, ef_construction=200, M=16)
+            stored = 0
+        if stored < self.count:
+            graph.add_items(np.asarray(self.vectors[stored:]), np.arange(stored, self.count))
+        # deletes after the graph was last saved are only in deleted.u8
+        for i in np.flatnonzero(self.deleted[:self.count]):
+            try:
+                graph.mark_deleted(int(i))
+            except RuntimeError:
+                pass   # already marked in the saved graph
+        graph.set_ef(int(os.getenv("LOCAL_STORE_HNSW_EF", "64")))
+        self.graph = graph
+
+    # ── Writes ──
+    def append(self, rows: Iterable[dict]) -> int:
+        """
+        Add chunk rows (the dicts bulk_insert.chunk_rows yields); vectors are
+        normalized on the way in. Returns the number of rows added.
+        """
+        written = 0
+        batch: list[dict] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= 512:
+                written += self._append_batch(batch)
+                batch = []
+        if batch:
+            written += self._append_batch(batch)
+        return written
+
+    def _append_batch(self, batch: list[dict]) -> int:
+        vectors = np.asarray([r["content_embedding"] for r in batch], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+        with self._lock:
+            if self.dim is None:
+                os.makedirs(self.path, exist_ok=True)   # a store that was never written leaves no files
+                self.dim = vectors.shape[1]
+                with open(self._file("meta.json"), "w") as f:
+                    json.dump({"dim": self.dim}, f)
+                if self.use_hnsw:
+                    self._open_graph()
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Store holds {self.dim}-dim vectors, got {vectors.shape[1]}")
+
+            start = self.count
+            lines = [json.dumps(_sidecar(r), default=_json_default).encode("utf-8") + b"\n" for r in batch]
+            # vectors first: on restart, rows without a complete vector are dropped
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._file("rows.jsonl"), "ab") as f:
+                offset = f.tell()
+                f.write(b"".join(lines))
+            with open(self._file("deleted.u8"), "ab") as f:
+                f.write(bytes(len(batch)))
+
+            end = start + len(batch)
+            self.offsets = _grow(self.offsets, end)
+            self.deleted = _grow(self.deleted, end)
+            for i, (row, line) in enumerate(zip(batch, lines), start=start):
+                self.offsets[i] = offset
+                offset += len(line)
+                self._index_row(i, row)
+            self.count = end
+            self._remap()
+            if self.graph is not None:
+                if end > self.graph.get_max_elements():
+                    self.graph.resize_index(max(end, 2 * self.graph.get_max_elements()))
+                self.graph.add_items(vectors, np.arange(start, end))
+        return len(batch)
+
+    def delete(self, filename: str, before: Optional[int] = None) -> int:
+        """Tombstone the live rows of `filename` (only those below row id `before`, if given); returns how many."""
+        with self._lock:
+            code = self.columns["filename"].lookup(filename)
+            if code is None:
+                return 0
+            n = self.count if before is None else min(before, self.count)
+            rows = np.flatnonzero((self.columns["filename"].codes[:n] == code) & (self.deleted[:n] == 0))
+            if not len(rows):
+                return 0
+            self.deleted[rows] = 1
+            with open(self._file("deleted.u8"), "r+b") as f:
+                for i in rows:
+                    f.seek(int(i))
+                    f.write(b"\x01")
+            if self.graph is not None:
+                for i in rows:
+                    self.graph.mark_deleted(int(i))
+            return len(rows)
+
+    def compact(self) -> int:
+        """Rewrite the store without deleted rows; returns how many were dropped."""
+        with self._lock:
+            n = self.count
+            live = np.flatnonzero(self.deleted[:n] == 0)
+            dropped = n - len(live)
+            if not dropped:
+                return 0
+            reader = open(self._file("rows.jsonl"), "rb")
+            with open(self._file("vectors.f32.tmp"), "wb") as vf, open(self._file("rows.jsonl.tmp"), "wb") as rf:
+                for start in range(0, len(live), 4096):
+                    ids = live[start:start + 4096]
+                    vf.write(np.asarray(self.vectors[ids]).tobytes())
+                    for i in ids:
+                        reader.seek(int(self.offsets[i]))
+                        rf.write(reader.readline())
+            reader.close()
+            for name in ("vectors.f32", "rows.jsonl"):
+                os.replace(self._file(name + ".tmp"), self._file(name))
+            for name in ("deleted.u8", "hnsw.bin"):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            # searches that started earlier keep their own file handle and memmap
+            self.count, self.graph = 0, None
+            self.columns = {f: _Column() for f in CODED_FIELDS}
+            self.deleted = np.zeros(1024, dtype=np.uint8)
+            self.offsets = np.zeros(1024, dtype=np.int64)
+            self._load()
+            return dropped
+
+    def save(self):
+        with self._lock:
+            if self.graph is not None:
+                self.graph.save_index(self._file("hnsw.bin"))
+
+    # ── Reads ──
+    def _snapshot(self, rows: bool = False):
+        """Consistent view of the store; with `rows`, also a handle on the sidecar it indexes."""
+        with self._lock:
+            reader = open(self._file("rows.jsonl"), "rb") if rows and self.count else None
+            return (self.count, self.vectors, self.deleted, {f: c.codes for f, c in self.columns.items()},
+                    self.offsets, self.graph, reader)
+
+    def _mask(self, fs: FilterSet, n: int, deleted, codes) -> np.ndarray:
+        mask = deleted[:n] == 0
+        wanted = {field: (lambda key, terms=terms: key_matches(terms, key)) for field, terms in fs.terms.items()}
+        if fs.filenames:
+            names = set(fs.filenames)
+            wanted["filename"] = lambda key: key in names
+        if fs.embedding_model:
+            wanted["embedding_model"] = lambda key: key == fs.embedding_model
+        for field, accept in wanted.items():
+            ok = [code for code, key in enumerate(self.columns[field].keys) if key is not None and accept(key)]
+            mask &= np.isin(codes[field][:n], ok)
+        return mask
+
+    def search(
+        self,
+        q_emb: list[float],
+        fs: FilterSet,
+        k: int,
+        columns: tuple[str, ...] = ("filename", "full_text"),
+        ef_search: Optional[int] = None,
+        exact: bool = False,
+        **_,
+    ) -> list[tuple]:
+        """Top-k rows by cosine distance under `fs`; each row is `columns` + distance, like filters.vector_search."""
+        n, vectors, deleted, codes, offsets, graph, reader = self._snapshot(rows=True)
+        if reader is None:
+            return []
+        with reader:
+            ranked = self._rank(q_emb, fs, k, ef_search, exact, n, vectors, deleted, codes, graph)
+            out = []
+            for i, dist in ranked:
+                reader.seek(int(offsets[i]))
+                row = {**json.loads(reader.readline()), "id": i}
+                out.append(tuple(row.get(c) for c in columns) + (dist,))
+        return out
+
+    def _rank(self, q_emb, fs, k, ef_search, exact, n, vectors, deleted, codes, graph) -> list[tuple[int, float]]:
+        if not n:
+            return []
+        q = np.asarray(q_emb, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        mask = self._mask(fs, n, deleted, codes)
+        passing = int(mask.sum())
+        if not passing:
+            return []
+
+        exact_max = int(os.getenv("LOCAL_STORE_EXACT_MAX", os.getenv("FILTER_PREFILTER_MAX_ROWS", "20000")))
+        if graph is not None and not exact and passing > exact_max:
+            graph.set_ef(max(k, ef_search or int(os.getenv("LOCAL_STORE_HNSW_EF", "64"))))
+            filtered = None if passing == n else (lambda i: bool(mask[i]))
+            ids, dists = graph.knn_query(q, k=min(k, passing), filter=filtered)
+            return [(int(i), float(d)) for i, d in zip(ids[0], dists[0])]
+        if passing > n // 2:
+            scores = np.asarray(vectors[:n] @ q)
+            scores[~mask] = -np.inf
+            return _top_k(np.arange(n), scores, k, passing)
+        ids = np.flatnonzero(mask)
+        return _top_k(ids, np.asarray(vectors[ids] @ q), k, passing)
+
+    def filenames(self, fs: FilterSet) -> list[str]:
+        """Files with live rows under `fs`, most recently added first."""
+        n, _, deleted, codes, _, _, _ = self._snapshot()
+        ids = np.flatnonzero(self._mask(fs, n, deleted, codes))[::-1]
+        files, first = np.unique(codes["filename"][ids], return_index=True)
+        labels = self.columns["filename"].labels
+        return [labels[files[j]] for j in np.argsort(-ids[first])]
+
+    def field_values(self, field: str) -> list[str]:
+        """One display value per normalized key of `field` among live rows, sorted."""
+        n, _, deleted, codes, _, _, _ = self._snapshot()
+        live = np.unique(codes[field][:n][deleted[:n] == 0])
+        return sorted(self.columns[field].labels[c] for c in live)
+
+    def stats(self) -> dict:
+        n, _, deleted, codes, _, graph, _ = self._snapshot()
+        live = deleted[:n] == 0
+        return {
+            "backend": "local",
+            "path":    self.path,
+            "dim":     self.dim,
+            "rows":    int(live.sum()),
+            "deleted": int(n - live.sum()),
+            "files":   int(np.unique(codes["filename"][:n][live]).size),
+            "hnsw":    graph is not None,
+        }
+
+    def close(self):
+        self.save()
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, k: int, passing: int) -> list[tuple[int, float]]:
+    k = min(k, passing)
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    top = top[np.argsort(-scores[top])]
+    return [(int(ids[i]), 1.0 - float(scores[i])) for i in top]
+
+
+def _sidecar(row: dict) -> dict:
+    return {k: v for k, v in row.items() if k != "content_embedding"}
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def open_store() -> Optional[LocalVectorStore]:
+    """The local store when VECTOR_BACKEND=local, else None (Postgres serves retrieval)."""
+    if backend() != "local":
+        return None
+    return LocalVectorStore(os.getenv("LOCAL_STORE_PATH", "vector_store"))
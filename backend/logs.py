@@ -0,0 +1,83 @@
+"""
+Logging setup: one handler on the root logger, plain text or one JSON object
+per line, with the id of the request being served on every record (set by
+the request middleware in app.py and carried into ingestion jobs by jobs.py).
+
+Fields passed with `extra=` are kept: as keys of the JSON object, or appended
+as key=value in text mode.
+
+    log.info("Ingest finished", extra={"job_id": job.id, "rows": 120})
+
+    LOG_LEVEL   default INFO
+    LOG_FORMAT  "text" (default) or "json"
+"""
+import json
+import logging
+import os
+import re
+import uuid
+from contextvars import ContextVar
+
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+# attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+def new_request_id(incoming: str = None) -> str:
+    """The caller's X-Request-ID when it looks sane, else a fresh one."""
+    if incoming and _VALID_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex[:16]
+
+
+def _extras(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _STANDARD}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = _extras(record)
+        if extras:
+            fields = " ".join(f"{k}={v}" for k, v in extras.items())
+            head, sep, tail = line.partition("\n")   # keep tracebacks below the fields
+            line = f"{head} {fields}{sep}{tail}"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts":         self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level":      record.levelname,
+            "logger":     record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message":    record.getMessage(),
+            **_extras(record),
+        }
+        if record.exc_info:
+            out["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+def setup():
+    """Install the handler on the root logger (once; uvicorn's own loggers are left alone)."""
+    root = logging.getLogger()
+    if any(isinstance(h.formatter, (TextFormatter, JsonFormatter)) for h in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(JsonFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter())
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
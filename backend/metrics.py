@@ -0,0 +1,152 @@
+"""
+Process-local counters, gauges and histograms, served by `/metrics` in the
+Prometheus text format.
+
+Metrics are module-level objects; labels are passed as keyword arguments:
+
+    STAGE_SECONDS.observe(0.042, stage="embed")
+    HTTP_REQUESTS.inc(method="GET", route="/search/", status="200")
+
+With several uvicorn workers each process has its own values, so scrape each
+worker (or run one per container) rather than relying on a shared total.
+"""
+import math
+import threading
+from typing import Iterable
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: list["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name   = name
+        self.help   = help
+        self.labels = labels
+        self._values: dict[tuple, object] = {}
+        self._lock  = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {sorted(labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # per-bucket counts (made cumulative when rendered), sum, count
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self, key: tuple, value) -> list[str]:
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── The service's metrics ──
+HTTP_REQUESTS = Counter(
+    "smartfusion_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_SECONDS = Histogram(
+    "smartfusion_http_request_seconds", "HTTP request latency", ("method", "route"))
+HTTP_IN_PROGRESS = Gauge(
+    "smartfusion_http_requests_in_progress", "HTTP requests being served")
+STAGE_SECONDS = Histogram(
+    "smartfusion_stage_seconds", "Time spent per pipeline stage (see stages.py)", ("stage",))
+CACHE_LOOKUPS = Counter(
+    "smartfusion_cache_lookups_total", "Embedding / answer cache lookups", ("cache", "result"))
+INGEST_JOBS = Counter(
+    "smartfusion_ingest_jobs_total", "Finished ingestion jobs", ("kind", "status"))
+INGEST_JOB_SECONDS = Histogram(
+    "smartfusion_ingest_job_seconds", "Ingestion job run time", ("kind",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0))
+INGEST_ROWS = Counter(
+    "smartfusion_ingest_rows_total", "Chunk rows written by ingestion")
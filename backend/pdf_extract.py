@@ -0,0 +1,91 @@
+"""
+Page-level PDF text extraction, parallelised across a process pool.
+
+The page range is split into fixed-size tasks; each worker process opens its
+own fitz document and returns the text of its pages. Results are yielded in
+page order while only a bounded window of tasks is in flight, so memory stays
+proportional to the window rather than the whole document.
+
+    PDF_EXTRACT_WORKERS     worker processes               (default: CPU count)
+    PDF_PAGES_PER_TASK      pages handed to a worker at once (default 16)
+    PDF_PARALLEL_MIN_PAGES  smaller documents are extracted in-process (default 32)
+"""
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+
+import fitz  # PyMuPDF
+
+
+def page_text(page) -> str:
+    # Use block layout to preserve structure
+    blocks = page.get_text("blocks")  # (x0, y0, x1, y1, "text", block_no, block_type)
+    blocks = sorted(blocks, key=lambda b: (b[1], b[0]))  # sort top-to-bottom, then left-to-right
+    return "\n".join(text for text in (b[4].strip() for b in blocks) if text)
+
+
+def _extract_range(path: str, start: int, end: int) -> list[str]:
+    with fitz.open(path) as doc:
+        return [page_text(doc[i]) for i in range(start, end)]
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_workers = 1
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _workers
+    with _executor_lock:
+        if _executor is None:
+            _workers = int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+            # spawn, not fork: the API process runs worker threads and holds DB sockets
+            _executor = ProcessPoolExecutor(
+                max_workers=_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+def page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def iter_pages(path: str, pages_per_task: Optional[int] = None) -> Iterator[tuple[int, str]]:
+    """Yield `(page_number, text)` for every page of `path` in order (page numbers start at 1)."""
+    total = page_count(path)
+    per_task = pages_per_task or int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+    if total < int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32")):
+        with fitz.open(path) as doc:
+            for i, page in enumerate(doc):
+                yield i + 1, page_text(page)
+        return
+
+    executor = _get_executor()
+    window   = 2 * _workers
+    ranges   = deque((s, min(s + per_task, total)) for s in range(0, total, per_task))
+    pending  = deque()
+    try:
+        while ranges or pending:
+            while ranges and len(pending) < window:
+                start, end = ranges.popleft()
+                pending.append((start, executor.submit(_extract_range, path, start, end)))
+            start, future = pending.popleft()
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+    finally:
+        for _, future in pending:
+            future.cancel()
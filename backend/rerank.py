@@ -0,0 +1,154 @@
+"""
+Optional cross-encoder reranking of retrieved chunks.
+
+Retrieval over-fetches RERANK_CANDIDATES rows, and a local sentence-transformers
+CrossEncoder scores (question, chunk) pairs in batches on CPU. The stage is
+bounded by RERANK_BUDGET_MS: it scores as many of the best first-stage
+candidates as the budget allows (sized from the measured per-pair cost and
+re-checked between batches), reorders those, and leaves the rest in
+first-stage order behind them. While the model is still loading, or if it
+fails, results keep the first-stage order.
+
+    RERANK                "1" to rerank by default (requests can override)
+    RERANK_MODEL          cross-encoder model     (default cross-encoder/ms-marco-MiniLM-L-6-v2)
+    RERANK_CANDIDATES     rows fetched for reranking           (default 30)
+    RERANK_BUDGET_MS      time allowed per request, queueing included (default 300)
+    RERANK_BATCH_SIZE     pairs per forward pass               (default 16)
+    RERANK_MAX_LENGTH     max tokens per (question, chunk) pair (default 256)
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def rerank_default() -> bool:
+    return os.getenv("RERANK", "0") == "1"
+
+
+def candidate_count(k: int) -> int:
+    return max(k, int(os.getenv("RERANK_CANDIDATES", "30")))
+
+
+class Reranker:
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        max_length: Optional[int] = None,
+    ):
+        self.model_name = model_name or os.getenv("RERANK_MODEL", DEFAULT_MODEL)
+        self.budget_ms  = budget_ms or float(os.getenv("RERANK_BUDGET_MS", "300"))
+        self.batch_size = batch_size or int(os.getenv("RERANK_BATCH_SIZE", "16"))
+        self.max_length = max_length or int(os.getenv("RERANK_MAX_LENGTH", "256"))
+        self.model = None
+        self.error: Optional[str] = None
+        self._load_lock = threading.Lock()
+        # one forward pass at a time: concurrent passes just split the same cores
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._pair_ms = None   # moving average of scoring cost per pair
+        self.stats = {"requests": 0, "pairs_scored": 0, "degraded": 0}
+
+    # ── Model ──
+    def load(self):
+        with self._load_lock:
+            if self.model is not None or self.error is not None:
+                return
+            try:
+                from sentence_transformers import CrossEncoder
+                self.model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+                self._score(["warm up"], ["warm up"])
+                log.info(f"✔️  Rerank model ready: {self.model_name}")
+            except Exception as e:
+                self.error = str(e)
+                log.warning(f"⚠️  Rerank model unavailable, keeping retrieval order: {e}")
+
+    def load_in_background(self):
+        threading.Thread(target=self.load, name="rerank-load", daemon=True).start()
+
+    def _score(self, query_texts: list[str], texts: list[str]) -> list[float]:
+        started = time.perf_counter()
+        scores = self.model.predict(list(zip(query_texts, texts)), batch_size=self.batch_size,
+                                    show_progress_bar=False)
+        pair_ms = (time.perf_counter() - started) * 1000 / len(texts)
+        self._pair_ms = pair_ms if self._pair_ms is None else 0.8 * self._pair_ms + 0.2 * pair_ms
+        return [float(s) for s in scores]
+
+    # ── Reranking ──
+    def _rerank(self, query: str, texts: list[str], deadline: float) -> tuple[list[int], int]:
+        """Order of `texts` indices after reranking, and how many were scored."""
+        if self.model is None:
+            return list(range(len(texts))), 0
+        affordable = len(texts)
+        if self._pair_ms:
+            remaining_ms = (deadline - time.monotonic()) * 1000
+            affordable = max(0, min(len(texts), int(remaining_ms / self._pair_ms)))
+
+        scores: list[float] = []
+        while len(scores) < affordable and time.monotonic() < deadline:
+            batch = texts[len(scores):min(affordable, len(scores) + self.batch_size)]
+            scores.extend(self._score([query] * len(batch), batch))
+
+        scored = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        return scored + list(range(len(scores), len(texts))), len(scores)
+
+    async def rerank(self, query: str, rows: list[tuple], text_index: int, k: int) -> list[tuple]:
+        """Top-k of `rows` (best first-stage first) by cross-encoder score, within the budget."""
+        if len(rows) <= 1:
+            return rows[:k]
+        deadline = time.monotonic() + self.budget_ms / 1000
+        texts = [row[text_index] for row in rows]
+        loop = asyncio.get_running_loop()
+        order, scored = await loop.run_in_executor(self._executor, self._rerank, query, texts, deadline)
+
+        self.stats["requests"] += 1
+        self.stats["pairs_scored"] += scored
+        if scored < len(rows):
+            self.stats["degraded"] += 1
+        return [rows[i] for i in order[:k]]
+
+    def info(self) -> dict:
+        return {
+            "model":     self.model_name,
+            "ready":     self.model is not None,
+            "error":     self.error,
+            "budget_ms": self.budget_ms,
+            "pair_ms":   round(self._pair_ms, 3) if self._pair_ms else None,
+            **self.stats,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_reranker: Optional[Reranker] = None
+
+
+def get_reranker() -> Reranker:
+    """The shared reranker; the model loads in the background on first use."""
+    global _reranker
+    if _reranker is None:
+        _reranker = Reranker()
+        _reranker.load_in_background()
+    return _reranker
+
+
+def status() -> dict:
+    if _reranker is None:
+        return {"model": os.getenv("RERANK_MODEL", DEFAULT_MODEL), "ready": False, "loaded": False}
+    return {"loaded": True, **_reranker.info()}
+
+
+def close_reranker():
+    global _reranker
+    if _reranker is not None:
+        _reranker.close()
+        _reranker = None
@@ -1,18 +1,22 @@
 import os
 from dotenv import load_dotenv
-# from sentence_transformers import SentenceTransformer  # Stubbed out to avoid unauthorized downloads
+import openai
 import psycopg2
-from psycopg2.extras import Json
 
-print("▶️ retrieve.py starting (stubbed embeddings)...")
+from embeddings import get_embedder
+from filters import FilterSet, vector_search
+
+print("▶️ retrieve.py starting...")
 
 # Load environment variables for DB connection
 load_dotenv()
 
-# ── Embedding stub ──
+# ── Embeddings: the same provider and model the documents were ingested with ──
+openai.api_key = os.getenv("OPENAI_API_KEY")
+embedder = get_embedder()
+
 def get_embedding(text):
-    """Return a 1536-dim zero vector so retrieval can proceed without external models."""
-    return [0.0] * 1536
+    return embedder.embed([text])[0]
 
 # ── Database Connection ──
 conn = psycopg2.connect(
@@ -22,55 +26,26 @@ conn = psycopg2.connect(
     host=os.getenv("DB_HOST"),
     port=os.getenv("DB_PORT")
 )
-cur = conn.cursor()
 
 # ── Retrieval Function with Metadata Filters ──
 def retrieve(query, k=5, country=None, job_area=None, source_type=None, filenames: list[str] = None):
     """
-    Perform semantic search with optional metadata filters.
+    Perform semantic search with optional metadata filters, matched like the
+    API's (see filters.py: "Germany" exact, "Ger*" prefix, "*man*" substring).
     Returns list of (filename, snippet).
     """
-    # 1) Compute embedding
     q_emb = get_embedding(query)
-
-    # 2) Build dynamic WHERE clause
-    filters = []
-    params = []
-    if country:
-        filters.append("country ILIKE %s");     params.append(f"%{country}%")
-    if job_area:
-        filters.append("job_area ILIKE %s");    params.append(f"%{job_area}%")
-    if source_type:
-        filters.append("source_type ILIKE %s"); params.append(f"%{source_type}%")
-    if filenames:
-        filters.append("filename = ANY(%s)");   params.append(filenames)
-
-
-    where_sql = ""
-    if filters:
-        where_sql = "WHERE " + " AND ".join(filters)
-
-    # 3) Final SQL with vector-ordering + optional filters
-    sql = f"""
-        SELECT filename,
-               substring(full_text, 1, 150) AS snippet
-        FROM documents
-        {where_sql}
-        ORDER BY content_embedding <=> %s::vector
-        LIMIT %s
-    """
-
-    # 4) Parameter order: [*filter_values, q_emb, k]
-    params.append(q_emb)
-    params.append(k)
-
-    cur.execute(sql, params)
-    return cur.fetchall()
+    fs = FilterSet(country=country, job_area=job_area, source_type=source_type,
+                   filenames=filenames, embedding_model=embedder.model)
+    # one transaction per search, so its index settings end with it
+    with conn, conn.cursor() as cur:
+        rows = vector_search(cur, q_emb, fs, k)
+    return [(fname, text[:150]) for fname, text, _distance in rows]
 
 # ── CLI Interface ──
 if __name__ == "__main__":
     q = input("Enter your question: ")
-    country     = input("Country filter (leave blank for none): ").strip() or None
+    country     = input("Country filter (Ger* for a prefix, leave blank for none): ").strip() or None
     job_area    = input("Job area filter (leave blank for none): ").strip() or None
     source_type = input("Source type filter (PDF/HTML, leave blank for none): ").strip() or None
     k_input     = input("Number of results [5]: ").strip()
@@ -80,6 +55,5 @@ if __name__ == "__main__":
     for fname, snippet in results:
         print(f"\n📄 {fname}\n— {snippet}…")
 
-    cur.close()
     conn.close()
 
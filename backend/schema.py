@@ -0,0 +1,158 @@
+"""
+Schema management for the `documents` table.
+
+The base table predates this module; `ensure_schema()` adds the columns and
+indexes the ingestion pipeline relies on, plus one-time data migrations
+recorded in `schema_migrations`, and is safe to run on every startup or from
+the CLI scripts.
+
+Missing columns are added in a single ALTER TABLE: each STORED generated
+column rewrites the table under an exclusive lock, so adding them together
+costs one rewrite instead of one per column. Indexes are then built with
+CREATE INDEX CONCURRENTLY outside any transaction, so a first deploy against a
+large table doesn't block ingestion or retrieval while they build. Startups
+serialize on an advisory lock (see `migration_lock`).
+"""
+import time
+from contextlib import contextmanager
+
+import db
+
+TABLE = "documents"
+
+# (name, definition) for each column, added together when missing
+DOCUMENTS_COLUMNS = [
+    ("metadata", "JSONB"),
+    # sha256 of the chunk text / of the source document, for deduplication
+    ("content_hash", "TEXT"),
+    ("document_hash", "TEXT"),
+]
+# (name, definition) for each index, built concurrently when missing
+DOCUMENTS_INDEXES = [
+    ("documents_filename_idx", "ON documents (filename)"),
+    ("documents_content_hash_idx", "ON documents (content_hash)"),
+]
+
+# full-text index for lexical retrieval (see lexical.py); the "simple" config
+# keeps course codes, paragraph numbers and names as-is, in any language
+DOCUMENTS_COLUMNS += [
+    ("full_text_tsv", "tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(full_text, ''))) STORED"),
+]
+DOCUMENTS_INDEXES += [
+    ("documents_full_text_tsv_idx", "ON documents USING gin (full_text_tsv)"),
+]
+
+# normalized filter keys (see filters.normalize), maintained by Postgres on every
+# write; text_pattern_ops serves both equality and prefix LIKE
+for _field in ("country", "job_area", "source_type"):
+    DOCUMENTS_COLUMNS.append(
+        (f"{_field}_key", f"TEXT GENERATED ALWAYS AS (lower(btrim(regexp_replace({_field}, '\\s+', ' ', 'g')))) STORED"))
+    DOCUMENTS_INDEXES.append((f"documents_{_field}_key_idx", f"ON documents ({_field}_key text_pattern_ops)"))
+
+# the model that produced each row's embedding (see embeddings.py); retrieval
+# only compares rows of the query's model. Rows from before this was recorded
+# were written by the API with OpenAI text-embedding-3-small (1536 dims); zero vectors
+# written by the former stubbed upload scripts stay unattributed and are never retrieved.
+DOCUMENTS_COLUMNS += [
+    ("embedding_model", "TEXT"),
+    ("embedding_dim", "INTEGER"),
+]
+DOCUMENTS_INDEXES += [
+    ("documents_embedding_model_idx", "ON documents (embedding_model)"),
+]
+
+# data migrations run once per database, recorded by name in schema_migrations;
+# unlike the statements above, running them again wouldn't be a no-op
+SCHEMA_MIGRATIONS_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    name        TEXT PRIMARY KEY,
+    applied_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+ONE_TIME_MIGRATIONS = [
+    ("documents_embedding_model_backfill",
+     "UPDATE documents SET embedding_model = 'text-embedding-3-small', embedding_dim = vector_dims(content_embedding) "
+     "WHERE embedding_model IS NULL AND content_embedding IS NOT NULL "
+     "AND vector_dims(content_embedding) = 1536 AND vector_norm(content_embedding) > 0"),
+]
+
+LOCK_POLL_SECONDS = 1.0
+
+
+@contextmanager
+def migration_lock(cur):
+    """
+    Hold the schema advisory lock on `cur`'s (autocommit) connection for the
+    block, so processes starting together migrate one at a time.
+
+    Waiters poll with pg_try_advisory_lock rather than block in
+    pg_advisory_lock: a blocked statement is an open transaction, which the
+    holder's CREATE INDEX CONCURRENTLY would wait on in turn.
+    """
+    while True:
+        cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (f"schema:{TABLE}",))
+        if cur.fetchone()[0]:
+            break
+        time.sleep(LOCK_POLL_SECONDS)
+    try:
+        yield
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (f"schema:{TABLE}",))
+
+
+def missing_columns(cur) -> list[tuple[str, str]]:
+    cur.execute("SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = %s", (TABLE,))
+    present = {name for name, in cur.fetchall()}
+    return [(name, definition) for name, definition in DOCUMENTS_COLUMNS if name not in present]
+
+
+def add_columns(cur):
+    missing = missing_columns(cur)
+    if missing:
+        cur.execute(f"ALTER TABLE {TABLE} " +
+                    ", ".join(f"ADD COLUMN IF NOT EXISTS {name} {definition}" for name, definition in missing))
+
+
+def apply_one_time_migrations(cur):
+    cur.execute(SCHEMA_MIGRATIONS_SQL)
+    for name, statement in ONE_TIME_MIGRATIONS:
+        # claiming the name first makes a concurrent run wait for this
+        # transaction and then find the migration done
+        cur.execute("INSERT INTO schema_migrations (name) VALUES (%s) ON CONFLICT DO NOTHING", (name,))
+        if cur.rowcount:
+            cur.execute(statement)
+
+
+def build_indexes(cur):
+    """Build missing indexes concurrently; `cur` must be in autocommit mode."""
+    cur.execute("SELECT i.relname, x.indisvalid FROM pg_index x "
+                "JOIN pg_class i ON i.oid = x.indexrelid "
+                "WHERE x.indrelid = %s::regclass", (TABLE,))
+    existing = dict(cur.fetchall())
+    for name, definition in DOCUMENTS_INDEXES:
+        if existing.get(name) is False:
+            # left invalid by an interrupted concurrent build; IF NOT EXISTS would keep it
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        elif name in existing:
+            continue
+        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+
+def ensure_schema():
+    with db.get_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur, migration_lock(cur):
+                cur.execute("BEGIN")
+                try:
+                    add_columns(cur)
+                    apply_one_time_migrations(cur)
+                except Exception:
+                    cur.execute("ROLLBACK")
+                    raise
+                cur.execute("COMMIT")
+                build_indexes(cur)
+        finally:
+            conn.autocommit = False
@@ -0,0 +1,107 @@
+"""
+Per-stage timings.
+
+Code paths wrap their expensive steps in `stage("embed")`, `stage("search")`,
+`stage("llm")`..., and pipelined generators in `timed("extract", ...)`. Each
+stage's own time (time spent in stages nested inside it is left out, so
+pipelined ingestion does not count a page's extraction under chunking too) is
+
+  * observed in the `smartfusion_stage_seconds` histogram served by /metrics, and
+  * during a request, summed per stage in a context variable (so it follows the
+    request onto the threadpool and into gathered tasks) and returned to the
+    client in a `Server-Timing` header, which is what the load tests read
+    (see benchmarks/load_api.py). Stages that finish after the headers are sent,
+    such as the LLM stream of /answer/stream, only reach the histogram.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Iterator, Optional, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+_timings: ContextVar[Optional[dict]] = ContextVar("stage_timings", default=None)
+_open: ContextVar[Optional["_Span"]] = ContextVar("open_stage", default=None)
+
+
+class _Span:
+    """One timed interval; nested spans report their time to it so it can subtract them."""
+
+    __slots__ = ("parent", "nested", "started", "token")
+
+    def __init__(self):
+        self.parent  = _open.get()
+        self.nested  = 0.0
+        self.token   = _open.set(self)
+        self.started = time.perf_counter()
+
+    def stop(self) -> float:
+        """Close the span; returns its own time."""
+        elapsed = time.perf_counter() - self.started
+        _open.reset(self.token)
+        if self.parent is not None:
+            self.parent.nested += elapsed
+        return max(0.0, elapsed - self.nested)
+
+
+def begin() -> dict:
+    """Start collecting timings for the current request; returns the (live) dict."""
+    timings: dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def record(name: str, seconds: float):
+    metrics.STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    span = _Span()
+    try:
+        yield
+    finally:
+        record(name, span.stop())
+
+
+def timed(name: str, items: Iterable[T]) -> Iterator[T]:
+    """Yield from `items`, recording the time spent producing them as one `name` stage."""
+    iterator = iter(items)
+    total = 0.0
+    try:
+        while True:
+            span = _Span()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                total += span.stop()
+            yield item
+    finally:
+        record(name, total)
+
+
+def server_timing(timings: dict, total: Optional[float] = None) -> str:
+    """Header value, durations in milliseconds: `embed;dur=1.9, search;dur=4.2, total;dur=7.0`."""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    """Inverse of `server_timing`: stage -> milliseconds."""
+    out = {}
+    for part in filter(None, (p.strip() for p in header.split(","))):
+        name, _, params = part.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur":
+                out[name.strip()] = float(value)
+    return out
@@ -0,0 +1,61 @@
+from answer_cache import AnswerCache, build_answer_cache, scope_key
+
+HITS = [("a.pdf", "chunk one", 0.1), ("b.pdf", "chunk two", 0.2)]
+
+
+def test_scope_key_ignores_hit_order_and_distances():
+    reordered = [("b.pdf", "chunk two", 0.5), ("a.pdf", "chunk one", 0.3)]
+    assert scope_key("f", HITS, []) == scope_key("f", reordered, [])
+
+
+def test_scope_key_changes_with_filters_chunks_and_history():
+    base = scope_key("f", HITS, [])
+    assert scope_key("g", HITS, []) != base
+    assert scope_key("f", HITS[:1], []) != base
+    assert scope_key("f", [("a.pdf", "chunk one, edited", 0.1), HITS[1]], []) != base
+    assert scope_key("f", HITS, [{"role": "user", "content": "earlier"}]) != base
+
+
+def test_similar_question_in_the_same_scope_hits():
+    cache = AnswerCache(threshold=0.95)
+    cache.store([1.0, 0.0], "scope", ["a.pdf"], {"answer": "yes"})
+    hit = cache.lookup([0.99, 0.05], "scope")
+    assert hit["answer"] == "yes"
+    assert 0.95 <= hit["cache_similarity"] <= 1.0
+    assert cache.lookup([0.0, 1.0], "scope") is None
+    assert cache.lookup([1.0, 0.0], "other scope") is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 2)
+
+
+def test_invalidate_by_file():
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], "s1", ["a.pdf", "b.pdf"], {"answer": 1})
+    cache.store([1.0, 0.0], "s2", ["c.pdf"], {"answer": 2})
+    assert cache.invalidate(["b.pdf", "missing.pdf"]) == 1
+    assert cache.lookup([1.0, 0.0], "s1") is None
+    assert cache.lookup([1.0, 0.0], "s2") == {"answer": 2, "cache_similarity": 1.0}
+    assert cache.stats()["invalidated"] == 1
+    # the file index forgets removed entries
+    assert cache.invalidate(["a.pdf"]) == 0
+
+
+def test_expired_and_evicted_entries_miss():
+    expired = AnswerCache(ttl=-1)
+    expired.store([1.0], "s", ["a.pdf"], {})
+    assert expired.lookup([1.0], "s") is None
+    assert expired.stats()["entries"] == 0
+
+    small = AnswerCache(max_entries=1)
+    small.store([1.0], "s1", ["a.pdf"], {"n": 1})
+    small.store([1.0], "s2", ["a.pdf"], {"n": 2})
+    assert small.lookup([1.0], "s1") is None
+    assert small.lookup([1.0], "s2")["n"] == 2
+
+
+def test_build_answer_cache(monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_SIZE", "0")
+    assert build_answer_cache() is None
+    monkeypatch.setenv("ANSWER_CACHE_SIZE", "5")
+    monkeypatch.setenv("ANSWER_CACHE_THRESHOLD", "0.9")
+    cache = build_answer_cache()
+    assert (cache.max_entries, cache.threshold) == (5, 0.9)
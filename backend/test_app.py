@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import tempfile
+
+# app.py builds its clients at import: no OpenAI key check, embeddings or caches from the environment
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+os.environ.setdefault("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "test_app_tts_cache"))
+
+import openai
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import http_client
+from tts_cache import AudioCache
+
+HITS = [("rules.pdf", "Applicants need a valid passport.", 0.2, {"char_start": 0, "char_end": 33})]
+REQUEST = {"messages": [{"role": "user", "content": "What do I need?"}], "top_k": 3}
+
+
+def parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for frame in body.split("\n\n"):
+        if frame:
+            lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_sse_event_framing():
+    frame = app.sse_event("delta", {"content": "two\nlines", "score": float("nan")})
+    assert frame == 'event: delta\ndata: {"content": "two\\nlines", "score": 0.0}\n\n'
+    assert parse_sse(frame) == [("delta", {"content": "two\nlines", "score": 0.0})]
+
+
+class FakeCompletion:
+    def __init__(self, deltas, fail: bool = False):
+        self.deltas = deltas
+        self.fail   = fail
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for delta in self.deltas:
+            yield openai.openai_object.OpenAIObject.construct_from({"choices": [{"delta": {"content": delta}}]})
+        if self.fail:
+            raise RuntimeError("upstream broke")
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    completions = []
+
+    async def retrieve(req):
+        return [0.0], "scope", HITS
+
+    async def acreate(**kwargs):
+        assert kwargs["stream"] is True
+        return completions.pop(0)
+
+    async def bind():
+        pass
+
+    monkeypatch.setattr(app, "retrieve_for_chat", retrieve)
+    monkeypatch.setattr(app, "answer_cache", None)
+    monkeypatch.setattr(http_client, "bind_openai", bind)
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+
+    def post(completion: FakeCompletion) -> list[tuple[str, dict]]:
+        completions.append(completion)
+        response = TestClient(app.app).post("/answer/stream", json=REQUEST)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        return parse_sse(response.text)
+
+    return post
+
+
+def test_stream_events_in_order(stream):
+    completion = FakeCompletion(["A valid ", "passport."])
+    events = stream(completion)
+    assert [name for name, _ in events] == ["sources", "delta", "delta", "done"]
+    assert events[0][1] == [{"filename": "rules.pdf", "similarity": 1 / 1.2}]
+    assert events[-1][1]["answer"] == "A valid passport."
+    assert events[-1][1]["cached"] is False
+    assert completion.closed
+
+
+def test_stream_error_event(stream):
+    completion = FakeCompletion(["Partial"], fail=True)
+    events = stream(completion)
+    assert [name for name, _ in events] == ["sources", "delta", "error"]
+    assert events[-1][1] == {"detail": "upstream broke"}
+    assert completion.closed
+
+
+def test_cached_answer_is_replayed(monkeypatch, stream):
+    cached = {"answer": "From cache.", "sources": [{"filename": "rules.pdf", "similarity": 0.5}], "context": None}
+    monkeypatch.setattr(app, "cached_answer", lambda q_emb, scope: cached)
+    events = stream(FakeCompletion([]))
+    assert events == [("sources", cached["sources"]), ("delta", {"content": "From cache."}),
+                      ("done", {"answer": "From cache.", "context": None, "cached": True})]
+
+
+# ── Text-to-speech streaming ──
+class FakeSpeech:
+    status = 200
+    content_type = "audio/mpeg"
+
+    def __init__(self, chunks):
+        self.content = self
+        self.chunks = chunks
+        self.released = False
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture
+def speech(monkeypatch, tmp_path):
+    upstream = FakeSpeech([b"ID3", b"audio"])
+
+    class Session:
+        async def post(self, url, **kwargs):
+            return upstream
+
+    async def init_session():
+        return Session()
+
+    monkeypatch.setattr(http_client, "init_session", init_session)
+    monkeypatch.setattr(app, "tts_cache", AudioCache(str(tmp_path), 2**20))
+    return upstream
+
+
+def test_tts_miss_is_streamed_and_cached(speech, tmp_path):
+    response = TestClient(app.app).post("/api/tts", data={"text": "Hallo"})
+    assert (response.content, response.headers["x-tts-cache"]) == (b"ID3audio", "miss")
+    assert speech.released
+    assert [p.suffix for p in tmp_path.iterdir()] == [".audio"]
+    assert TestClient(app.app).post("/api/tts", data={"text": "Hallo"}).headers["x-tts-cache"] == "hit"
+
+
+def test_tts_disconnect_before_the_first_chunk(speech, tmp_path):
+    response = asyncio.run(app.tts(text="Hallo", voice=None))
+    assert list(tmp_path.glob("*.part"))
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client went away")
+
+    with pytest.raises(OSError):
+        asyncio.run(response({"type": "http"}, receive, send))
+    assert speech.released
+    assert list(tmp_path.iterdir()) == []
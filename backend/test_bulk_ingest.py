@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import pytest
+from fastapi import HTTPException
+
+import db
+import schema
+from bulk_ingest import BulkIngest, Checkpoint, find_files, identity
+from embeddings import FakeEmbedder
+
+
+def write(path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_find_files_skips_hidden_and_unsupported(tmp_path):
+    for name in ("b.txt", "a.pdf", "sub/c.md", "image.png", ".hidden.txt", ".git/d.txt"):
+        write(tmp_path / name, "x")
+    found = [os.path.relpath(p, tmp_path) for p in find_files(str(tmp_path))]
+    assert found == ["a.pdf", "b.txt", os.path.join("sub", "c.md")]
+
+
+# ── Checkpoints ──
+def test_checkpoint_resumes_finished_files(tmp_path):
+    doc = write(tmp_path / "a.txt", "hello")
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = Checkpoint(path)
+    checkpoint.record("a.txt", identity(doc), "failed", error="boom")
+    checkpoint.record("a.txt", identity(doc), "ingested", rows_written=3)
+    checkpoint.record("b.txt", {"size": 1, "mtime_ns": 1}, "unchanged")
+    checkpoint.close()
+    with open(path, "a") as f:
+        f.write('{"file": "c.txt", "size"')   # cut off by a crash
+
+    resumed = Checkpoint(path)
+    assert resumed.finished("a.txt", identity(doc))   # the last line for a path wins
+    assert resumed.finished("b.txt", {"size": 1, "mtime_ns": 1})
+    assert not resumed.finished("c.txt", {"size": 1, "mtime_ns": 1})
+    resumed.close()
+
+
+def test_checkpoint_retries_failed_and_modified_files(tmp_path):
+    doc = write(tmp_path / "a.txt", "hello")
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint.record("a.txt", identity(doc), "ingested")
+    checkpoint.record("b.txt", {"size": 1, "mtime_ns": 1}, "failed", error="boom")
+    assert not checkpoint.finished("b.txt", {"size": 1, "mtime_ns": 1})
+    write(tmp_path / "a.txt", "hello, edited")
+    assert not checkpoint.finished("a.txt", identity(doc))
+    checkpoint.close()
+
+
+def test_restart_discards_the_checkpoint(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = Checkpoint(path)
+    checkpoint.record("a.txt", {"size": 1, "mtime_ns": 1}, "ingested")
+    checkpoint.close()
+    restarted = Checkpoint(path, restart=True)
+    assert not restarted.finished("a.txt", {"size": 1, "mtime_ns": 1})
+    restarted.close()
+
+
+# ── The pipeline, against the database the DB_* env vars point at ──
+@pytest.fixture
+def database():
+    if not os.getenv("DB_NAME"):
+        pytest.skip("set DB_* to a scratch Postgres with pgvector")
+    try:
+        schema.ensure_schema()
+    except (psycopg2.Error, HTTPException) as e:   # HTTPException: the pool couldn't connect
+        pytest.skip(f"database unavailable: {e}")
+    prefix = f"test_bulk/{uuid.uuid4().hex}/"
+    yield prefix
+    with db.get_cursor(commit=True) as cur:
+        cur.execute("DELETE FROM documents WHERE filename LIKE %s", (prefix + "%",))
+    db.close_pool()
+
+
+def run_bulk(checkpoint: Checkpoint, files: list[tuple[str, str]]) -> BulkIngest:
+    args = argparse.Namespace(country="Germany", job_area="Unknown", source_type=None, target_group="Unknown",
+                              owner="Unknown", files_in_flight=2, embed_concurrency=2, writers=2)
+    run = BulkIngest(args, FakeEmbedder(1536), checkpoint)
+    with ThreadPoolExecutor(2) as pool:
+        asyncio.run(run.run(pool, files))
+    return run
+
+
+def test_rerun_skips_what_is_stored(database, tmp_path):
+    text = "\n\n".join(f"Section {i}. " + "Rules for applicants. " * 30 for i in range(4))
+    files = [(database + "a.txt", write(tmp_path / "a.txt", text)),
+             (database + "b.md", write(tmp_path / "b.md", text.upper()))]
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+
+    first = run_bulk(checkpoint, files)
+    assert first.totals["ingested"] == 2 and first.totals["failed"] == 0
+    assert all(checkpoint.finished(name, identity(path)) for name, path in files)
+
+    # a run without the checkpoint (--restart) finds the stored hashes
+    fresh = Checkpoint(str(tmp_path / "other.jsonl"))
+    again = run_bulk(fresh, files)
+    fresh.close()
+    assert again.totals["unchanged"] == 2 and again.totals["rows_written"] == 0
+
+    write(tmp_path / "a.txt", text.replace("Section 2.", "Section two."))
+    edited = run_bulk(checkpoint, files[:1])
+    assert edited.totals["rows_written"] == 1
+    assert edited.totals["kept"] == first.totals["chunks"] // 2 - 1
+    checkpoint.close()
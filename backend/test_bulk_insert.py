@@ -0,0 +1,84 @@
+import os
+import uuid
+from datetime import date
+
+import psycopg2
+import pytest
+from fastapi import HTTPException
+
+import db
+import schema
+from bulk_insert import COLUMNS, _CopyStream, chunk_rows, write_rows
+from chunking import Chunk
+from dedup import content_hash
+
+DOC = {"filename": "rules.pdf", "country": "Germany", "job_area": "Care", "source_type": "PDF",
+       "target_group": "Unknown", "owner": "Unknown", "document_hash": "d" * 64}
+
+
+def chunk(index: int, text: str) -> Chunk:
+    return Chunk(index=index, text=text, page=1, page_end=1, start=index * 10, end=index * 10 + len(text))
+
+
+def test_chunk_rows():
+    [row] = chunk_rows({**DOC, "metadata": {"lang": "de"}}, [(chunk(0, "Visa rules"), [0.5, 0.25])], "m")
+    assert set(row) >= set(COLUMNS)
+    assert row["creation_date"] == date.today()
+    assert row["metadata"] == {"lang": "de", "chunk_index": 0, "page": 1, "page_end": 1,
+                               "char_start": 0, "char_end": 10}
+    assert (row["content_hash"], row["embedding_model"], row["embedding_dim"]) == (content_hash("Visa rules"), "m", 2)
+
+
+def test_copy_text_escaping():
+    row = {"filename": "a\tb\\c", "full_text": "line\nnext\r\x00end", "content_embedding": [1, 0.5],
+           "metadata": {"k": "v"}, "creation_date": date(2024, 1, 2)}
+    fields = _CopyStream([row]).read().decode("utf-8").rstrip("\n").split("\t")
+    values = dict(zip(COLUMNS, fields))
+    assert values["filename"] == "a\\tb\\\\c"
+    assert values["full_text"] == "line\\nnext\\rend"
+    assert values["content_embedding"] == "[1.0,0.5]"
+    assert values["metadata"] == '{"k": "v"}'
+    assert values["creation_date"] == "2024-01-02"
+    assert values["country"] == r"\N"
+
+
+def test_copy_stream_renders_lazily():
+    pulled = []
+
+    def rows():
+        for i in range(100):
+            pulled.append(i)
+            yield {"filename": f"f{i}"}
+
+    stream = _CopyStream(rows())
+    first = stream.read(64)
+    assert len(first) == 64 and len(pulled) < 10
+    rest = b""
+    while block := stream.read(64):
+        rest += block
+    assert (first + rest).count(b"\n") == stream.count == 100
+
+
+# ── Against the database the DB_* env vars point at ──
+@pytest.mark.skipif(not os.getenv("DB_NAME"), reason="set DB_* to a scratch Postgres with pgvector")
+@pytest.mark.parametrize("method", ["copy", "values"])
+def test_round_trip(method):
+    try:
+        schema.ensure_schema()
+    except (psycopg2.Error, HTTPException) as e:   # HTTPException: the pool couldn't connect
+        pytest.skip(f"database unavailable: {e}")
+    filename = f"test_bulk_insert/{uuid.uuid4().hex}"
+    texts = ["Tabs\tand\nnewlines", "Back\\slash and quotes ' \"", "Umlaute äöü"]
+    rows = chunk_rows({**DOC, "filename": filename},
+                      ((chunk(i, t), [float(i)] * 1536) for i, t in enumerate(texts)), "m")
+    try:
+        with db.get_cursor(commit=True) as cur:
+            assert write_rows(cur, rows, method=method, page_size=2) == 3
+        with db.get_cursor() as cur:
+            cur.execute("SELECT full_text, metadata->>'chunk_index', embedding_dim, vector_dims(content_embedding) "
+                        "FROM documents WHERE filename = %s ORDER BY full_text", (filename,))
+            assert cur.fetchall() == sorted((t, str(i), 1536, 1536) for i, t in enumerate(texts))
+    finally:
+        with db.get_cursor(commit=True) as cur:
+            cur.execute("DELETE FROM documents WHERE filename = %s", (filename,))
+        db.close_pool()
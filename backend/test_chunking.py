@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from chunking import chunk_text, iter_chunks, split_text
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa §3 Nr.".split()
+SEPARATORS = [" ", " ", " ", ". ", "\n", "\n\n", "\n\n\n", ".", "  ", " \n"]
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    out = []
+    for _ in range(words):
+        r = rng.random()
+        if r < 0.01:
+            out.append("x" * rng.randint(100, 2000))                            # no separator at all
+        elif r < 0.02:
+            out.append(("y" * rng.randint(5, 40) + ".") * rng.randint(5, 60))   # sentences, no spaces
+        else:
+            out.append(rng.choice(WORDS))
+        out.append(rng.choice(SEPARATORS))
+    return "".join(out)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_streaming_matches_whole_document(seed):
+    rng = random.Random(seed)
+    pages = [random_text(rng, rng.randint(0, 400)) for _ in range(rng.randint(1, 8))]
+    chunk_size = rng.choice([50, 200, 800])
+    overlap = rng.choice([0, 10, min(100, chunk_size)])
+    doc = "\n".join(pages)
+
+    chunks = list(iter_chunks(pages, chunk_size, overlap))
+
+    assert [c.text for c in chunks] == split_text(doc, chunk_size, overlap)
+    assert all(doc[c.start:c.end] == c.text for c in chunks)
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+
+
+def test_separator_split_across_sections():
+    # the page's trailing "\n" and the "\n" joining pages make one paragraph break
+    pages = ["first paragraph " * 30 + "\n", "second paragraph " * 30]
+    doc = "\n".join(pages)
+    assert [c.text for c in iter_chunks(pages, 200, 20)] == split_text(doc, 200, 20)
+
+
+def test_pages_and_spans():
+    pages = [(3, "a" * 50), (4, "b " * 300), (7, "c " * 10)]
+    chunks = list(iter_chunks(pages, 200, 0))
+    assert chunks[0].page == 3
+    assert chunks[-1].page_end == 7
+    for c in chunks:
+        assert c.page <= c.page_end
+        assert c.metadata() == {"chunk_index": c.index, "page": c.page, "page_end": c.page_end,
+                                "char_start": c.start, "char_end": c.end}
+
+
+def test_plain_sections_numbered_from_one():
+    chunks = list(iter_chunks(["one", "two"], 800, 0))
+    assert [(c.text, c.page, c.page_end) for c in chunks] == [("one\ntwo", 1, 2)]
+
+
+def test_blank_input():
+    assert list(iter_chunks([])) == []
+    assert list(iter_chunks(["", "  \n "])) == []
+    assert chunk_text("   ") == []
+
+
+def test_chunk_text():
+    text = "word " * 1000
+    assert chunk_text(text) == split_text(text)
@@ -0,0 +1,115 @@
+from context_packing import merge_hits, pack_prompt
+from embeddings import count_tokens
+
+DOC = " ".join(f"Sentence {i} of the residence permit rules." for i in range(200))
+
+
+def span(start: int, end: int, distance: float = 0.5, filename: str = "rules.pdf"):
+    return (filename, DOC[start:end], distance, {"char_start": start, "char_end": end})
+
+
+# ── Merging ──
+def test_overlapping_spans_merge():
+    passages = merge_hits([span(100, 400, 0.2), span(300, 700, 0.3)])
+    assert len(passages) == 1
+    p = passages[0]
+    assert (p.text, p.start, p.end) == (DOC[100:700], 100, 700)
+    assert p.distance == 0.2
+    assert len(p.hits) == 2
+
+
+def test_adjacent_spans_merge_across_stripped_whitespace():
+    # the chunker strips the space between two chunks
+    gap = DOC.index(" ", 300)
+    left, right = span(0, gap), span(gap + 1, 600)
+    [p] = merge_hits([right, left])
+    assert (p.start, p.end) == (0, 600)
+    assert p.text == DOC[0:gap] + "\n" + DOC[gap + 1:600]
+    assert len(p.text) == p.end - p.start
+
+
+def test_contained_span_merges_into_its_container():
+    [p] = merge_hits([span(200, 300, 0.1), span(0, 1000, 0.4)])
+    assert p.text == DOC[0:1000]
+    assert p.distance == 0.1
+    assert p.rank == 0
+
+
+def test_distant_spans_stay_apart_in_retrieval_order():
+    passages = merge_hits([span(2000, 2300, 0.1), span(0, 300, 0.2)])
+    assert [p.start for p in passages] == [2000, 0]
+
+
+def test_same_offsets_different_text_dont_merge():
+    # pages crawled from one site share a filename but not their text
+    other = ("rules.pdf", "x" * 300, 0.3, {"char_start": 200, "char_end": 500})
+    assert len(merge_hits([span(0, 300), other])) == 2
+
+
+def test_files_never_merge():
+    hits = [span(0, 300, filename="a.pdf"), span(200, 500, filename="b.pdf")]
+    assert [p.filename for p in merge_hits(hits)] == ["a.pdf", "b.pdf"]
+
+
+def test_text_overlap_without_offsets():
+    a, b = DOC[0:300], DOC[250:600]
+    [p] = merge_hits([("old.pdf", b, 0.3), ("old.pdf", a, 0.2)])
+    assert p.text == DOC[0:600]
+    assert p.start is None
+    assert p.distance == 0.2
+
+
+def test_duplicate_text_without_offsets():
+    [p] = merge_hits([("old.pdf", "same chunk text " * 5, 0.3), ("old.pdf", "same chunk text " * 5, 0.4)])
+    assert len(p.hits) == 2
+
+
+def test_offsets_that_dont_match_the_text_are_ignored():
+    bad = ("rules.pdf", DOC[0:300], 0.2, {"char_start": 0, "char_end": 999})
+    [p] = merge_hits([bad])
+    assert p.start is None
+
+
+# ── Packing ──
+def test_everything_fits():
+    hits = [span(0, 300, 0.1), span(2000, 2300, 0.2)]
+    packed = pack_prompt("You answer.", [{"role": "user", "content": "Which rules?"}], hits, budget=4000)
+    assert [m["role"] for m in packed.messages] == ["system", "user", "system"]
+    assert packed.messages[-1]["content"] == "Context:\n" + DOC[0:300] + "\n\n" + DOC[2000:2300]
+    assert packed.prompt_tokens <= packed.budget
+    assert packed.report()["chunks_dropped"] == 0
+    assert not packed.truncated
+
+
+def test_budget_truncates_then_drops():
+    hits = [span(0, 1500, 0.1), span(3000, 4500, 0.2), span(6000, 7500, 0.3)]
+    first = count_tokens(DOC[0:1500])
+    packed = pack_prompt("You answer.", [{"role": "user", "content": "Which rules?"}], hits, budget=first + 200)
+    assert packed.prompt_tokens <= packed.budget
+    assert packed.truncated
+    assert len(packed.passages) == 2
+    assert packed.chunks_dropped == 1
+    assert DOC[0:1500] in packed.messages[-1]["content"]
+
+
+def test_merged_chunks_are_reported():
+    hits = [span(0, 300), span(250, 600), span(3000, 3300)]
+    packed = pack_prompt("s", [{"role": "user", "content": "q"}], hits, budget=4000)
+    assert (packed.chunks_retrieved, packed.chunks_merged) == (3, 1)
+
+
+def test_old_turns_collapse_into_a_digest():
+    history = []
+    for i in range(30):
+        history += [{"role": "user", "content": f"question {i} " + "about permits " * 20},
+                    {"role": "assistant", "content": "an answer " * 40}]
+    messages = history + [{"role": "user", "content": "latest question"}]
+    packed = pack_prompt("s", messages, [span(0, 300)], budget=4000, history_budget=600)
+
+    assert packed.turns_dropped > 0
+    assert packed.history_tokens <= 600
+    digest = packed.messages[1]
+    assert digest["role"] == "system"
+    assert digest["content"].startswith("Earlier in this conversation the user asked: question 0")
+    assert packed.messages[-2] == {"role": "user", "content": "latest question"}
+    assert packed.prompt_tokens <= packed.budget
@@ -0,0 +1,99 @@
+import asyncio
+import socket
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import crawler
+from crawler import CrawlConfig, Crawler, normalize_url, page_name
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.org:443/a?b=1#frag") == "https://example.org/a?b=1"
+    assert normalize_url("http://example.org:8080") == "http://example.org:8080/"
+
+
+def test_page_name():
+    assert page_name("https://example.org/guide/visa?lang=en") == "example.org/guide/visa?lang=en"
+    assert page_name("https://example.org/a") != page_name("https://example.org/b")
+
+
+def test_config_allows():
+    config = CrawlConfig(seeds=["https://example.org/guide/"], path_prefix="/guide")
+    assert config.allows("https://example.org/guide/visa")
+    assert not config.allows("https://example.org/blog/")
+    assert not config.allows("https://example.org/guide/form.pdf")
+    assert not config.allows("https://other.org/guide/")
+    assert CrawlConfig(seeds=["https://example.org/"], domains=["Example.org"]).allows("https://www.example.org/")
+
+
+# ── A crawl against a local site ──
+PAGES = {
+    "/":         '<a href="/a">A</a> <a href="/b">B</a> <a href="/private/x">P</a>',
+    "/a":        '<p>Page A text.</p><a href="/a/deep">deeper</a>',
+    "/b":        '<p>Page B text.</p><a href="/">home</a>',
+    "/a/deep":   "<p>Too deep.</p>",
+    "/private/x": "<p>Secret.</p>",
+}
+
+
+@pytest.fixture
+def site(monkeypatch):
+    monkeypatch.setenv("CRAWL_HOST_DELAY", "0")
+    monkeypatch.setattr(crawler, "_memory", {})
+    requests = []
+
+    async def robots(request):
+        return web.Response(text="User-agent: *\nDisallow: /private/\n")
+
+    async def page(request):
+        requests.append((request.path, request.headers.get("If-None-Match")))
+        etag = f'"{request.path}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        body = f"<html><body><main>{PAGES[request.path]}</main></body></html>"
+        return web.Response(text=body, content_type="text/html", headers={"ETag": etag})
+
+    def make_app():   # one per crawl: an Application is bound to the loop it first ran on
+        app = web.Application()
+        app.router.add_get("/robots.txt", robots)
+        app.router.add_get("/{path:.*}", page)
+        return app
+
+    with socket.socket() as sock:   # the same port for every crawl, so re-crawls hit remembered URLs
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return lambda: TestServer(make_app(), port=port), requests
+
+
+def run_crawl(server_factory, max_depth: int):
+    ingested = {}
+
+    async def scenario():
+        async with server_factory() as server:
+            config = CrawlConfig(seeds=[str(server.make_url("/"))], max_depth=max_depth)
+            stats = await Crawler(config, lambda name, page: ingested.__setitem__(name, page.text)).run()
+            return str(server.make_url("/")), stats
+
+    root, stats = asyncio.run(scenario())
+    return page_name(root).rstrip("/"), ingested, stats
+
+
+def test_crawl_names_pages_and_honours_robots_and_depth(site):
+    server, requests = site
+    host, ingested, stats = run_crawl(server, max_depth=1)
+    assert set(ingested) == {f"{host}/", f"{host}/a", f"{host}/b"}
+    assert ingested[f"{host}/a"] == "Page A text.\n\ndeeper"
+    assert stats["disallowed"] == 1
+    assert "/private/x" not in [path for path, _ in requests]
+
+
+def test_recrawl_sends_conditional_requests(site):
+    server, requests = site
+    run_crawl(server, max_depth=1)
+    requests.clear()
+    _, ingested, stats = run_crawl(server, max_depth=1)
+    assert ingested == {}
+    assert stats["unchanged"] == 3
+    assert all(etag == f'"{path}"' for path, etag in requests)
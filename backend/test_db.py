@@ -0,0 +1,108 @@
+import os
+import threading
+
+import psycopg2
+import pytest
+from fastapi import HTTPException
+
+import db
+from db import ConnectionPool
+
+
+def test_failed_connect_releases_its_slot(tmp_path):
+    pool = ConnectionPool(size=1, max_overflow=0, timeout=0.1, host=str(tmp_path), dbname="none")
+    for _ in range(2):   # a leaked slot would make the second attempt time out with 503
+        with pytest.raises(HTTPException) as e:
+            pool.getconn()
+        assert e.value.status_code == 500
+    assert pool.stats()["open"] == pool.stats()["in_use"] == 0
+
+
+# ── Against the database the DB_* env vars point at ──
+@pytest.fixture
+def make_pool():
+    if not os.getenv("DB_NAME"):
+        pytest.skip("set DB_* to a scratch Postgres")
+    pools = []
+
+    def make(**settings) -> ConnectionPool:
+        pool = ConnectionPool(**{"size": 1, "max_overflow": 1, "timeout": 0.2, "min_size": 0,
+                                 **settings}, **db.connection_kwargs())
+        pools.append(pool)
+        return pool
+
+    try:
+        make().open()
+    except HTTPException as e:
+        pytest.skip(f"database unavailable: {e.detail}")
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_overflow_then_timeout(make_pool):
+    pool = make_pool()
+    first, overflow = pool.getconn(), pool.getconn()
+    assert pool.stats()["overflow"] == 1
+    with pytest.raises(HTTPException) as e:
+        pool.getconn()
+    assert e.value.status_code == 503 and pool.stats()["timeouts"] == 1
+
+    pool.putconn(overflow)
+    pool.putconn(first)   # `size` connections are idle already: closed, not kept
+    assert first.closed and not overflow.closed
+    assert pool.stats()["open"] == 1
+    assert pool.getconn() is overflow
+
+
+def test_waiter_gets_a_returned_connection(make_pool):
+    pool = make_pool(max_overflow=0, timeout=5)
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    pool.putconn(conn)
+    waiter.join(5)
+    assert got == [conn]
+
+
+def test_open_transaction_is_rolled_back_on_return(make_pool):
+    pool = make_pool()
+    conn = pool.getconn()
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1")
+    assert conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    pool.putconn(conn)
+    assert conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+def test_stale_connections_are_replaced(make_pool):
+    pool = make_pool(recycle=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    replaced = pool.getconn()
+    assert replaced is not conn and conn.closed
+    assert pool.stats()["recycled"] == 1
+    pool.putconn(replaced)
+
+    pool = make_pool(pre_ping=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    admin = psycopg2.connect(**db.connection_kwargs())
+    with admin.cursor() as cur:   # the server ends the idle session behind the pool's back
+        cur.execute("SELECT pg_terminate_backend(%s)", (conn.get_backend_pid(),))
+    admin.close()
+    fresh = pool.getconn()
+    assert fresh is not conn and pool.stats()["health_check_failures"] == 1
+    with fresh.cursor() as cur:
+        cur.execute("SELECT 1")
+
+
+def test_get_cursor_rolls_back_on_error(make_pool, monkeypatch):
+    monkeypatch.setattr(db, "_pool", make_pool())
+    with pytest.raises(psycopg2.errors.UndefinedTable):
+        with db.get_cursor(commit=True) as cur:
+            cur.execute("SELECT * FROM no_such_table")
+    with db.get_cursor() as cur:   # the same connection, usable again
+        cur.execute("SELECT 1")
+        assert cur.fetchone() == (1,)
@@ -0,0 +1,117 @@
+import os
+import uuid
+
+import psycopg2
+import pytest
+from fastapi import HTTPException
+
+import db
+import schema
+from bulk_insert import chunk_rows, write_rows
+from chunking import iter_chunks
+from dedup import IncrementalIngest, content_hash
+from embeddings import FakeEmbedder
+
+# runs against the database the DB_* env vars point at, under throwaway filenames
+pytestmark = pytest.mark.skipif(not os.getenv("DB_NAME"), reason="set DB_* to a scratch Postgres with pgvector")
+
+PARAGRAPHS = [f"Paragraph {i}. " + f"Residence permit rule {i} applies to applicants. " * 12 for i in range(6)]
+
+
+@pytest.fixture(scope="module")
+def embedder():
+    try:
+        schema.ensure_schema()
+    except (psycopg2.Error, HTTPException) as e:   # HTTPException: the pool couldn't connect
+        pytest.skip(f"database unavailable: {e}")
+    yield FakeEmbedder(1536)
+    db.close_pool()
+
+
+@pytest.fixture
+def filename():
+    name = f"test_dedup/{uuid.uuid4().hex}"
+    yield name
+    with db.get_cursor(commit=True) as cur:
+        cur.execute("DELETE FROM documents WHERE filename = %s", (name,))
+
+
+def make_doc(filename: str, text: str, **fields) -> dict:
+    return {"filename": filename, "country": "Germany", "job_area": "Care", "source_type": "PDF",
+            "target_group": "Unknown", "owner": "Unknown", "document_hash": content_hash(text), **fields}
+
+
+def ingest(doc: dict, text: str, embedder) -> IncrementalIngest:
+    delta = IncrementalIngest(doc, embedder.model)
+    if delta.unchanged():
+        return delta
+    with db.get_cursor(commit=True) as cur:
+        delta.lock(cur)
+        embedded = delta.embed(delta.new_chunks(iter_chunks([text])), embedder)
+        write_rows(cur, chunk_rows(doc, embedded, embedder.model))
+        delta.finalize(cur)
+    return delta
+
+
+def stored(filename: str) -> list[tuple]:
+    with db.get_cursor() as cur:
+        cur.execute("SELECT content_hash, country FROM documents WHERE filename = %s ORDER BY content_hash",
+                    (filename,))
+        return cur.fetchall()
+
+
+def test_reingest_keeps_unchanged_chunks(embedder, filename):
+    text = "\n\n".join(PARAGRAPHS)
+    first = ingest(make_doc(filename, text), text, embedder)
+    assert first.counts["embedded"] > 1
+    assert IncrementalIngest(make_doc(filename, text), embedder.model).unchanged()
+
+    edited = text.replace("Paragraph 3.", "Paragraph three.")
+    second = ingest(make_doc(filename, edited), edited, embedder)
+    assert second.counts["kept"] > 0
+    assert second.counts["embedded"] + second.counts["reused"] == second.counts["deleted"] >= 1
+    expected = {content_hash(c.text) for c in iter_chunks([edited])}
+    assert {h for h, _ in stored(filename)} == expected
+
+
+def test_changed_metadata_is_not_unchanged(embedder, filename):
+    text = "\n\n".join(PARAGRAPHS[:2])
+    ingest(make_doc(filename, text), text, embedder)
+    moved = make_doc(filename, text, country="Austria")
+    assert not IncrementalIngest(moved, embedder.model).unchanged()
+
+    delta = ingest(moved, text, embedder)
+    assert delta.counts["embedded"] == delta.counts["deleted"] == 0
+    assert {country for _, country in stored(filename)} == {"Austria"}
+    assert IncrementalIngest(moved, embedder.model).unchanged()
+
+
+def test_new_model_replaces_every_row(embedder, filename):
+    text = "\n\n".join(PARAGRAPHS[:3])
+    ingest(make_doc(filename, text), text, embedder)
+    other = FakeEmbedder(1536)
+    other.model = "fake-other"
+    assert not IncrementalIngest(make_doc(filename, text), other.model).unchanged()
+
+    delta = ingest(make_doc(filename, text), text, other)
+    assert delta.counts["kept"] == 0
+    assert delta.counts["embedded"] == delta.counts["deleted"] == len(stored(filename))
+    with db.get_cursor() as cur:
+        cur.execute("SELECT DISTINCT embedding_model FROM documents WHERE filename = %s", (filename,))
+        assert cur.fetchall() == [("fake-other",)]
+
+
+def test_repeated_chunks_are_stored_once(embedder, filename):
+    text = "\n\n".join([PARAGRAPHS[0]] * 3)
+    delta = ingest(make_doc(filename, text), text, embedder)
+    assert delta.counts["duplicates"] == 2
+    assert len(stored(filename)) == 1
+
+
+def test_lock_reports_a_concurrent_ingest(embedder, filename):
+    text = "\n\n".join(PARAGRAPHS[:2])
+    stale = IncrementalIngest(make_doc(filename, text), embedder.model)
+    ingest(make_doc(filename, text), text, embedder)
+    with db.get_cursor() as cur:
+        assert not stale.lock(cur)
+        assert stale.unchanged()   # the state re-read under the lock
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+import embedding_cache
+from embedding_cache import MemoryCache, SQLiteCache, TieredCache, build_cache, cache_key, normalize_text
+
+
+def test_normalize_text():
+    assert normalize_text("  What IS\tthe\n\nrule? ") == "what is the rule?"
+    # NFKC folds compatibility forms, e.g. full-width letters and the "ﬁ" ligature
+    assert normalize_text("ＶＩＳＡ ﬁle") == "visa file"
+
+
+def test_cache_key():
+    assert cache_key("Visa  rules", "m") == cache_key("visa rules", "m")
+    assert cache_key("visa rules", "m") != cache_key("visa rules", "other-model")
+    assert cache_key("visa rules", "m") != cache_key("visa rule", "m")
+
+
+def test_memory_lru_and_ttl(monkeypatch):
+    cache = MemoryCache(max_entries=2, ttl=10)
+    cache.put("a", "m", [1.0])
+    cache.put("b", "m", [2.0])
+    assert cache.get("A", "m") == [1.0]        # a is now the most recently used
+    cache.put("c", "m", [3.0])
+    assert cache.get("b", "m") is None
+    assert cache.stats()["evictions"] == 1
+
+    monkeypatch.setattr(embedding_cache.time, "monotonic", lambda: 10**9)
+    assert cache.get("a", "m") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_sqlite_survives_reopening(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    SQLiteCache(path).put("visa rules", "m", [0.5, 0.25])
+    reopened = SQLiteCache(path)
+    assert reopened.get("Visa rules", "m") == [0.5, 0.25]
+    assert reopened.get("visa rules", "other") is None
+
+
+def test_sqlite_expired_rows_are_dropped(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "e.sqlite3"), ttl=-1)
+    cache.put("q", "m", [1.0])
+    assert cache.get("q", "m") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_tiered_promotes_disk_hits(tmp_path):
+    memory, disk = MemoryCache(), SQLiteCache(str(tmp_path / "e.sqlite3"))
+    disk.put("q", "m", [1.0])
+    tiered = TieredCache(memory, disk)
+    assert tiered.blocking
+    assert tiered.get("q", "m") == [1.0]
+    assert memory.get("q", "m") == [1.0]
+    assert tiered.get("missing", "m") is None
+    stats = tiered.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_async_access_writes_disk_in_background(tmp_path):
+    memory, disk = MemoryCache(), SQLiteCache(str(tmp_path / "e.sqlite3"))
+    tiered = TieredCache(memory, disk)
+
+    async def scenario():
+        await tiered.aput("q", "m", [1.0])
+        assert memory.get("q", "m") == [1.0]   # the memory tier is written inline
+        while disk.stats()["size"] == 0:
+            await asyncio.sleep(0.01)
+        memory.clear()
+        return await tiered.aget("Q", "m")
+
+    assert asyncio.run(scenario()) == [1.0]
+
+
+def test_build_cache(monkeypatch, tmp_path):
+    monkeypatch.delenv("EMBED_CACHE_SQLITE", raising=False)
+    monkeypatch.setenv("EMBED_CACHE_SIZE", "0")
+    assert build_cache() is None
+    monkeypatch.setenv("EMBED_CACHE_SIZE", "10")
+    assert isinstance(build_cache(), MemoryCache)
+    monkeypatch.setenv("EMBED_CACHE_SQLITE", str(tmp_path / "e.sqlite3"))
+    assert isinstance(build_cache(), TieredCache)
+
+
+@pytest.mark.parametrize("cache_type", [MemoryCache, SQLiteCache])
+def test_clear(cache_type, tmp_path):
+    cache = cache_type(str(tmp_path / "e.sqlite3")) if cache_type is SQLiteCache else cache_type()
+    cache.put("q", "m", [1.0])
+    cache.clear()
+    assert cache.get("q", "m") is None
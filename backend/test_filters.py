@@ -0,0 +1,180 @@
+import pytest
+
+import filters
+import vector_index
+from filters import FilterSet, clean_value, key_matches, normalize, parse_terms, vector_search
+
+
+@pytest.fixture(autouse=True)
+def fresh_planner_state(monkeypatch):
+    monkeypatch.setattr(filters, "_estimates", type(filters._estimates)())
+    monkeypatch.setattr(vector_index, "_active_spec", None)
+    monkeypatch.setattr(vector_index, "_iterative_scan", None)
+    monkeypatch.setattr(vector_index, "_compact_index", None)
+
+
+class FakeCursor:
+    """Answers the planning statements of a filtered search with canned rows."""
+
+    def __init__(self, plan_rows: int, version: str = "0.8.0", reltuples: int = 100_000):
+        self.plan_rows = plan_rows
+        self.version   = version
+        self.reltuples = reltuples
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+        if sql.startswith("EXPLAIN"):
+            self.rows = [[[{"Plan": {"Plan Rows": self.plan_rows}}]]]
+        elif "pg_extension" in sql:
+            self.rows = [(self.version,)]
+        elif "reltuples" in sql:
+            self.rows = [(self.reltuples,)]
+        elif "set_config" in sql:
+            self.rows = [tuple("" for _ in params[::2])]
+        else:
+            self.rows = [("a.pdf", "text", 0.25)]
+
+    def fetchall(self):
+        return self.rows
+
+    def settings(self) -> dict:
+        settings = {}
+        for sql, params in self.statements:
+            if "set_config" in sql:
+                settings.update(zip(params[::2], params[1::2]))
+        return settings
+
+
+# ── Values and terms ──
+def test_normalize():
+    assert clean_value("  New \t Zealand\n") == "New Zealand"
+    assert normalize("  New \t ZEALAND ") == "new zealand"
+
+
+def test_parse_terms():
+    assert parse_terms(None) == []
+    assert parse_terms(["", "  "]) == []
+    assert parse_terms("Germany") == [("exact", "germany")]
+    assert parse_terms("Ger*") == [("prefix", "ger")]
+    assert parse_terms("*man*") == [("substring", "man")]
+    assert parse_terms(["India", " New  Zea*"]) == [("exact", "india"), ("prefix", "new zea")]
+    # a lone "*" or "**" is matched literally
+    assert parse_terms("*") == [("exact", "*")]
+    assert parse_terms("**") == [("prefix", "*")]
+
+
+def test_key_matches():
+    terms = parse_terms(["India", "Ger*", "*land*"])
+    assert key_matches(terms, "india")
+    assert key_matches(terms, "germany")
+    assert key_matches(terms, "new zealand")
+    assert not key_matches(terms, "indiana")
+    assert not key_matches(terms, "algeria")
+
+
+# ── SQL generation ──
+def test_empty_filter_set():
+    fs = FilterSet()
+    assert not fs
+    assert fs.where() == ("", [])
+
+
+def test_exact_prefix_and_substring_sql():
+    fs = FilterSet(country="Germany", job_area="IT*", source_type="*htm*")
+    assert fs
+    assert fs.where() == (
+        "WHERE country_key = %s AND job_area_key LIKE %s AND source_type_key LIKE %s",
+        ["germany", "it%", "%htm%"],
+    )
+
+
+def test_set_membership_sql():
+    fs = FilterSet(country=["Germany", "India", "Ger*"])
+    assert fs.where() == ("WHERE (country_key = ANY(%s) OR country_key LIKE %s)", [["germany", "india"], "ger%"])
+
+
+def test_like_wildcards_are_escaped():
+    fs = FilterSet(job_area="100%_sure\\*")
+    assert fs.where()[1] == ["100\\%\\_sure\\\\%"]
+
+
+def test_filenames_and_embedding_model():
+    fs = FilterSet(filenames=["b.pdf", "a.pdf", "b.pdf"], embedding_model="m")
+    assert fs
+    assert fs.where("AND") == ("AND filename = ANY(%s) AND embedding_model = %s", [["a.pdf", "b.pdf"], "m"])
+
+    # the model alone keeps other models' rows out, but isn't a filter
+    only_model = FilterSet(embedding_model="m")
+    assert not only_model
+    assert only_model.where() == ("WHERE embedding_model = %s", ["m"])
+
+
+def test_signature_follows_the_conditions():
+    assert FilterSet(country="Germany").signature() == FilterSet(country=" germany ").signature()
+    assert FilterSet(country="Germany").signature() != FilterSet(country="Ger*").signature()
+    assert FilterSet(embedding_model="a").signature() != FilterSet(embedding_model="b").signature()
+
+
+# ── Planning ──
+def test_unfiltered_search_skips_planning():
+    cur = FakeCursor(plan_rows=0)
+    rows = vector_search(cur, [0.1, 0.2], FilterSet(embedding_model="m"), k=5)
+    assert rows == [("a.pdf", "text", 0.25)]
+    assert len(cur.statements) == 1
+    sql, params = cur.statements[0]
+    assert "embedding_model = %s" in sql
+    assert params == [[0.1, 0.2], "m", 5]
+
+
+def test_selective_filter_prefilters(monkeypatch):
+    monkeypatch.setenv("FILTER_PREFILTER_MAX_ROWS", "1000")
+    cur = FakeCursor(plan_rows=50)
+    vector_search(cur, [0.1], FilterSet(country="Germany"), k=5)
+    sql, params = cur.statements[-1]
+    assert "AS MATERIALIZED" in sql
+    assert params == ["germany", [0.1], 5]
+    assert cur.settings() == {}
+
+
+def test_broad_filter_uses_iterative_scan(monkeypatch):
+    monkeypatch.setenv("FILTER_PREFILTER_MAX_ROWS", "1000")
+    cur = FakeCursor(plan_rows=50_000, version="0.8.0")
+    vector_search(cur, [0.1], FilterSet(country="Germany"), k=5)
+    assert "MATERIALIZED" not in cur.statements[-1][0]
+    assert cur.settings()["hnsw.iterative_scan"] == "relaxed_order"
+
+
+def test_broad_filter_widens_ef_search_without_iterative_scan(monkeypatch):
+    monkeypatch.setenv("FILTER_PREFILTER_MAX_ROWS", "1000")
+    cur = FakeCursor(plan_rows=10_000, version="0.7.4", reltuples=100_000)
+    vector_search(cur, [0.1], FilterSet(country="Germany"), k=10)
+    # a tenth of the rows pass, so ten times k candidates are needed
+    assert cur.settings() == {"hnsw.ef_search": "100"}
+
+
+def test_estimates_are_cached_per_filter(monkeypatch):
+    monkeypatch.setenv("FILTER_PREFILTER_MAX_ROWS", "1000")
+    fs = FilterSet(country="Germany")
+    vector_search(FakeCursor(plan_rows=50), [0.1], fs, k=5)
+    cur = FakeCursor(plan_rows=50_000)
+    vector_search(cur, [0.1], fs, k=5)
+    assert not any(sql.startswith("EXPLAIN") for sql, _ in cur.statements)
+    assert "AS MATERIALIZED" in cur.statements[-1][0]
+
+
+def test_exact_search_never_plans():
+    cur = FakeCursor(plan_rows=50)
+    vector_search(cur, [0.1], FilterSet(country="Germany"), k=5, exact=True)
+    assert not any(sql.startswith("EXPLAIN") for sql, _ in cur.statements)
+    assert cur.settings() == {"enable_indexscan": "off"}
+
+
+def test_compact_index_rescores(monkeypatch):
+    monkeypatch.setattr(vector_index, "_active_spec", vector_index.IndexSpec("halfvec", full_dim=4))
+    monkeypatch.setenv("RESCORE_FACTOR", "3")
+    cur = FakeCursor(plan_rows=0)
+    vector_search(cur, [0.1], FilterSet(), k=5)
+    sql, params = cur.statements[-1]
+    assert "::halfvec(4)" in sql
+    assert params[-2:] == [15, 5]
@@ -0,0 +1,57 @@
+from html_extract import extract
+
+PAGE = """<!doctype html>
+<html><head><title>Residence  permits</title><base href="https://example.org/guide/"></head>
+<body>
+  <header><a href="/">Home</a></header>
+  <nav><a href="/a">A</a> <a href="/b">B</a></nav>
+  <div class="cookie-banner">We use cookies.</div>
+  <p>Applicants need a valid passport.<br>Fees are due on application.</p>
+  <div class="intro"><h2>Family reunification</h2><p>Spouses may join after one year.</p></div>
+  <ul class="links"><li><a href="rules.html#top">Rules</a></li><li><a href="faq.html">FAQ</a></li></ul>
+  <a href="mailto:office@example.org">Mail</a> <a rel="nofollow" href="/login">Log in</a>
+  <script>var tracking = 1;</script>
+  <footer>© Example</footer>
+</body></html>"""
+
+
+def test_boilerplate_is_dropped():
+    page = extract(PAGE, "https://example.org/guide/index.html")
+    assert page.title == "Residence permits"
+    assert page.text == ("Residence permits\n\n"
+                         "Applicants need a valid passport.\nFees are due on application.\n\n"
+                         "Family reunification\n\n"
+                         "Spouses may join after one year.\n\n"
+                         "Mail Log in")
+    assert not page.noindex
+
+
+def test_boilerplate_names_dont_drop_most_of_the_page():
+    body = "<p>" + "Long guidance text. " * 20 + "</p>"
+    html = f'<html><body><div class="page has-sidebar">{body}</div><div class="sidebar">Related</div></body></html>'
+    assert extract(html, "https://example.org/").text == ("Long guidance text. " * 20).strip()
+
+
+def test_links_resolve_against_base_without_fragments():
+    page = extract(PAGE, "https://example.org/guide/index.html")
+    assert page.links == ["https://example.org/", "https://example.org/a", "https://example.org/b",
+                          "https://example.org/guide/rules.html", "https://example.org/guide/faq.html"]
+
+
+def test_marked_main_content_wins():
+    html = ("<html><body><div>Site chrome text that is long enough to matter.</div>"
+            "<main><header>Article header</header><p>The actual content.</p></main></body></html>")
+    assert extract(html, "https://example.org/").text == "Article header\n\nThe actual content."
+
+
+def test_robots_meta():
+    html = '<html><head><meta name="robots" content="noindex, nofollow"></head><body><p>x</p><a href="/y">y</a></body></html>'
+    page = extract(html, "https://example.org/")
+    assert page.noindex and page.links == []
+
+
+def test_encoding_and_garbage():
+    latin = "<html><body><p>Gebühren</p></body></html>".encode("latin-1")
+    assert extract(latin, "https://example.org/", encoding="latin-1").text == "Gebühren"   # libxml2 wants ISO-8859-1
+    assert extract(latin, "https://example.org/", encoding="no-such-charset").text.startswith("Geb")
+    assert extract("", "https://example.org/").text == ""
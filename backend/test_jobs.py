@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from datetime import timedelta
+
+import psycopg2
+import pytest
+from fastapi import HTTPException
+
+import db
+import jobs
+from jobs import JobQueue, get_job
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    monkeypatch.setattr(jobs, "_memory", {})
+    queue = JobQueue(workers=2)
+    queue.start()
+    yield queue
+    queue.stop()
+
+
+def run(queue: JobQueue, fn, *args) -> dict:
+    job_id = queue.submit("test", "source", fn, *args, params={"p": 1})
+    while (record := get_job(job_id))["finished_at"] is None:
+        time.sleep(0.01)
+    return record
+
+
+def test_job_succeeds_with_progress_and_result(memory):
+    def fn(job, n):
+        job.progress(pages_extracted=n, chunks_embedded=2 * n)
+        return {"detail": "done"}
+
+    record = run(memory, fn, 3)
+    assert record["status"] == "succeeded"
+    assert (record["pages_extracted"], record["chunks_embedded"], record["rows_written"]) == (3, 6, 0)
+    assert record["result"] == {"detail": "done"}
+    assert record["params"] == {"p": 1}
+    assert record["started_at"] <= record["finished_at"]
+
+
+def test_job_failure_is_recorded(memory):
+    def fn(job):
+        raise RuntimeError("no pages")
+
+    record = run(memory, fn)
+    assert (record["status"], record["error"], record["result"]) == ("failed", "no pages", None)
+
+
+def test_parts_add_up(memory):
+    def fn(job):
+        job.part("a").progress(pages_extracted=2)
+        job.part("b").progress(pages_extracted=3)
+        job.part("a").progress(pages_extracted=4)
+        with pytest.raises(ValueError):
+            job.progress(bogus=1)
+
+    assert run(memory, fn)["pages_extracted"] == 7
+
+
+def test_finished_jobs_are_pruned(memory, monkeypatch):
+    monkeypatch.setenv("JOB_MEMORY_MAX", "2")
+    release = threading.Event()
+    running = memory.submit("test", "slow", lambda job: release.wait(5))
+    try:
+        done = [run(memory, lambda job: None)["id"] for _ in range(4)]
+        assert [get_job(j) is not None for j in done] == [False, False, True, True]
+        assert get_job(running)["status"] == "running"   # unfinished jobs are never dropped
+
+        monkeypatch.setenv("JOB_MEMORY_TTL", "60")
+        jobs._memory[done[-2]]["finished_at"] -= timedelta(minutes=5)
+        latest = memory.submit("test", "source", lambda job: None)
+        assert get_job(done[-2]) is None and get_job(done[-1]) is not None
+        assert get_job(latest) is not None
+    finally:
+        release.set()
+
+
+# ── Heartbeats, against the database the DB_* env vars point at ──
+@pytest.fixture
+def database(monkeypatch):
+    if not os.getenv("DB_NAME"):
+        pytest.skip("set DB_* to a scratch Postgres")
+    monkeypatch.setattr(jobs, "_memory", None)
+    monkeypatch.setenv("JOB_HEARTBEAT_SECONDS", "0.2")
+    try:
+        jobs.ensure_schema()
+    except (psycopg2.Error, HTTPException) as e:   # HTTPException: the pool couldn't connect
+        pytest.skip(f"database unavailable: {e}")
+    ids = []
+    yield ids
+    with db.get_cursor(commit=True) as cur:
+        cur.execute("DELETE FROM ingest_jobs WHERE id = ANY(%s)", (ids,))
+    db.close_pool()
+
+
+def test_heartbeat_keeps_running_jobs_and_fails_lost_ones(database):
+    with db.get_cursor(commit=True) as cur:
+        cur.execute("INSERT INTO ingest_jobs (id, kind, source, status, owner, heartbeat_at) "
+                    "VALUES ('test-lost', 'test', 'x', 'running', 'gone:1', now() - interval '1 hour')")
+    database.append("test-lost")
+
+    queue = JobQueue(workers=1)
+    queue.start()
+    try:
+        release = threading.Event()
+        job_id = queue.submit("test", "slow", lambda job: release.wait(5))
+        database.append(job_id)
+        time.sleep(1.0)   # five beats: three missed ones would fail it
+        assert get_job(job_id)["status"] == "running"
+        assert get_job("test-lost")["status"] == "failed"
+        release.set()
+        queue._queue.join()
+        assert get_job(job_id)["status"] == "succeeded"
+    finally:
+        queue.stop()
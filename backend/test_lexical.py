@@ -0,0 +1,56 @@
+from filters import FilterSet
+from lexical import candidate_count, lexical_query, rrf_fuse
+
+
+def test_rrf_scores_sum_over_rankings():
+    vector  = [(1, "a"), (2, "b"), (3, "c")]
+    lexical = [(3, "c"), (4, "d"), (1, "a")]
+    # a: 1/61 + 1/63, c: 1/63 + 1/61, b: 1/62, d: 1/62; ties keep first-seen order
+    assert rrf_fuse([vector, lexical], k=4, rrf_k=60) == [("a",), ("c",), ("b",), ("d",)]
+
+
+def test_rrf_agreement_beats_one_top_rank():
+    vector  = [(1, "a"), (2, "b")]
+    lexical = [(3, "c"), (2, "b")]
+    assert rrf_fuse([vector, lexical], k=1, rrf_k=60) == [("b",)]
+
+
+def test_rrf_keeps_the_first_ranking_row():
+    # the same id can carry different distances in each ranking; the first one wins
+    assert rrf_fuse([[(7, "x", 0.1)], [(7, "x", 0.9)]], k=5) == [("x", 0.1)]
+
+
+def test_rrf_k_from_env(monkeypatch):
+    monkeypatch.setenv("RRF_K", "0")
+    # with no smoothing, rank 1 in one list (1/1) outweighs rank 2 in both (1/2 + 1/2)
+    vector  = [(1, "a"), (2, "b")]
+    lexical = [(3, "c"), (2, "b")]
+    assert rrf_fuse([vector, lexical], k=3)[0] == ("a",)
+
+
+def test_rrf_empty():
+    assert rrf_fuse([[], []], k=5) == []
+
+
+def test_candidate_count(monkeypatch):
+    monkeypatch.setenv("HYBRID_CANDIDATES", "4")
+    assert candidate_count(5) == 20
+    monkeypatch.setenv("HYBRID_CANDIDATES", "0")
+    assert candidate_count(5) == 5
+
+
+def test_lexical_query_params_line_up(monkeypatch):
+    monkeypatch.setenv("LEXICAL_STOPWORD_CONFIGS", "english,german")
+    monkeypatch.setenv("LEXICAL_CANDIDATES", "1000")
+    sql, params = lexical_query("visa rules", [0.5], FilterSet(country="Germany", embedding_model="m"), 10,
+                                ("id", "filename"))
+    assert sql.count("%s") == len(params)
+    assert params == ["visa rules", "english", "german", "germany", "m", 1000, 10, [0.5]]
+
+
+def test_lexical_candidates_at_least_k(monkeypatch):
+    monkeypatch.setenv("LEXICAL_CANDIDATES", "10")
+    monkeypatch.setenv("LEXICAL_STOPWORD_CONFIGS", "")
+    sql, params = lexical_query("q", [0.5], FilterSet(), 50, ("id",))
+    assert "WHERE TRUE" in sql
+    assert params == ["q", 50, 50, [0.5]]
@@ -0,0 +1,133 @@
+import os
+from datetime import date
+
+import numpy as np
+import pytest
+
+from filters import FilterSet
+from local_store import LocalVectorStore, _Column
+
+
+def row(filename: str, vector, country: str = "Germany", model: str = "m", text: str = None) -> dict:
+    return {
+        "filename": filename, "full_text": text or f"text of {filename}", "content_embedding": vector,
+        "country": country, "job_area": "IT", "source_type": "PDF", "embedding_model": model,
+        "creation_date": date(2024, 1, 2),
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalVectorStore(str(tmp_path), hnsw=False)
+    store.append([
+        row("a.pdf", [1.0, 0.0], country="Germany"),
+        row("a.pdf", [0.9, 0.1], country="Germany"),
+        row("b.pdf", [0.0, 1.0], country=" india "),
+        row("c.pdf", [0.7, 0.7], country="New  Zealand", model="other"),
+    ])
+    return store
+
+
+def names(rows):
+    return [r[0] for r in rows]
+
+
+def test_search_ranks_by_cosine_distance(store):
+    rows = store.search([1.0, 0.0], FilterSet(), k=3)
+    assert names(rows) == ["a.pdf", "a.pdf", "c.pdf"]
+    assert rows[0][2] == pytest.approx(0.0, abs=1e-6)
+    assert [r[2] for r in rows] == sorted(r[2] for r in rows)
+
+
+def test_filters_build_the_mask(store):
+    assert names(store.search([1.0, 0.0], FilterSet(country="INDIA"), k=5)) == ["b.pdf"]
+    assert names(store.search([1.0, 0.0], FilterSet(country="new zea*"), k=5)) == ["c.pdf"]
+    assert names(store.search([1.0, 0.0], FilterSet(country=["india", "*zeal*"]), k=5)) == ["c.pdf", "b.pdf"]
+    assert names(store.search([1.0, 0.0], FilterSet(filenames=["b.pdf"]), k=5)) == ["b.pdf"]
+    assert store.search([1.0, 0.0], FilterSet(country="France"), k=5) == []
+
+
+def test_embedding_model_is_part_of_the_mask(store):
+    assert "c.pdf" not in names(store.search([1.0, 0.0], FilterSet(embedding_model="m"), k=5))
+    assert names(store.search([1.0, 0.0], FilterSet(embedding_model="other"), k=5)) == ["c.pdf"]
+
+
+def test_columns_and_sidecar_fields(store):
+    [hit] = store.search([0.0, 1.0], FilterSet(), k=1, columns=("id", "filename", "country", "creation_date"))
+    assert hit[:4] == (2, "b.pdf", " india ", "2024-01-02")
+
+
+def test_delete_sets_tombstones(store, tmp_path):
+    assert store.delete("a.pdf") == 2
+    assert store.delete("a.pdf") == 0
+    assert store.delete("missing.pdf") == 0
+    assert "a.pdf" not in names(store.search([1.0, 0.0], FilterSet(), k=5))
+    assert list(np.fromfile(tmp_path / "deleted.u8", dtype=np.uint8)) == [1, 1, 0, 0]
+    assert store.stats()["rows"] == 2
+    assert store.stats()["deleted"] == 2
+
+
+def test_delete_before_keeps_newer_rows(store):
+    # re-ingesting a file appends its new rows, then drops the ones before them
+    new_rows = store.count
+    store.append([row("a.pdf", [1.0, 0.0], text="new text")])
+    assert store.delete("a.pdf", before=new_rows) == 2
+    assert store.search([1.0, 0.0], FilterSet(filenames=["a.pdf"]), k=5, columns=("full_text",))[0][0] == "new text"
+
+
+def test_tombstones_survive_reopening(store, tmp_path):
+    store.delete("b.pdf")
+    reopened = LocalVectorStore(str(tmp_path), hnsw=False)
+    assert reopened.count == 4
+    assert "b.pdf" not in names(reopened.search([0.0, 1.0], FilterSet(), k=5))
+    assert reopened.filenames(FilterSet()) == ["c.pdf", "a.pdf"]
+
+
+def test_compact_drops_deleted_rows(store, tmp_path):
+    store.delete("a.pdf")
+    assert store.compact() == 2
+    assert store.compact() == 0
+    assert store.count == 2
+    assert names(store.search([1.0, 0.0], FilterSet(), k=5)) == ["c.pdf", "b.pdf"]
+    assert os.path.getsize(tmp_path / "vectors.f32") == 2 * 2 * 4
+    assert names(LocalVectorStore(str(tmp_path), hnsw=False).search([1.0, 0.0], FilterSet(), k=5)) == ["c.pdf", "b.pdf"]
+
+
+def test_torn_append_is_dropped_on_reopen(store, tmp_path):
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.asarray([0.5, 0.5], dtype=np.float32).tobytes())
+    with open(tmp_path / "rows.jsonl", "ab") as f:
+        f.write(b'{"filename": "torn.pdf"')
+    reopened = LocalVectorStore(str(tmp_path), hnsw=False)
+    assert reopened.count == 4
+    assert "torn.pdf" not in reopened.filenames(FilterSet())
+
+
+def test_field_values_use_one_label_per_key(store):
+    store.append([row("d.pdf", [0.5, 0.5], country="germany ")])
+    assert store.field_values("country") == [" india ", "Germany", "New  Zealand"]
+    store.delete("b.pdf")
+    assert " india " not in store.field_values("country")
+
+
+def test_dimension_mismatch(store):
+    with pytest.raises(ValueError):
+        store.append([row("x.pdf", [1.0, 0.0, 0.0])])
+
+
+def test_column_codes_grow():
+    column = _Column()
+    for i in range(3000):
+        column.set(i, column.code(f"v{i % 3}"))
+    assert column.keys == ["v0", "v1", "v2"]
+    assert list(column.codes[:6]) == [0, 1, 2, 0, 1, 2]
+    assert column.lookup("v1") == 1 and column.lookup("v9") is None
+
+
+def test_unwritten_store_leaves_no_files(tmp_path):
+    path = tmp_path / "vector_store"
+    store = LocalVectorStore(str(path), hnsw=False)
+    assert store.search([1.0, 0.0], FilterSet(), k=5) == []
+    assert store.filenames(FilterSet()) == []
+    assert (store.delete("a.pdf"), store.compact()) == (0, 0)
+    assert not path.exists()
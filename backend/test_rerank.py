@@ -0,0 +1,79 @@
+import asyncio
+import sys
+import time
+import types
+
+from rerank import Reranker, candidate_count
+
+ROWS = [(f"doc{i}.pdf", f"chunk {i}") for i in range(8)]
+
+
+class FakeModel:
+    """Scores a pair by the number in the chunk text: chunk 7 is the best match."""
+
+    def __init__(self, pair_seconds: float = 0.0):
+        self.pair_seconds = pair_seconds
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        time.sleep(self.pair_seconds * len(pairs))
+        self.pairs += len(pairs)
+        return [float(text.split()[-1]) for _, text in pairs]
+
+
+def reranker(model=None, budget_ms: float = 1000, batch_size: int = 2) -> Reranker:
+    r = Reranker(model_name="fake", budget_ms=budget_ms, batch_size=batch_size)
+    r.model = model
+    return r
+
+
+def rerank(r: Reranker, k: int = 8) -> list[str]:
+    return [text for _, text in asyncio.run(r.rerank("question", ROWS, 1, k))]
+
+
+def test_candidate_count(monkeypatch):
+    monkeypatch.setenv("RERANK_CANDIDATES", "30")
+    assert (candidate_count(5), candidate_count(50)) == (30, 50)
+
+
+def test_within_budget_everything_is_reordered():
+    r = reranker(FakeModel())
+    assert rerank(r, k=3) == ["chunk 7", "chunk 6", "chunk 5"]
+    assert r.info()["pairs_scored"] == 8 and r.info()["degraded"] == 0
+    assert r.info()["pair_ms"] is not None
+
+
+def test_without_a_model_first_stage_order_is_kept():
+    r = reranker()
+    assert rerank(r) == [text for _, text in ROWS]
+    assert r.stats["degraded"] == 1
+
+
+def test_budget_cuts_scoring_short():
+    model = FakeModel(pair_seconds=0.01)
+    r = reranker(model, budget_ms=35, batch_size=2)
+    order = rerank(r)
+    scored = r.stats["pairs_scored"]
+    assert scored < len(ROWS) and r.stats["degraded"] == 1
+    # the scored prefix is reordered, the rest keeps first-stage order behind it
+    assert order[:scored] == [f"chunk {i}" for i in reversed(range(scored))]
+    assert order[scored:] == [f"chunk {i}" for i in range(scored, len(ROWS))]
+
+
+def test_measured_cost_sizes_the_next_request():
+    model = FakeModel()
+    r = reranker(model, budget_ms=100)
+    r._pair_ms = 30.0   # a slow model: only three pairs fit in 100 ms
+    rerank(r)
+    assert model.pairs == 3
+
+
+def test_load_failure_degrades(monkeypatch):
+    def broken(*args, **kwargs):
+        raise OSError("model not found")
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(CrossEncoder=broken))
+    r = Reranker(model_name="missing")
+    r.load()
+    assert r.model is None and r.error == "model not found"
+    assert rerank(r) == [text for _, text in ROWS]
@@ -0,0 +1,71 @@
+import os
+import threading
+
+import psycopg2
+import pytest
+from fastapi import HTTPException
+
+import db
+import schema
+
+
+class RecordingCursor:
+    def __init__(self, columns):
+        self.columns = columns
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def fetchall(self):
+        return [(name,) for name in self.columns]
+
+
+def test_missing_columns_are_added_in_one_statement():
+    cur = RecordingCursor(["filename", "full_text", "metadata", "content_hash", "document_hash"])
+    schema.add_columns(cur)
+    [alter] = [sql for sql in cur.statements if sql.startswith("ALTER")]
+    assert alter.count("ADD COLUMN") == 6 and alter.count("GENERATED ALWAYS") == 4
+    assert "ADD COLUMN IF NOT EXISTS metadata" not in alter
+
+
+def test_nothing_to_add():
+    cur = RecordingCursor([name for name, _ in schema.DOCUMENTS_COLUMNS])
+    schema.add_columns(cur)
+    assert not any(sql.startswith("ALTER") for sql in cur.statements)
+
+
+# ── Against the database the DB_* env vars point at ──
+@pytest.mark.skipif(not os.getenv("DB_NAME"), reason="set DB_* to a scratch Postgres with pgvector")
+def test_concurrent_startups_restore_dropped_columns_and_indexes(monkeypatch):
+    monkeypatch.setattr(schema, "LOCK_POLL_SECONDS", 0.05)
+    try:
+        schema.ensure_schema()
+        with db.get_cursor(commit=True) as cur:
+            cur.execute("ALTER TABLE documents DROP COLUMN job_area_key")   # and its index
+            cur.execute("DROP INDEX documents_filename_idx")
+    except (psycopg2.Error, HTTPException) as e:   # HTTPException: the pool couldn't connect
+        pytest.skip(f"database unavailable: {e}")
+
+    errors = []
+
+    def start():
+        try:
+            schema.ensure_schema()
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        threads = [threading.Thread(target=start) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+        with db.get_cursor() as cur:
+            assert schema.missing_columns(cur) == []
+            cur.execute("SELECT i.relname FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+                        "WHERE x.indrelid = 'documents'::regclass AND x.indisvalid")
+            assert {name for name, in cur.fetchall()} >= {name for name, _ in schema.DOCUMENTS_INDEXES}
+    finally:
+        db.close_pool()
@@ -0,0 +1,134 @@
+import asyncio
+
+import openai
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from fastapi import FastAPI, UploadFile
+from fastapi.testclient import TestClient
+
+import http_client
+import transcription
+from transcription import BodySizeLimit, TranscriptionError, extension, segment_seconds
+
+
+def test_extension():
+    assert extension("memo.M4A", None) == ".m4a"
+    assert extension("blob", "audio/mpeg; codecs=mp3") == ".mp3"
+    assert extension(None, None) == ".webm"
+
+
+def test_segment_seconds(monkeypatch):
+    monkeypatch.setenv("TRANSCRIBE_SEGMENT_SECONDS", "600")
+    assert segment_seconds(10**6, 3600) == 600
+    # 200 MB over an hour: segments short enough to average under the upstream limit
+    assert segment_seconds(200 * 10**6, 3600) == pytest.approx(3600 * transcription.SEGMENT_TARGET_BYTES / (200 * 10**6))
+    assert segment_seconds(10**10, 3600) == 10.0
+    assert segment_seconds(50 * 10**6, None) == 600
+
+
+# ── Splitting and joining ──
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / "memo.webm"
+    path.write_bytes(b"\0" * 1000)
+    return str(path)
+
+
+def test_long_recording_is_split_and_joined_in_order(recording, monkeypatch):
+    running, peak = 0, 0
+
+    async def duration(path):
+        return 1500.0
+
+    async def split(path, seconds):
+        assert seconds == 600
+        parts = []
+        for i in range(3):
+            part = path.replace(".webm", f".part{i:04d}.webm")
+            open(part, "wb").write(b"\0" * 10)
+            parts.append(part)
+        return parts
+
+    async def transcribe_segment(path, content_type):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05 if path.endswith("0000.webm") else 0.01)   # the first finishes last
+        running -= 1
+        return f"[{path[-9:-5]}]" if not path.endswith("0001.webm") else ""
+
+    monkeypatch.setattr(transcription.shutil, "which", lambda name: f"/usr/bin/{name}")
+    monkeypatch.setattr(transcription, "probe_duration", duration)
+    monkeypatch.setattr(transcription, "split", split)
+    monkeypatch.setattr(transcription, "transcribe_segment", transcribe_segment)
+    monkeypatch.setenv("TRANSCRIBE_SEGMENT_SECONDS", "600")
+    monkeypatch.setenv("TRANSCRIBE_CONCURRENCY", "2")
+
+    result = asyncio.run(transcription.transcribe(recording))
+    assert result == {"text": "[0000] [0002]", "segments": 3}
+    assert peak == 2
+
+
+def test_without_ffmpeg_oversized_recordings_are_refused(recording, monkeypatch):
+    monkeypatch.setattr(transcription.shutil, "which", lambda name: None)
+    monkeypatch.setattr(transcription, "UPSTREAM_MAX_BYTES", 100)
+    with pytest.raises(TranscriptionError) as e:
+        asyncio.run(transcription.transcribe(recording))
+    assert e.value.status_code == 413 and "install ffmpeg" in str(e.value)
+
+
+def test_empty_recording(tmp_path):
+    (tmp_path / "empty.webm").write_bytes(b"")
+    with pytest.raises(TranscriptionError) as e:
+        asyncio.run(transcription.transcribe(str(tmp_path / "empty.webm")))
+    assert e.value.status_code == 400
+
+
+# ── Upstream requests ──
+def test_transcribe_segment_retries_server_errors(recording, monkeypatch):
+    calls = []
+
+    async def endpoint(request):
+        form = await request.post()
+        calls.append((form["model"], form["language"], form["file"].filename, len(form["file"].file.read())))
+        if len(calls) == 1:
+            return web.Response(status=503, text="busy")
+        return web.json_response({"text": " hello world "})
+
+    monkeypatch.setattr(transcription.random, "random", lambda: -0.5)   # no backoff delay
+    monkeypatch.setenv("TRANSCRIBE_LANGUAGE", "de")
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/v1/audio/transcriptions", endpoint)
+        async with TestServer(app) as server:
+            monkeypatch.setattr(openai, "api_base", str(server.make_url("/v1")))
+            try:
+                return await transcription.transcribe_segment(recording, "audio/webm")
+            finally:
+                await http_client.close_session()
+
+    assert asyncio.run(scenario()) == "hello world"
+    assert calls == [("whisper-1", "de", "memo.webm", 1000)] * 2
+
+
+# ── Upload limit ──
+def test_body_size_limit():
+    api = FastAPI()
+
+    @api.post("/upload")
+    async def upload(file: UploadFile):
+        return {"size": len(await file.read())}
+
+    client = TestClient(BodySizeLimit(api, limits={"/upload": 1000}))
+    assert client.post("/upload", files={"file": ("a.webm", b"\0" * 100)}).json() == {"size": 100}
+    assert client.post("/upload", files={"file": ("a.webm", b"\0" * 2000)}).status_code == 413
+
+    def chunks():   # no Content-Length: refused once the body read so far passes the limit
+        for _ in range(20):
+            yield b"\0" * 100
+
+    response = client.post("/upload", content=chunks(),
+                           headers={"Content-Type": "multipart/form-data; boundary=x"})
+    assert response.status_code == 413
@@ -0,0 +1,81 @@
+import os
+import time
+
+import pytest
+
+import tts_cache
+from tts_cache import AudioCache, audio_key, build_tts_cache
+
+
+def test_audio_key_collapses_whitespace_only():
+    assert audio_key("Hello  world\n", "alloy", "tts-1") == audio_key(" Hello world", "alloy", "tts-1")
+    # case changes how text is spoken ("US" / "us"), so it's part of the key
+    assert audio_key("US", "alloy", "tts-1") != audio_key("us", "alloy", "tts-1")
+
+
+@pytest.mark.parametrize("change", [{"voice": "nova"}, {"model": "tts-1-hd"}, {"fmt": "wav"}])
+def test_audio_key_covers_voice_model_and_format(change):
+    base = {"text": "hi", "voice": "alloy", "model": "tts-1", "fmt": "mp3"}
+    assert audio_key(**base) != audio_key(**{**base, **change})
+
+
+def test_put_then_get(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1000)
+    assert cache.get("k") is None
+    cache.put("k", b"audio")
+    with open(cache.get("k"), "rb") as f:
+        assert f.read() == b"audio"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_aborted_writer_leaves_nothing(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1000)
+    writer = cache.writer("k")
+    writer.write(b"half of the aud")
+    writer.abort()
+    assert cache.get("k") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_eviction_drops_least_recently_played(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    cache.get("a")
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert cache.stats()["evictions"] == 1
+    assert sorted(os.listdir(tmp_path)) == ["a.audio", "c.audio"]
+
+
+def test_oversized_audio_isnt_kept(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=3)
+    cache.put("k", b"too long")
+    assert cache.get("k") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_restart_keeps_entries_and_fresh_part_files(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1000)
+    cache.put("k", b"audio")
+    fresh = tmp_path / "writing.part"
+    fresh.write_bytes(b"another process is writing this")
+    stale = tmp_path / "crashed.part"
+    stale.write_bytes(b"left over")
+    old = time.time() - tts_cache.PART_GRACE_SECONDS - 60
+    os.utime(stale, (old, old))
+
+    reopened = AudioCache(str(tmp_path), max_bytes=1000)
+    assert reopened.get("k")
+    assert fresh.exists()
+    assert not stale.exists()
+
+
+def test_build_tts_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("TTS_CACHE_MAX_MB", "0")
+    assert build_tts_cache() is None
+    monkeypatch.setenv("TTS_CACHE_MAX_MB", "1")
+    monkeypatch.setenv("TTS_CACHE_DIR", str(tmp_path / "tts"))
+    assert build_tts_cache().max_bytes == 2**20
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+import uuid
+
+import psycopg2
+import pytest
+from fastapi import HTTPException
+
+import db
+import vector_index
+from vector_index import IndexSpec, ideal_lists, search_settings
+
+
+def test_ideal_lists():
+    assert ideal_lists(10) == 1
+    assert ideal_lists(500_000) == 500
+    assert ideal_lists(4_000_000) == 2000
+
+
+def test_search_settings():
+    assert search_settings(10) is None
+    sql, params = search_settings(100, probes=5)
+    assert sql == "SELECT set_config(%s, %s, true), set_config(%s, %s, true)"
+    assert params == ["hnsw.ef_search", "100", "ivfflat.probes", "5"]
+    assert search_settings(10, ef_search=80, exact=True) == ("SELECT set_config(%s, %s, true)",
+                                                             ["enable_indexscan", "off"])
+
+
+def test_index_spec():
+    full = IndexSpec()
+    assert not full.compact and full.order_by("e") == "e <=> %s::vector" and full.rescore_candidates(5) == 5
+    half = IndexSpec("halfvec", 256, 1536)
+    assert half.suffix == "_halfvec_256"
+    assert half.expression("e") == "(subvector(e, 1, 256))::halfvec(256)"
+    assert half.rescore_candidates(5) == 20
+    binary = IndexSpec("binary", full_dim=1536)
+    assert (binary.operator, binary.opclass) == ("<~>", "bit_hamming_ops")
+    with pytest.raises(ValueError):
+        IndexSpec("binary")
+
+
+# ── Builds and swaps, on a scratch table in the database the DB_* env vars point at ──
+@pytest.fixture
+def table():
+    if not os.getenv("DB_NAME"):
+        pytest.skip("set DB_* to a scratch Postgres with pgvector")
+    name = f"test_vi_{uuid.uuid4().hex[:12]}"
+    try:
+        with db.get_cursor(commit=True) as cur:
+            cur.execute(f"CREATE TABLE {name} (id serial PRIMARY KEY, emb vector(3))")
+            cur.execute(f"INSERT INTO {name} (emb) SELECT ARRAY[random(), random(), random()]::vector "
+                        f"FROM generate_series(1, 2000)")
+    except (psycopg2.Error, HTTPException) as e:   # HTTPException: the pool couldn't connect
+        pytest.skip(f"database unavailable: {e}")
+    yield name
+    with db.get_cursor(commit=True) as cur:
+        cur.execute(f"DROP TABLE {name}")
+    db.close_pool()
+
+
+def valid_indexes(cur, table: str) -> int:
+    cur.execute("SELECT count(*) FROM pg_index WHERE indrelid = %s::regclass AND indisvalid "
+                "AND indexrelid <> %s::regclass", (table, f"{table}_pkey"))
+    return cur.fetchone()[0]
+
+
+def test_rebuild_swaps_without_a_gap(table):
+    vector_index.create_index("hnsw", table, "emb", m=4, ef_construction=8)
+    seen, stop = [], threading.Event()
+
+    def watch():
+        conn = psycopg2.connect(**db.connection_kwargs())
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            while not stop.is_set():
+                seen.append(valid_indexes(cur, table))
+        conn.close()
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    try:
+        for _ in range(3):
+            built = vector_index.create_index("hnsw", table, "emb", m=4, ef_construction=8)
+    finally:
+        stop.set()
+        watcher.join()
+    assert built["name"] == f"{table}_emb_hnsw_idx"
+    assert seen and min(seen) >= 1   # an index served queries throughout
+    assert [ix["name"] for ix in vector_index.list_indexes(table, "emb")] == [built["name"]]
+
+    ivf = vector_index.create_index("ivfflat", table, "emb")
+    assert ivf["options"] == {"lists": 2}
+    assert vector_index.drop_indexes(table, "emb", keep=ivf["name"]) == [built["name"]]
+
+
+def test_maintenance_lock_serializes_connections(table, monkeypatch):
+    monkeypatch.setattr(vector_index, "LOCK_POLL_SECONDS", 0.05)
+    events = []
+
+    def hold(tag: str):
+        with vector_index.maintenance_lock(table, "emb"):
+            events.append(f"{tag} in")
+            with vector_index.maintenance_lock(table, "emb"):   # re-entrant within a thread
+                time.sleep(0.2)
+            events.append(f"{tag} out")
+
+    threads = [threading.Thread(target=hold, args=(tag,)) for tag in "ab"]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert events in (["a in", "a out", "b in", "b out"], ["b in", "b out", "a in", "a out"])
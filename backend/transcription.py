@@ -0,0 +1,197 @@
+"""
+Speech-to-text for /api/transcribe.
+
+The upload is spooled to a temporary file (never held in memory whole) and
+posted to OpenAI's /v1/audio/transcriptions over the shared aiohttp session
+(see http_client.py), streamed from disk. Recordings longer than
+TRANSCRIBE_SEGMENT_SECONDS, or larger than the API's 25 MB request limit, are
+cut into segments with ffmpeg (stream copy, no re-encoding), transcribed in
+parallel and joined in order. Without ffmpeg on PATH a recording is sent
+whole, and ones over the API limit are rejected.
+
+`BodySizeLimit` refuses oversized uploads before they are read: from the
+Content-Length header when there is one, otherwise as soon as the body
+received so far passes the limit.
+
+    TRANSCRIBE_MODEL             transcription model                (default whisper-1)
+    TRANSCRIBE_LANGUAGE          spoken language hint, "" to detect (default en)
+    TRANSCRIBE_MAX_MB            largest accepted upload in MiB     (default 200)
+    TRANSCRIBE_SEGMENT_SECONDS   segment length for long recordings (default 600)
+    TRANSCRIBE_CONCURRENCY       segments transcribed at once       (default 4)
+"""
+import asyncio
+import glob
+import os
+import random
+import shutil
+from typing import Optional
+
+import aiohttp
+import openai
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+import http_client
+
+UPSTREAM_MAX_BYTES = 25 * 10**6   # the API's request size limit
+# leave room for the multipart framing and for segments a little over the average
+SEGMENT_TARGET_BYTES = int(UPSTREAM_MAX_BYTES * 0.8)
+MAX_RETRIES = 2
+
+CONTENT_TYPES = {
+    ".webm": "audio/webm", ".ogg": "audio/ogg", ".mp3": "audio/mpeg", ".mp4": "audio/mp4",
+    ".m4a": "audio/mp4", ".wav": "audio/wav", ".flac": "audio/flac", ".mpga": "audio/mpeg",
+}
+
+
+class TranscriptionError(Exception):
+    def __init__(self, detail: str, status_code: int = 500):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+def max_upload_bytes() -> int:
+    return int(float(os.getenv("TRANSCRIBE_MAX_MB", "200")) * 2**20)
+
+
+def extension(filename: Optional[str], content_type: Optional[str]) -> str:
+    """The file extension the API and ffmpeg should see (they go by it to pick a decoder)."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in CONTENT_TYPES:
+        return ext
+    for known, ctype in CONTENT_TYPES.items():
+        if content_type and content_type.split(";")[0].strip() == ctype:
+            return known
+    return ".webm"   # what the Dashboard's MediaRecorder produces
+
+
+# ── Upload size limit ──
+class BodySizeLimit:
+    """ASGI middleware: 413 for request bodies over `limits[path]` bytes, before they are read."""
+
+    def __init__(self, app, limits: dict[str, int]):
+        self.app    = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            response = JSONResponse({"detail": f"Upload larger than {limit // 2**20} MiB"}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing as they are
+                    raise HTTPException(status_code=413, detail=f"Upload larger than {limit // 2**20} MiB")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# ── Segmenting (ffmpeg) ──
+async def _run(*cmd: str) -> bytes:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, err = await proc.communicate()
+    if proc.returncode != 0:
+        raise TranscriptionError(f"{os.path.basename(cmd[0])} failed: {err.decode(errors='replace')[-300:]}")
+    return out
+
+
+async def probe_duration(path: str) -> Optional[float]:
+    """Seconds of audio, or None when the container doesn't say (MediaRecorder webm often doesn't)."""
+    if not shutil.which("ffprobe"):
+        return None
+    out = await _run("ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path)
+    try:
+        return float(out.strip())
+    except ValueError:
+        return None
+
+
+def segment_seconds(size: int, duration: Optional[float]) -> float:
+    seconds = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "600"))
+    if duration and size > SEGMENT_TARGET_BYTES:
+        # short enough that an average segment stays under the API limit
+        seconds = min(seconds, duration * SEGMENT_TARGET_BYTES / size)
+    return max(10.0, seconds)
+
+
+async def split(path: str, seconds: float) -> list[str]:
+    """Cut `path` into `seconds`-long pieces next to it, without re-encoding."""
+    stem, ext = os.path.splitext(path)
+    await _run(
+        "ffmpeg", "-v", "error", "-i", path, "-map", "0:a", "-c", "copy",
+        "-f", "segment", "-segment_time", f"{seconds:.3f}", "-reset_timestamps", "1",
+        f"{stem}.part%04d{ext}",
+    )
+    return sorted(glob.glob(f"{glob.escape(stem)}.part*{ext}"))
+
+
+# ── Upstream ──
+async def transcribe_segment(path: str, content_type: str) -> str:
+    session = await http_client.init_session()
+    url     = f"{openai.api_base}/audio/transcriptions"
+    headers = {"Authorization": f"Bearer {openai.api_key}"}
+    language = os.getenv("TRANSCRIBE_LANGUAGE", "en")
+    attempt = 0
+    while True:
+        form = aiohttp.FormData()
+        form.add_field("model", os.getenv("TRANSCRIBE_MODEL", "whisper-1"))
+        if language:
+            form.add_field("language", language)
+        with open(path, "rb") as f:
+            # aiohttp streams the file object; it is read in chunks as the request goes out
+            form.add_field("file", f, filename=os.path.basename(path), content_type=content_type)
+            async with session.post(url, data=form, headers=headers,
+                                    timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=300)) as resp:
+                if resp.status == 200:
+                    return (await resp.json(content_type=None))["text"].strip()
+                body = (await resp.text())[:300]
+        retryable = resp.status == 429 or resp.status >= 500
+        if not retryable or attempt >= MAX_RETRIES:
+            raise TranscriptionError(f"upstream returned {resp.status}: {body}")
+        attempt += 1
+        await asyncio.sleep((2 ** attempt) * (0.5 + random.random()))
+
+
+async def transcribe(path: str, content_type: Optional[str] = None) -> dict:
+    """Transcript of the audio file at `path`, split and transcribed in parallel when long."""
+    ext = os.path.splitext(path)[1]
+    content_type = content_type or CONTENT_TYPES.get(ext, "application/octet-stream")
+    size = os.path.getsize(path)
+    if size == 0:
+        raise TranscriptionError("Empty recording", status_code=400)
+
+    segments = [path]
+    if shutil.which("ffmpeg"):
+        duration = await probe_duration(path)
+        seconds = segment_seconds(size, duration)
+        if size > UPSTREAM_MAX_BYTES or (duration is not None and duration > seconds):
+            segments = await split(path, seconds)
+    if any(os.path.getsize(s) > UPSTREAM_MAX_BYTES for s in segments):
+        detail = ("Recording exceeds the transcription API's 25 MB limit" if len(segments) == 1
+                  else "A segment exceeds the 25 MB limit; lower TRANSCRIBE_SEGMENT_SECONDS")
+        if not shutil.which("ffmpeg"):
+            detail += " (install ffmpeg to split long recordings)"
+        raise TranscriptionError(detail, status_code=413)
+
+    limit = asyncio.Semaphore(int(os.getenv("TRANSCRIBE_CONCURRENCY", "4")))
+
+    async def one(segment: str) -> str:
+        async with limit:
+            return await transcribe_segment(segment, content_type)
+
+    texts = await asyncio.gather(*(one(s) for s in segments))
+    return {"text": " ".join(t for t in texts if t), "segments": len(segments)}
@@ -0,0 +1,165 @@
+"""
+On-disk cache of synthesized speech for /api/tts.
+
+Audio is content-addressed: the file name is a hash of (model, voice, format,
+text with whitespace collapsed), so replaying an answer is a file read instead
+of another synthesis. Unlike query embeddings, case is kept: "US" and "us" are
+spoken differently. New audio is written to a temporary file while it streams to the
+client and only moved into place once the upstream response completed, so a
+cancelled or failed synthesis never leaves a truncated entry. The directory is
+bounded by total size: least recently played files are evicted first (file
+mtimes are touched on every hit, so the order survives restarts). Temporary
+files are only cleaned up at startup once they are PART_GRACE_SECONDS old, as
+another process sharing the directory may still be writing them.
+
+All methods do file I/O; async callers run them on a worker thread.
+
+    TTS_CACHE_DIR     directory of the cache          (default ./tts_cache)
+    TTS_CACHE_MAX_MB  total size bound in MiB         (default 512, 0 disables)
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+SUFFIX = ".audio"
+PART_GRACE_SECONDS = 3600
+
+
+def audio_key(text: str, voice: str, model: str, fmt: str = "mp3") -> str:
+    payload = f"{model}\0{voice}\0{fmt}\0{' '.join(text.split())}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._files    = OrderedDict()   # key -> size, least recently used first
+        self._bytes    = 0
+        self._lock     = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def _scan(self):
+        entries = []
+        stale = time.time() - PART_GRACE_SECONDS
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                st = entry.stat()
+                entries.append((st.st_mtime, entry.name[:-len(SUFFIX)], st.st_size))
+            elif entry.name.endswith(".part") and entry.stat().st_mtime < stale:
+                try:
+                    os.remove(entry.path)   # left over from a crash mid-write
+                except FileNotFoundError:
+                    pass
+        for _, key, size in sorted(entries):
+            self._files[key] = size
+            self._bytes += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached audio, or None."""
+        with self._lock:
+            if key not in self._files:
+                self.misses += 1
+                return None
+            self._files.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:   # removed behind our back
+            with self._lock:
+                self._bytes -= self._files.pop(key, 0)
+            return None
+        return path
+
+    def writer(self, key: str) -> "AudioWriter":
+        return AudioWriter(self, key)
+
+    def put(self, key: str, data: bytes):
+        writer = AudioWriter(self, key)
+        try:
+            writer.write(data)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def _commit(self, key: str, temp_path: str, size: int):
+        if size > self.max_bytes:
+            os.remove(temp_path)
+            return
+        os.replace(temp_path, self._path(key))
+        with self._lock:
+            self._bytes += size - self._files.pop(key, 0)
+            self._files[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._files:
+            key, size = self._files.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "files":     len(self._files),
+                "bytes":     self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "hit_rate":  self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class AudioWriter:
+    """Collects one synthesis; `commit()` publishes it, `abort()` (or never committing) drops it."""
+
+    def __init__(self, cache: AudioCache, key: str):
+        self.cache = cache
+        self.key   = key
+        self.size  = 0
+        fd, self.temp_path = tempfile.mkstemp(dir=cache.directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        self._file.close()
+        self.cache._commit(self.key, self.temp_path, self.size)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+def build_tts_cache() -> Optional[AudioCache]:
+    max_mb = float(os.getenv("TTS_CACHE_MAX_MB", "512"))
+    if max_mb <= 0:
+        return None
+    return AudioCache(os.getenv("TTS_CACHE_DIR", "tts_cache"), int(max_mb * 2**20))
@@ -0,0 +1,431 @@
+"""
+ANN index management and query-time tuning for `documents.content_embedding`.
+
+Retrieval orders by cosine distance (`<=>`), so indexes are built with
+`vector_cosine_ops`. Which index to keep is configured by env vars:
+
+    VECTOR_INDEX                 "hnsw" (default), "ivfflat" or "none"
+    HNSW_M                       graph degree                    (default 16)
+    HNSW_EF_CONSTRUCTION         build-time candidate list       (default 64)
+    IVFFLAT_LISTS                number of lists (default: derived from row count)
+    VECTOR_INDEX_BUILD_MEM       maintenance_work_mem for builds (e.g. "1GB")
+
+The index can hold a compact form of the vectors instead of full float32
+(pgvector >= 0.7), which keeps a large index in RAM: searches scan the compact
+index for RESCORE_FACTOR x k candidates, then rank those exactly against the
+full vectors kept in the table.
+
+    VECTOR_QUANTIZATION          "none" (default), "halfvec" (float16, half the size)
+                                 or "binary" (1 bit per dimension, Hamming distance)
+    VECTOR_INDEX_DIM             index only the leading N dimensions (Matryoshka
+                                 truncation, for text-embedding-3 models; default all)
+    RESCORE_FACTOR               candidates per result to rescore (default 4, binary 10)
+
+Per-request knobs (`ef_search` for HNSW, `probes` for IVFFlat, or `exact` to
+bypass the index) are applied transaction-locally, so they only last for the
+request's transaction.
+
+Builds, swaps and drops on a column take a Postgres advisory lock
+(`maintenance_lock`), so server processes starting together don't race on the
+same temporary index or drop the one another is building.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import db
+
+log = logging.getLogger(__name__)
+
+TABLE  = "documents"
+COLUMN = "content_embedding"
+
+METHODS           = ("hnsw", "ivfflat")
+DEFAULT_EF_SEARCH = 40   # pgvector's default; HNSW returns at most ef_search rows
+IVFFLAT_MIN_ROWS  = 1000  # IVFFlat lists are trained on existing rows; too few gives poor recall
+
+
+def configured_method() -> str:
+    return os.getenv("VECTOR_INDEX", "hnsw").lower()
+
+
+# ── Compact index representations ──
+QUANTIZATIONS = ("none", "halfvec", "binary")
+
+
+class IndexSpec:
+    """What the ANN index stores for each vector: the full vector, or a compact expression of it."""
+
+    def __init__(self, quantization: str = "none", dim: Optional[int] = None, full_dim: Optional[int] = None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown vector quantization: {quantization}")
+        if quantization != "none" and not (dim or full_dim):
+            raise ValueError("A quantized index needs the vector size (a vector(N) column or VECTOR_INDEX_DIM)")
+        self.quantization = quantization
+        self.dim          = dim if dim and dim != full_dim else None   # truncated size, if truncated
+        self.full_dim     = full_dim
+
+    @property
+    def compact(self) -> bool:
+        return self.quantization != "none" or self.dim is not None
+
+    @property
+    def opclass(self) -> str:
+        return {"none": "vector_cosine_ops", "halfvec": "halfvec_cosine_ops", "binary": "bit_hamming_ops"}[self.quantization]
+
+    @property
+    def operator(self) -> str:
+        return "<~>" if self.quantization == "binary" else "<=>"
+
+    @property
+    def suffix(self) -> str:
+        if not self.compact:
+            return ""
+        return (f"_{self.quantization}" if self.quantization != "none" else "") + (f"_{self.dim}" if self.dim else "")
+
+    def expression(self, operand: str) -> str:
+        """`operand` (a vector column or parameter) in the form the index stores."""
+        size = self.dim or self.full_dim
+        expr = f"subvector({operand}, 1, {self.dim})" if self.dim else operand
+        if self.quantization == "halfvec":
+            return f"({expr})::halfvec({size})"
+        if self.quantization == "binary":
+            return f"binary_quantize({expr})::bit({size})"
+        return f"({expr})::vector({size})" if self.dim else expr
+
+    def order_by(self, column: str = COLUMN) -> str:
+        """Index-ordered distance to the query vector, which is one `%s` parameter."""
+        return f"{self.expression(column)} {self.operator} {self.expression('%s::vector')}"
+
+    def rescore_candidates(self, k: int) -> int:
+        default = "10" if self.quantization == "binary" else "4"
+        return k * max(1, int(os.getenv("RESCORE_FACTOR", default))) if self.compact else k
+
+    def describe(self) -> dict:
+        return {"quantization": self.quantization, "dim": self.dim or self.full_dim, "compact": self.compact}
+
+
+def configured_spec(full_dim: Optional[int]) -> IndexSpec:
+    dim = int(os.getenv("VECTOR_INDEX_DIM", "0")) or None
+    return IndexSpec(os.getenv("VECTOR_QUANTIZATION", "none").lower(), dim, full_dim)
+
+
+def column_dimensions(cur, table: str = TABLE, column: str = COLUMN) -> Optional[int]:
+    """Declared size of a vector(N) column, or None if it is unconstrained."""
+    cur.execute(
+        "SELECT atttypmod FROM pg_attribute WHERE attrelid = %s::regclass AND attname = %s",
+        (table, column),
+    )
+    row = cur.fetchone()
+    return row[0] if row and row[0] > 0 else None
+
+
+# the spec of the index currently serving `documents`, once maintain() has seen it;
+# until then searches order by the full vectors
+_active_spec: Optional[IndexSpec] = None
+_spec_lock = threading.Lock()
+
+
+def active_spec() -> Optional[IndexSpec]:
+    return _active_spec
+
+
+def _set_active_spec(spec: Optional[IndexSpec]):
+    global _active_spec
+    with _spec_lock:
+        _active_spec = spec
+
+
+LOCK_POLL_SECONDS = 1.0
+
+# "table.column" keys whose maintenance lock this thread holds
+_held_locks = threading.local()
+
+
+@contextmanager
+def maintenance_lock(table: str = TABLE, column: str = COLUMN):
+    """
+    Hold the cross-process lock on `table.column`'s index maintenance for the
+    block (a session advisory lock on a pooled connection). Re-entrant within
+    a thread, so maintain() can call create_index().
+
+    Waiters poll with pg_try_advisory_lock rather than block in
+    pg_advisory_lock: a blocked statement is an open transaction, which the
+    holder's CREATE INDEX CONCURRENTLY would wait on in turn.
+    """
+    held = getattr(_held_locks, "keys", None)
+    if held is None:
+        held = _held_locks.keys = set()
+    key = f"{table}.{column}"
+    if key in held:
+        yield
+        return
+    with db.get_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                while True:
+                    cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (f"vector_index:{key}",))
+                    if cur.fetchone()[0]:
+                        break
+                    time.sleep(LOCK_POLL_SECONDS)
+            held.add(key)
+            try:
+                yield
+            finally:
+                held.discard(key)
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (f"vector_index:{key}",))
+        finally:
+            conn.autocommit = False
+
+
+def index_name(method: str, table: str = TABLE, column: str = COLUMN, spec: Optional[IndexSpec] = None) -> str:
+    return f"{table}_{column}_{method}{spec.suffix if spec else ''}_idx"
+
+
+def ideal_lists(rows: int) -> int:
+    # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def row_count(table: str = TABLE) -> int:
+    with db.get_cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM {table}")
+        return cur.fetchone()[0]
+
+
+def list_indexes(table: str = TABLE, column: str = COLUMN) -> list[dict]:
+    """ANN indexes currently defined on `table.column`, including expression indexes over it."""
+    with db.get_cursor() as cur:
+        cur.execute(
+            """
+            SELECT i.relname, am.amname, pg_relation_size(i.oid), pg_get_indexdef(i.oid), i.reloptions
+              FROM pg_index x
+              JOIN pg_class i     ON i.oid = x.indexrelid
+              JOIN pg_class t     ON t.oid = x.indrelid
+              JOIN pg_am am       ON am.oid = i.relam
+             WHERE t.relname = %s AND am.amname IN ('hnsw', 'ivfflat')
+               AND pg_get_indexdef(i.oid) ~ ('\\m' || %s || '\\M')
+            """,
+            (table, column),
+        )
+        return [
+            {
+                "name":       name,
+                "method":     method,
+                "size_bytes": size,
+                "definition": definition,
+                "options":    dict(opt.split("=", 1) for opt in (options or [])),
+            }
+            for name, method, size, definition, options in cur.fetchall()
+        ]
+
+
+def create_index(
+    method: str,
+    table: str = TABLE,
+    column: str = COLUMN,
+    m: Optional[int] = None,
+    ef_construction: Optional[int] = None,
+    lists: Optional[int] = None,
+    concurrently: bool = True,
+    spec: Optional[IndexSpec] = None,
+) -> dict:
+    """
+    (Re)build the ANN index for `method` over `spec`'s form of the column
+    (full vectors by default). Builds run in autocommit mode so CONCURRENTLY
+    can be used and ingestion isn't blocked. A rebuild is built under a
+    temporary name and both renames happen in one transaction, so queries
+    always have an index; the old one is dropped afterwards.
+    """
+    spec = spec or IndexSpec()
+    if method not in METHODS:
+        raise ValueError(f"Unknown vector index method: {method}")
+    if method == "hnsw":
+        options = {
+            "m":               m or int(os.getenv("HNSW_M", "16")),
+            "ef_construction": ef_construction or int(os.getenv("HNSW_EF_CONSTRUCTION", "64")),
+        }
+    else:
+        options = {"lists": lists or int(os.getenv("IVFFLAT_LISTS", "0")) or ideal_lists(row_count(table))}
+
+    name = index_name(method, table, column, spec)
+    target = f"({spec.expression(column)})" if spec.compact else column
+    with_sql = ", ".join(f"{k} = {int(v)}" for k, v in options.items())
+    how = "CONCURRENTLY " if concurrently else ""
+    build_mem = os.getenv("VECTOR_INDEX_BUILD_MEM")
+
+    with maintenance_lock(table, column), db.get_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                if build_mem:
+                    cur.execute("SET maintenance_work_mem = %s", (build_mem,))
+                # leftovers of an interrupted build or swap
+                cur.execute(f"DROP INDEX {how}IF EXISTS {name}_new")
+                cur.execute(f"DROP INDEX {how}IF EXISTS {name}_old")
+                cur.execute(
+                    f"CREATE INDEX {how}{name}_new ON {table} "
+                    f"USING {method} ({target} {spec.opclass}) WITH ({with_sql})"
+                )
+                cur.execute("BEGIN")
+                cur.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old")
+                cur.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+                cur.execute("COMMIT")
+                cur.execute(f"DROP INDEX {how}IF EXISTS {name}_old")
+                if build_mem:
+                    cur.execute("RESET maintenance_work_mem")
+        finally:
+            conn.autocommit = False
+    if (table, column) == (TABLE, COLUMN):
+        _set_active_spec(spec)
+    return {"name": name, "method": method, "options": options, **spec.describe()}
+
+
+def drop_indexes(table: str = TABLE, column: str = COLUMN, keep: Optional[str] = None):
+    """Drop every ANN index on the column except `keep` (an index name)."""
+    with maintenance_lock(table, column):
+        stale = [ix["name"] for ix in list_indexes(table, column) if ix["name"] != keep]
+        if not stale:
+            return []
+        with db.get_connection() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    for name in stale:
+                        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            finally:
+                conn.autocommit = False
+    return stale
+
+
+def maintain(table: str = TABLE, column: str = COLUMN) -> Optional[dict]:
+    """
+    Bring the column's ANN index in line with VECTOR_INDEX: create it if
+    missing, rebuild IVFFlat when the table has outgrown its lists, and drop
+    indexes of the other method. Returns what was built, if anything.
+    Processes starting together take turns; later ones find the index built.
+    """
+    with maintenance_lock(table, column):
+        return _maintain(table, column)
+
+
+def _maintain(table: str, column: str) -> Optional[dict]:
+    method = configured_method()
+    if method == "none":
+        drop_indexes(table, column)
+        if (table, column) == (TABLE, COLUMN):
+            _set_active_spec(None)
+        return None
+    if method not in METHODS:
+        raise ValueError(f"Unknown VECTOR_INDEX: {method}")
+
+    spec = index_spec(table, column)
+    name = index_name(method, table, column, spec)
+    current = [ix for ix in list_indexes(table, column) if ix["name"] == name]
+    if current and (table, column) == (TABLE, COLUMN):
+        _set_active_spec(spec)
+    built = None
+    if method == "hnsw" and not current:
+        built = create_index("hnsw", table, column, spec=spec)
+    elif method == "ivfflat":
+        rows = row_count(table)
+        if rows >= IVFFLAT_MIN_ROWS:
+            lists = int(current[0]["options"].get("lists", 0)) if current else 0
+            target = ideal_lists(rows)
+            # rebuild once the list count is off by more than 2x either way
+            if not current or not (target / 2 <= lists <= target * 2):
+                built = create_index("ivfflat", table, column, lists=target, spec=spec)
+
+    keep = built["name"] if built else (current[0]["name"] if current else None)
+    drop_indexes(table, column, keep=keep)
+    return built
+
+
+def index_spec(table: str = TABLE, column: str = COLUMN) -> IndexSpec:
+    """The configured spec for `table.column`, or full vectors if this pgvector can't index it."""
+    with db.get_cursor() as cur:
+        full_dim = column_dimensions(cur, table, column)
+        cur.execute(EXTENSION_VERSION_SQL)
+        record_extension_version(cur.fetchall())
+    spec = configured_spec(full_dim)
+    if spec.compact and not compact_index_known():
+        log.warning("⚠️  VECTOR_QUANTIZATION / VECTOR_INDEX_DIM need pgvector >= 0.7; indexing full vectors")
+        return IndexSpec()
+    return spec
+
+
+# ── Query-time knobs ──
+def search_settings(
+    k: int,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    exact: bool = False,
+    iterative: bool = False,
+) -> Optional[tuple[str, list]]:
+    """
+    A statement that tunes the next vector query in the current transaction,
+    or None. Uses set_config(..., is_local => true) rather than SET LOCAL so it
+    can be parameterized under both psycopg2 and psycopg 3.
+
+    Without an explicit ef_search, it is raised to `k` when needed, since HNSW
+    never returns more than ef_search rows. `iterative` lets a filtered index
+    scan keep going until k rows pass the filter (pgvector >= 0.8).
+    """
+    if exact:
+        # no index scan means the ORDER BY is answered by an exact sequential scan
+        settings = {"enable_indexscan": "off"}
+    else:
+        settings = {}
+        if ef_search is None and k > DEFAULT_EF_SEARCH:
+            ef_search = k
+        if ef_search is not None:
+            settings["hnsw.ef_search"] = str(int(ef_search))
+        if probes is not None:
+            settings["ivfflat.probes"] = str(int(probes))
+        if iterative:
+            settings["hnsw.iterative_scan"]    = "relaxed_order"
+            settings["ivfflat.iterative_scan"] = "relaxed_order"
+    if not settings:
+        return None
+    calls = ", ".join("set_config(%s, %s, true)" for _ in settings)
+    return f"SELECT {calls}", [p for item in settings.items() for p in item]
+
+
+def apply_search_settings(cur, k: int, **knobs):
+    statement = search_settings(k, **knobs)
+    if statement:
+        cur.execute(*statement)
+
+
+EXTENSION_VERSION_SQL = "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+_iterative_scan = None
+_compact_index  = None
+
+
+def iterative_scan_known() -> Optional[bool]:
+    return _iterative_scan
+
+
+def compact_index_known() -> Optional[bool]:
+    return _compact_index
+
+
+def record_extension_version(rows) -> bool:
+    """
+    Remember, from EXTENSION_VERSION_SQL's rows, whether iterative scans (0.8.0+)
+    and halfvec / bit / subvector (0.7.0+) exist; returns the former.
+    """
+    global _iterative_scan, _compact_index
+    version = tuple(int(p) for p in rows[0][0].split(".")[:2]) if rows else (0, 0)
+    _iterative_scan = version >= (0, 8)
+    _compact_index  = version >= (0, 7)
+    return _iterative_scan
+
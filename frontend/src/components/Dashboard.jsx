@@ -56,6 +56,7 @@ const Dashboard = () => {
   const [chatHistory, setChatHistory] = useState([]);
   const [error, setError]                        = useState('');
   const [queryLoading, setQueryLoading]          = useState(false);
+  const answerAbortRef                           = useRef(null);
 
   const toggleSelect = fn => {
   setSelectedDocs(current =>
@@ -156,10 +157,28 @@ const playTTS = async (text) => {
         throw new Error(payload.detail || payload.error || `Status ${res.status}`);
       }
 
-      // 3️ Wrap in a Blob so the browser knows it’s MPEG
-      const buffer = await res.arrayBuffer();
-      const blob   = new Blob([buffer], { type: 'audio/mpeg' });
-      const url    = URL.createObjectURL(blob);
+      // 3️ Play while the MP3 streams in (MediaSource), or buffer it whole as a Blob
+      const streaming = res.body && window.MediaSource && MediaSource.isTypeSupported('audio/mpeg');
+      let url;
+      if (streaming) {
+        const mediaSource = new MediaSource();
+        url = URL.createObjectURL(mediaSource);
+        mediaSource.addEventListener('sourceopen', async () => {
+          const sourceBuffer = mediaSource.addSourceBuffer('audio/mpeg');
+          const reader = res.body.getReader();
+          for (;;) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            sourceBuffer.appendBuffer(value);
+            await new Promise(resolve => sourceBuffer.addEventListener('updateend', resolve, { once: true }));
+          }
+          if (mediaSource.readyState === 'open') mediaSource.endOfStream();
+        }, { once: true });
+      } else {
+        const buffer = await res.arrayBuffer();
+        const blob   = new Blob([buffer], { type: 'audio/mpeg' });
+        url = URL.createObjectURL(blob);
+      }
 
       // 4️ Create a new Audio, store it in the ref, and play
       const audio = new Audio(url);
@@ -197,6 +216,16 @@ const playTTS = async (text) => {
     setSelectedDocs(sel => sel.filter(x => x !== fn)); // ⬅ uncheck if deleted
   };
 
+  // poll a background ingestion job until it finishes
+  const waitForJob = async jobId => {
+    while (true) {
+      const job = await fetch(`http://localhost:8000/jobs/${jobId}`).then(r => r.json());
+      if (job.status === 'succeeded') return job;
+      if (job.status === 'failed') throw new Error(job.error || 'Ingestion failed');
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  };
+
   // upload (handles both file and URL)
   const handleUploadSubmit = async () => {
   setUploading(true);
@@ -220,6 +249,8 @@ const playTTS = async (text) => {
         });
         const p = await res.json();
         if (!res.ok) throw new Error(p.detail || 'Upload failed');
+        if (p.open_error) throw new Error(`${f.name}: ${p.open_error}`);
+        await waitForJob(p.job_id);
       }
       // All files ingested successfully, now append their names to the list
       setSubmittedFiles(prev => [
@@ -242,6 +273,7 @@ const playTTS = async (text) => {
       });
       const p = await res.json();
       if (!res.ok) throw new Error(p.detail || 'URL ingest failed');
+      await waitForJob(p.job_id);
       // URL ingested successfully, now append it to the list
       setSubmittedFiles(prev => [
         ...prev,
@@ -355,29 +387,72 @@ const playTTS = async (text) => {
         if (sourceTypeFilter) body.source_type = sourceTypeFilter;
       }
 
-      console.log("POST /answer body:", body);
+      console.log("POST /answer/stream body:", body);
 
-      const res = await fetch('http://localhost:8000/answer', {
+      // stream the answer: sources first, then token deltas (SSE)
+      answerAbortRef.current?.abort();
+      const controller = new AbortController();
+      answerAbortRef.current = controller;
+      const res = await fetch('http://localhost:8000/answer/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(body)
+        body: JSON.stringify(body),
+        signal: controller.signal
       });
-      const p = await res.json();
-      if (!res.ok) throw new Error(p.detail || 'Error');
+      if (!res.ok) {
+        const p = await res.json().catch(() => ({}));
+        throw new Error(p.detail || 'Error');
+      }
       setChatHistory(h => [
         ...h,
         { role: 'user',      content: q },
-        { role: 'assistant', content: p.answer }
+        { role: 'assistant', content: '' }
+      ]);
+      setQuestionText('');
+
+      const setAnswerText = update => setChatHistory(h => [
+        ...h.slice(0, -1),
+        { ...h[h.length - 1], content: update(h[h.length - 1].content) }
       ]);
-      setQuestionText(''); 
-      
+      await readAnswerStream(res, (event, data) => {
+        if (event === 'delta') setAnswerText(text => text + data.content);
+        if (event === 'done')  setAnswerText(() => data.answer);
+        if (event === 'error') throw new Error(data.detail || 'Error');
+      });
+
     } catch (e) {
-      setError(e.message);
+      if (e.name !== 'AbortError') setError(e.message);
     } finally {
       setQueryLoading(false);
     }
   };
 
+  // parse a text/event-stream body, calling onEvent(event, data) per message
+  const readAnswerStream = async (res, onEvent) => {
+    const reader  = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let end;
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        const message = buffer.slice(0, end);
+        buffer = buffer.slice(end + 2);
+        let event = 'message', data = '';
+        for (const line of message.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          if (line.startsWith('data: '))  data += line.slice(6);
+        }
+        onEvent(event, data ? JSON.parse(data) : null);
+      }
+    }
+  };
+
+  // stop paying for tokens nobody will read
+  useEffect(() => () => answerAbortRef.current?.abort(), []);
+
   useEffect(() => {
   const container = chatContainerRef.current;
   if (container) {